@@ -0,0 +1,176 @@
+"""One-round-trip card extraction for the scrapers.
+
+Instead of several WebDriver calls per card (text, href, a handful of XPath
+lookups, image attributes, ancestor walks), the scrapers inject CARD_SCRIPT once
+per results page. It returns a JSON array of plain card payloads which are then
+turned into rows on the Python side with the same fallbacks the DOM loops use.
+Set EXTRACT_MODE=dom to go back to the per-element loops, EXTRACT_MODE=html
+to parse driver.page_source offline with html_extract, or EXTRACT_MODE=network
+to read the search API JSON via network_capture (Blinkit and Instamart).
+"""
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote, urljoin
+
+EXTRACT_MODE = os.getenv("EXTRACT_MODE", "batch").strip().lower()
+
+QUANTITY_UNITS = ["kg", "g", "ml", "l", "pcs", "pack"]
+URL_DATA_ATTRS = ["data-pf", "data-href", "data-url", "data-link"]
+IMAGE_ATTRS = ["src", "data-src", "data-srcset", "srcset"]
+
+# arguments[0] = card XPath, arguments[1] = options (see extract_cards).
+CARD_SCRIPT = r"""
+const xpath = arguments[0];
+const opts = arguments[1] || {};
+const snap = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+const ownText = (el) => Array.from(el.childNodes)
+  .filter((n) => n.nodeType === Node.TEXT_NODE)
+  .map((n) => n.textContent)
+  .join('');
+const textOf = (el) => (el ? (el.innerText || el.textContent || '').trim() : '');
+const pick = (root, sel) => (sel ? textOf(root.querySelector(sel)) : '');
+const firstOwnText = (root, test) => {
+  for (const el of root.querySelectorAll('*')) {
+    if (test(ownText(el))) return textOf(el);
+  }
+  return '';
+};
+const units = opts.units || [];
+const out = [];
+for (let i = 0; i < snap.snapshotLength; i++) {
+  let card = snap.snapshotItem(i);
+  if (!(card instanceof Element)) continue;
+  if (opts.liftButtons && card.tagName.toLowerCase() === 'button' && card.parentElement) {
+    card = card.parentElement.closest('article, div, li') || card;
+  }
+  const links = [];
+  if (card.href) links.push(String(card.href));
+  let node = card;
+  for (let depth = 0; node && depth <= (opts.ancestorDepth || 0); depth++) {
+    for (const attr of (opts.linkAttrs || [])) {
+      const val = node.getAttribute && node.getAttribute(attr);
+      if (val) links.push(val);
+    }
+    node = node.parentElement;
+  }
+  if (opts.childLinks) {
+    for (const a of card.querySelectorAll('a[href]')) links.push(a.href);
+  }
+  let image = null;
+  const img = card.querySelector('img');
+  if (img) {
+    for (const attr of (opts.imageAttrs || [])) {
+      const val = img.getAttribute(attr);
+      if (val) { image = attr === 'src' ? img.src || val : val; break; }
+    }
+  }
+  out.push({
+    text: textOf(card),
+    href: card.href ? String(card.href) : null,
+    name: opts.nameSelector ? pick(card, opts.nameSelector) : '',
+    price: opts.priceSelector ? pick(card, opts.priceSelector) : firstOwnText(card, (t) => t.includes('₹')),
+    quantity: opts.quantitySelector
+      ? pick(card, opts.quantitySelector)
+      : firstOwnText(card, (t) => units.some((u) => t.includes(u))),
+    image: image,
+    links: links,
+  });
+}
+return out;
+"""
+
+
+def batch_mode_enabled() -> bool:
+    return EXTRACT_MODE == "batch"
+
+
+def html_mode_enabled() -> bool:
+    return EXTRACT_MODE == "html"
+
+
+def network_mode_enabled() -> bool:
+    return EXTRACT_MODE == "network"
+
+
+def extract_cards(
+    driver: Any,
+    card_xpath: str,
+    *,
+    name_selector: str = "",
+    price_selector: str = "",
+    quantity_selector: str = "",
+    lift_buttons: bool = False,
+    ancestor_depth: int = 0,
+    link_attrs: Sequence[str] = (),
+    child_links: bool = False,
+    images: bool = False,
+) -> List[Dict[str, Any]]:
+    """Pull every card matched by card_xpath in a single execute_script call."""
+    opts: Dict[str, Any] = {
+        "nameSelector": name_selector,
+        "priceSelector": price_selector,
+        "quantitySelector": quantity_selector,
+        "liftButtons": lift_buttons,
+        "ancestorDepth": ancestor_depth,
+        "linkAttrs": list(link_attrs),
+        "childLinks": child_links,
+        "imageAttrs": IMAGE_ATTRS if images else [],
+        "units": QUANTITY_UNITS,
+    }
+    payload = driver.execute_script(CARD_SCRIPT, card_xpath, opts)
+    if not isinstance(payload, list):
+        return []
+    return [card for card in payload if isinstance(card, dict)]
+
+
+def fill_from_raw_text(raw_text: str, name: str, price: str, quantity: str) -> Tuple[str, str, str]:
+    """Fill missing name/price/quantity from the card's visible text lines."""
+    if not raw_text:
+        return name, price, quantity
+    lines = [line.strip() for line in raw_text.split("\n") if line.strip()]
+    if not price:
+        for line in lines:
+            if "₹" in line:
+                price = line
+                break
+    if not quantity:
+        for line in lines:
+            low = line.lower()
+            if any(unit in low for unit in QUANTITY_UNITS):
+                quantity = line
+                break
+    if not name and lines:
+        candidate_lines = [line for line in lines if line.upper() != "ADD" and "₹" not in line]
+        if candidate_lines:
+            name = max(candidate_lines, key=len)
+        else:
+            name = lines[0]
+    return name, price, quantity
+
+
+def first_image_url(val: Optional[str]) -> Optional[str]:
+    """Take the first URL out of a srcset-style value."""
+    if not val:
+        return None
+    if " " in val and "http" in val:
+        return val.split(" ")[0]
+    return val
+
+
+def resolve_url(candidates: Sequence[str], base: str, fallback_query: str = "") -> Optional[str]:
+    """First absolute (or site-relative) link, else a search URL for fallback_query."""
+    for href in candidates:
+        if not href:
+            continue
+        if href.startswith("http"):
+            return href
+        if href.startswith("/"):
+            return urljoin(base, href)
+    if fallback_query:
+        return f"{base}/s/?q={quote(fallback_query)}"
+    return None
+
+
+def card_text(card: Dict[str, Any], key: str) -> str:
+    val = card.get(key)
+    return str(val).strip() if val else ""
@@ -0,0 +1,279 @@
+"""Warm Chrome session pool shared by the Flask servers.
+
+Each platform keeps a few already-launched, already-located browser sessions and
+leases them to scrape jobs, so a /scrape call no longer pays for a Python cold
+start, a fresh uc.Chrome launch and the homepage warm-up sleep. Sessions are
+recycled after SCRAPER_POOL_MAX_PAGES searches or whenever a scrape raises.
+
+Configured delivery locations (locations.py) get their own pools, so fan_out()
+can scrape one term in every requested location at once, each in a browser that
+already carries that location's geolocation and pin.
+"""
+import importlib
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import locations
+import resource_blocking
+import scrape_jobs
+
+# Scraper module per platform; each exposes create_driver/prepare_session/scrape_term.
+SCRAPER_MODULES: Dict[str, str] = {
+    "zepto": "scraped",
+    "blinkit": "scraped_blinkit",
+    "instamart": "scraped_instamart",
+}
+
+POOL_SIZE = int(os.getenv("SCRAPER_POOL_SIZE", "2"))
+POOL_MAX_PAGES = int(os.getenv("SCRAPER_POOL_MAX_PAGES", "25"))
+POOL_LEASE_TIMEOUT = float(os.getenv("SCRAPER_POOL_LEASE_TIMEOUT", "90"))
+# Per-location pools are kept small: there can be dozens of zones
+LOCATION_POOL_SIZE = int(os.getenv("SCRAPER_POOL_SIZE_PER_LOCATION", "1"))
+FAN_OUT_WORKERS = int(os.getenv("SCRAPER_FAN_OUT_WORKERS", "8"))
+
+_pools: Dict[Tuple[str, str], "BrowserPool"] = {}
+_pools_lock = threading.Lock()
+
+
+def load_scraper(platform: str) -> ModuleType:
+    """Import the scraper module for a platform (zepto, blinkit, instamart)."""
+    module_name = SCRAPER_MODULES.get(platform)
+    if not module_name:
+        raise ValueError(f"unknown platform: {platform}")
+    return importlib.import_module(module_name)
+
+
+class PooledSession:
+    """One live browser plus the bookkeeping needed to decide when to recycle it."""
+
+    def __init__(self, driver: Any) -> None:
+        self.driver = driver
+        self.pages = 0
+        self.created_at = time.time()
+
+
+class BrowserPool:
+    """Fixed-size pool of warm browser sessions for a single platform."""
+
+    def __init__(
+        self,
+        platform: str,
+        size: int = POOL_SIZE,
+        max_pages: int = POOL_MAX_PAGES,
+        location: Optional[locations.Location] = None,
+    ) -> None:
+        self.platform = platform
+        self.location = location
+        self.name = f"{platform}@{location.label}" if location else platform
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        # _live counts idle + leased + starting sessions; both are guarded by _cond,
+        # which is notified whenever a session comes back or a slot is freed
+        self._idle: Deque[PooledSession] = deque()
+        self._live = 0
+        self._cond = threading.Condition()
+
+    def _spawn(self) -> PooledSession:
+        scraper = load_scraper(self.platform)
+        driver = scraper.create_driver(self.location) if self.location else scraper.create_driver()
+        if driver is None:
+            raise RuntimeError(f"could not start a {self.name} browser")
+        try:
+            if self.location:
+                scraper.prepare_session(driver, self.location)
+            else:
+                scraper.prepare_session(driver)
+        except Exception:
+            self._quit(driver)
+            raise
+        print(f" [{self.name}] warm session ready")
+        return PooledSession(driver)
+
+    @staticmethod
+    def _quit(driver: Any) -> None:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _acquire(self, timeout: float) -> PooledSession:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    return self._idle.popleft()
+                if self._live < self.size:
+                    self._live += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"no {self.name} browser free after {timeout:.0f}s")
+                self._cond.wait(remaining)
+        try:
+            return self._spawn()
+        except Exception:
+            self._free_slot()
+            raise
+
+    def _free_slot(self) -> None:
+        """Forget one session and wake a waiter so it can start a replacement."""
+        with self._cond:
+            self._live -= 1
+            self._cond.notify()
+
+    def _release(self, session: PooledSession, broken: bool) -> None:
+        if broken or session.pages >= self.max_pages:
+            reason = "error" if broken else f"{session.pages} pages"
+            print(f" [{self.name}] recycling session ({reason})")
+            self._quit(session.driver)
+            self._free_slot()
+            return
+        with self._cond:
+            self._idle.append(session)
+            self._cond.notify()
+
+    @contextmanager
+    def lease(self, timeout: float = POOL_LEASE_TIMEOUT) -> Iterator[PooledSession]:
+        """Borrow a warm session; it goes back to the pool (or is recycled) on exit."""
+        session = self._acquire(timeout)
+        broken = False
+        try:
+            yield session
+        except Exception:
+            broken = True
+            raise
+        finally:
+            self._release(session, broken)
+
+    def warm(self) -> None:
+        """Start sessions up to the pool size so the first requests find them ready."""
+        while True:
+            with self._cond:
+                if self._live >= self.size:
+                    return
+                self._live += 1
+            try:
+                session = self._spawn()
+            except Exception as e:
+                self._free_slot()
+                print(f" [{self.name}] warm-up failed: {e}")
+                return
+            with self._cond:
+                self._idle.append(session)
+                self._cond.notify()
+
+    def close(self) -> None:
+        while True:
+            with self._cond:
+                if not self._idle:
+                    break
+                session = self._idle.popleft()
+            self._quit(session.driver)
+            self._free_slot()
+
+
+def get_pool(platform: str, location: Optional[locations.Location] = None) -> BrowserPool:
+    key = (platform, location.label.lower() if location else "")
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            load_scraper(platform)
+            if location:
+                pool = BrowserPool(platform, LOCATION_POOL_SIZE, location=location)
+            else:
+                pool = BrowserPool(platform)
+            _pools[key] = pool
+        return pool
+
+
+def warm_in_background(platform: str) -> None:
+    """Kick off pool warm-up without blocking server start."""
+    threading.Thread(target=get_pool(platform).warm, name=f"warm-{platform}", daemon=True).start()
+
+
+def run_scrape(platform: str, term: str, location: str = "", save: bool = True) -> List[Dict[str, Any]]:
+    """Scrape one term on a leased warm session and (optionally) persist the rows."""
+    scraper = load_scraper(platform)
+    pool = get_pool(platform, locations.find(location, platform))
+    with pool.lease() as session:
+        session.pages += 1
+        if location:
+            rows = scraper.scrape_term(session.driver, term, location)
+        else:
+            rows = scraper.scrape_term(session.driver, term)
+        resource_blocking.collect(session.driver)
+    scrape_jobs.progress(rows=len(rows))
+    if save and rows:
+        scraper.save_term_results(term, rows)
+        scraper.append_output(rows)
+    return list(rows)
+
+
+def fan_out(platform: str, term: str, where: Sequence[locations.Location]) -> Dict[str, List[Dict[str, Any]]]:
+    """Scrape one term in several locations concurrently, one location pool each."""
+    if not where:
+        return {"": run_scrape(platform, term)}
+    workers = max(1, min(len(where), FAN_OUT_WORKERS))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"fan-{platform}") as executor:
+        futures = {
+            loc.label: scrape_jobs.submit_in_context(executor, run_scrape, platform, term, loc.label) for loc in where
+        }
+    # Every location reports back; one failing zone should not hide the others
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    errors: Dict[str, str] = {}
+    for label, future in futures.items():
+        try:
+            results[label] = future.result()
+        except Exception as e:
+            print(f" [{platform}@{label}] scrape failed: {e}")
+            errors[label] = str(e)
+    if errors and not results:
+        raise RuntimeError("; ".join(f"{label}: {err}" for label, err in errors.items()))
+    for label in errors:
+        results[label] = []
+    return results
+
+
+def shutdown() -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+def pool_mode_enabled() -> bool:
+    """Servers use the warm pool unless SCRAPER_MODE=subprocess is set."""
+    return os.getenv("SCRAPER_MODE", "pool").strip().lower() != "subprocess"
+
+
+def timed_scrape(platform: str, term: str, location: str = "", where: Optional[Sequence[locations.Location]] = None) -> Dict[str, Any]:
+    """Run a pooled scrape (fanned out over `where`, if given) and build the compact response body."""
+    started = time.time()
+    resp: Dict[str, Any] = {"status": "ok", "mode": "pool", "platform": platform, "term": term}
+    if where:
+        per_location = fan_out(platform, term, where)
+        resp["count"] = sum(len(rows) for rows in per_location.values())
+        resp["locations"] = {label: len(rows) for label, rows in per_location.items()}
+    else:
+        resp["count"] = len(run_scrape(platform, term, location))
+    resp["elapsed_ms"] = int((time.time() - started) * 1000)
+    return resp
+
+
+if __name__ == "__main__":
+    # Quick manual check: warm one session per platform and scrape a term.
+    import sys
+
+    term_arg = " ".join(sys.argv[1:]).strip() or "milk"
+    for name in SCRAPER_MODULES:
+        try:
+            print(timed_scrape(name, term_arg))
+        except Exception as exc:
+            print(f"{name} failed: {exc}")
+    shutdown()
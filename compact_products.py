@@ -0,0 +1,70 @@
+"""Compact the product store and apply the retention settings now.
+
+Run it from cron (or by hand after changing retention). With Mongo:
+
+1. Product rows saved before fingerprints existed, or under the older
+   term-based fingerprint, are collapsed into the latest snapshot per product. Their prices are folded into the price
+   rollups first, and the older copies are then deleted
+   (see migrate_products.backfill_keys).
+2. Products not re-scraped within PRODUCT_RETENTION_DAYS (never less than the
+   rollup retention, so history stays reachable) are deleted. Rollup
+   buckets get their expiry re-dated to the current HOURLY_/DAILY_ROLLUP_RETENTION_DAYS,
+   and expired buckets are deleted. The TTL indexes keep doing this in the
+   background between runs.
+
+With STORAGE_BACKEND=sqlite only step 2 applies. `--vacuum` then also
+returns the freed pages to the filesystem.
+
+    python compact_products.py
+    python compact_products.py --vacuum
+"""
+import argparse
+import sqlite3
+from typing import Any, Dict
+
+import mongo_client
+import migrate_products
+
+
+def _mongo_sizes() -> Dict[str, Any]:
+    db = mongo_client.products_collection().database
+    sizes: Dict[str, Any] = {}
+    for name in (mongo_client.PRODUCTS_COLLECTION, mongo_client.PRICE_HISTORY_COLLECTION):
+        stats = db.command("collStats", name)
+        sizes[name] = {"count": stats.get("count", 0), "size": stats.get("size", 0), "indexes": stats.get("totalIndexSize", 0)}
+    return sizes
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Collapse superseded product rows and delete data past retention")
+    ap.add_argument("--vacuum", action="store_true", help="SQLite backend: VACUUM the database file afterwards")
+    args = ap.parse_args()
+
+    store = mongo_client.product_store()
+    print(f" Compacting {store.label()} (products {mongo_client.PRODUCT_RETENTION_DAYS:g} days,"
+          f" hourly rollups {mongo_client.ROLLUP_RETENTION_DAYS['hour']:g} days,"
+          f" daily rollups {mongo_client.ROLLUP_RETENTION_DAYS['day']:g} days; 0 = keep)")
+    if mongo_client.STORAGE_BACKEND == "mongo":
+        before = _mongo_sizes()
+        updated, removed = migrate_products.backfill_keys(mongo_client.products_collection())
+        print(f" Collapsed old rows: {updated} kept as latest snapshots, {removed} superseded copies removed")
+    counts = store.expire()
+    print(f" Expired {counts['products']} products and {counts['rollups']} rollup buckets"
+          f" ({counts['rollups_redated']} buckets re-dated)")
+    if mongo_client.STORAGE_BACKEND == "mongo":
+        for name, after in _mongo_sizes().items():
+            prev = before.get(name, {})
+            print(f"   {name}: {prev.get('count', 0)} -> {after['count']} docs,"
+                  f" data {after['size'] // 1024} KiB, indexes {after['indexes'] // 1024} KiB")
+    elif args.vacuum:
+        conn = sqlite3.connect(mongo_client.SQLITE_PATH, isolation_level=None)
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+        print(f" Vacuumed {mongo_client.SQLITE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
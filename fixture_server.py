@@ -0,0 +1,184 @@
+"""Local stand-in for the Blinkit/Instamart search pages, serving recorded JSON.
+
+Pages mimic the real search URLs and fetch() the search API path from this same
+server, so a browser in EXTRACT_MODE=network sees a genuine XHR whose body comes
+from <fixtures>/<platform>_<term>.json (the files CAPTURE_DUMP_DIR records):
+
+    python fixture_server.py --dir fixtures --port 8765
+    BLINKIT_BASE_URL=http://127.0.0.1:8765 EXTRACT_MODE=network python scraped_blinkit.py milk
+
+fixtures/ ships recorded Blinkit and Instamart "milk" responses, and
+fixtures/expected.json lists the (name, price, quantity) rows each must yield.
+`--check` serves them on a free port, loads every search page and its API call
+over HTTP, parses the JSON with network_capture.rows_from_payload and compares
+the rows; `--check --browser` also drives Chrome through
+network_capture.scrape_via_network (CDP capture) and expects the same rows:
+
+    python fixture_server.py --check
+    python fixture_server.py --check --browser
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlparse
+from urllib.request import urlopen
+
+# Search page path per platform (the page then fetches the API path below)
+PAGE_PATHS = {"blinkit": "/s/?q={term}", "instamart": "/instamart/search?query={term}"}
+
+PAGE_TEMPLATE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>{platform} fixture</title></head>
+<body><div id="results">Loading...</div>
+<script>
+fetch({api_url}).then((r) => r.json()).then((data) => {{
+  document.getElementById('results').textContent = JSON.stringify(data).length + ' bytes loaded';
+}});
+</script></body></html>
+"""
+
+
+def _term_key(term: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", term.lower()).strip("_") or "term"
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    fixtures_dir = "fixtures"
+
+    def log_message(self, format: str, *args: object) -> None:
+        return
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _page(self, platform: str, api_path: str) -> None:
+        body = PAGE_TEMPLATE.format(platform=platform, api_url=json.dumps(api_path))
+        self._send(200, body.encode("utf-8"), "text/html; charset=utf-8")
+
+    def _fixture(self, platform: str, term: str) -> None:
+        path = os.path.join(self.fixtures_dir, f"{platform}_{_term_key(term)}.json")
+        if not os.path.exists(path):
+            self._send(404, b'{"error": "no fixture"}', "application/json")
+            return
+        with open(path, "rb") as fh:
+            self._send(200, fh.read(), "application/json; charset=utf-8")
+
+    def _route(self) -> Tuple[Optional[str], str, str]:
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        if parsed.path.rstrip("/") in ("/s", "/v1/layout/search"):
+            return "blinkit", parsed.path, (query.get("q") or [""])[0]
+        if parsed.path.rstrip("/") in ("/instamart/search", "/api/instamart/search"):
+            return "instamart", parsed.path, (query.get("query") or [""])[0]
+        return None, parsed.path, ""
+
+    def do_GET(self) -> None:
+        platform, path, term = self._route()
+        if platform == "blinkit" and path.rstrip("/") == "/s":
+            self._page(platform, f"/v1/layout/search?q={quote(term)}")
+        elif platform == "instamart" and path.rstrip("/") == "/instamart/search":
+            self._page(platform, f"/api/instamart/search?query={quote(term)}")
+        elif platform:
+            self._fixture(platform, term)
+        else:
+            # Homepages and anything else: an empty shell page
+            self._send(200, b"<!doctype html><html><body></body></html>", "text/html; charset=utf-8")
+
+
+def serve(fixtures_dir: str, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """Start the stand-in server on a background thread and return it (call shutdown() when done)."""
+    handler = type("BoundFixtureHandler", (FixtureHandler,), {"fixtures_dir": fixtures_dir})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def _row_keys(rows: List[Dict[str, Any]]) -> List[List[str]]:
+    return [[row["product_name"], row["price"], row["quantity"]] for row in rows]
+
+
+def _browser_rows(platform: str, base_url: str, page_url: str, term: str) -> List[Dict[str, Any]]:
+    """The real capture path: a network-mode Chrome from the platform's scraper, pointed at this server."""
+    os.environ["EXTRACT_MODE"] = "network"
+    os.environ[f"{platform.upper()}_BASE_URL"] = base_url
+    import browser_pool
+    import network_capture
+
+    scraper = browser_pool.load_scraper(platform)
+    driver = scraper.create_driver()
+    if driver is None:
+        raise RuntimeError(f"could not start a {platform} browser")
+    try:
+        return network_capture.scrape_via_network(driver, platform, page_url, term, "", base_url)
+    finally:
+        driver.quit()
+
+
+def check(fixtures_dir: str, browser: bool = False) -> List[str]:
+    """Replay every fixture named in expected.json; returns the failures (empty = all good)."""
+    import network_capture
+
+    with open(os.path.join(fixtures_dir, "expected.json"), "r", encoding="utf-8") as fh:
+        expected: Dict[str, List[List[str]]] = json.load(fh)
+    httpd = serve(fixtures_dir, port=0)
+    base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    failures: List[str] = []
+    try:
+        for name, want in expected.items():
+            platform, term = name.split("_", 1)
+            term = term.replace("_", " ")
+            page_url = base_url + PAGE_PATHS[platform].format(term=quote(term))
+            with urlopen(page_url, timeout=10) as resp:
+                api_path = re.search(r"fetch\((\"[^\"]+\")\)", resp.read().decode("utf-8"))
+            if api_path is None:
+                failures.append(f"{name}: search page has no API call")
+                continue
+            with urlopen(base_url + json.loads(api_path.group(1)), timeout=10) as resp:
+                payload = json.loads(resp.read().decode("utf-8"))
+            rows = network_capture.rows_from_payload(platform, payload, term, "", base_url)
+            modes = {"fetch": rows}
+            if browser:
+                modes["browser"] = _browser_rows(platform, base_url, page_url, term)
+            for mode, got in modes.items():
+                if _row_keys(got) != want:
+                    failures.append(f"{name} ({mode}): got {_row_keys(got)}, expected {want}")
+                elif not all(row["url"] and row["url"].startswith(base_url) for row in got):
+                    failures.append(f"{name} ({mode}): product URLs not built from {base_url}")
+                else:
+                    print(f" {name} ({mode}): {len(got)} rows ok")
+    finally:
+        httpd.shutdown()
+    return failures
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Serve recorded search JSON for network-capture scrapes.")
+    ap.add_argument("--dir", default=os.getenv("CAPTURE_DUMP_DIR") or "fixtures")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--check", action="store_true", help="replay the fixtures and compare with expected.json, then exit")
+    ap.add_argument("--browser", action="store_true", help="with --check: also capture through Chrome (CDP)")
+    args = ap.parse_args()
+    if args.check:
+        failures = check(args.dir, args.browser)
+        for failure in failures:
+            print(f" FAIL {failure}")
+        sys.exit(1 if failures else 0)
+    httpd = serve(args.dir, args.host, args.port)
+    print(f" Serving fixtures from {args.dir} on http://{args.host}:{args.port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        httpd.shutdown()
+
+
+if __name__ == "__main__":
+    main()
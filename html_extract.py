@@ -0,0 +1,352 @@
+"""Offline extraction of search result rows from saved Zepto/Blinkit/Instamart HTML.
+
+The scrapers can hand driver.page_source to parse_html() (EXTRACT_MODE=html) so
+card parsing happens in-process instead of over the WebDriver connection, and
+archived pages such as blinkit_<term>_page.html can be re-extracted in bulk:
+
+    python html_extract.py blinkit_milk_page.html blinkit_eggs_page.html --out rows.json
+
+Only the standard library is used (html.parser), so no browser is required.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from batch_extract import QUANTITY_UNITS, URL_DATA_ATTRS, fill_from_raw_text, first_image_url, resolve_url
+
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+}
+SKIP_TEXT_TAGS = {"script", "style", "noscript", "template", "svg"}
+
+PLATFORM_LABELS = {"zepto": "Zepto", "blinkit": "Blinkit", "instamart": "Instamart"}
+ZEPTO_BASE = "https://www.zeptonow.com"
+BLINKIT_BASE = "https://www.blinkit.com"
+INSTAMART_BASE = "https://www.swiggy.com"
+
+_PAGE_FILE_RE = re.compile(r"^(zepto|blinkit|instamart)_(.+)_page\.html?$", re.IGNORECASE)
+
+
+class Node:
+    """Minimal element tree node: tag, attributes, children and direct text."""
+
+    __slots__ = ("tag", "attrs", "children", "parent", "texts")
+
+    def __init__(self, tag: str, attrs: Dict[str, str], parent: Optional["Node"] = None) -> None:
+        self.tag = tag
+        self.attrs = attrs
+        self.children: List["Node"] = []
+        self.parent = parent
+        # Direct text chunks interleaved with children, in document order
+        self.texts: List[Tuple[int, str]] = []
+
+    def get(self, attr: str) -> str:
+        return self.attrs.get(attr) or ""
+
+    def classes(self) -> List[str]:
+        return self.get("class").split()
+
+    def own_text(self) -> str:
+        return "".join(text for _, text in self.texts)
+
+    def iter(self) -> Iterator["Node"]:
+        """Descendants in document order (excluding self)."""
+        stack = list(reversed(self.children))
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    def find(self, pred: Callable[["Node"], bool]) -> Optional["Node"]:
+        for node in self.iter():
+            if pred(node):
+                return node
+        return None
+
+    def find_all(self, pred: Callable[["Node"], bool]) -> List["Node"]:
+        return [node for node in self.iter() if pred(node)]
+
+    def text_lines(self) -> List[str]:
+        """Approximate innerText: visible text chunks, one trimmed line each."""
+        lines: List[str] = []
+
+        def walk(node: "Node") -> None:
+            if node.tag in SKIP_TEXT_TAGS:
+                return
+            child_idx = 0
+            text_iter = iter(node.texts)
+            pending = next(text_iter, None)
+            # Interleave direct text with children by their recorded position
+            while pending is not None or child_idx < len(node.children):
+                if pending is not None and pending[0] <= child_idx:
+                    for part in pending[1].split("\n"):
+                        part = " ".join(part.split())
+                        if part:
+                            lines.append(part)
+                    pending = next(text_iter, None)
+                else:
+                    walk(node.children[child_idx])
+                    child_idx += 1
+
+        walk(self)
+        return lines
+
+    def text(self) -> str:
+        return "\n".join(self.text_lines())
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.root = Node("#document", {})
+        self._current = self.root
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        node = Node(tag, {k: (v or "") for k, v in attrs}, self._current)
+        self._current.children.append(node)
+        if tag not in VOID_TAGS:
+            self._current = node
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        node = Node(tag, {k: (v or "") for k, v in attrs}, self._current)
+        self._current.children.append(node)
+
+    def handle_endtag(self, tag: str) -> None:
+        # Close up to the matching open tag; ignore stray end tags
+        node: Optional[Node] = self._current
+        while node is not None and node is not self.root:
+            if node.tag == tag:
+                self._current = node.parent or self.root
+                return
+            node = node.parent
+
+    def handle_data(self, data: str) -> None:
+        if data:
+            self._current.texts.append((len(self._current.children), data))
+
+
+def parse_document(html: str) -> Node:
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+def _first_text(card: Node, pred: Callable[[Node], bool]) -> str:
+    node = card.find(pred)
+    return node.text() if node else ""
+
+
+def _own_text_contains(needles: Sequence[str]) -> Callable[[Node], bool]:
+    return lambda node: any(needle in node.own_text() for needle in needles)
+
+
+def _is_heading(node: Node) -> bool:
+    return node.tag in ("h3", "h4", "p")
+
+
+def _image_url(card: Node) -> Optional[str]:
+    img = card.find(lambda node: node.tag == "img")
+    if img is None:
+        return None
+    for attr in ["src", "data-src", "data-srcset", "srcset"]:
+        val = img.get(attr)
+        if val:
+            return first_image_url(val)
+    return None
+
+
+def _outermost(cards: List[Node]) -> List[Node]:
+    """Drop cards nested inside another matched card (e.g. the ADD button)."""
+    picked = set(id(card) for card in cards)
+    result: List[Node] = []
+    for card in cards:
+        parent = card.parent
+        nested = False
+        while parent is not None:
+            if id(parent) in picked:
+                nested = True
+                break
+            parent = parent.parent
+        if not nested:
+            result.append(card)
+    return result
+
+
+def _row(
+    platform: str,
+    search_term: str,
+    location: str,
+    name: str,
+    price: str,
+    quantity: str,
+    url: Optional[str],
+    image_url: Optional[str],
+    raw_text: str,
+) -> Dict[str, Any]:
+    return {
+        "search_term": search_term,
+        "product_name": name,
+        "price": price,
+        "quantity": quantity,
+        "platform": PLATFORM_LABELS[platform],
+        "location": location,
+        "url": url,
+        "image_url": image_url,
+        "raw_text": raw_text,
+    }
+
+
+def parse_zepto(doc: Node, search_term: str, location: str = "") -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    cards = doc.find_all(lambda node: node.tag == "a" and "/pn/" in node.get("href"))
+    for card in _outermost(cards):
+        raw_text = card.text()
+        href = resolve_url([card.get("href")], ZEPTO_BASE)
+        name, price, quantity = fill_from_raw_text(
+            raw_text,
+            _first_text(card, lambda node: node.tag == "h5"),
+            _first_text(card, lambda node: node.tag == "h4" and node.get("data-testid") == "product-card-price"),
+            _first_text(card, lambda node: node.tag == "span" and node.get("data-testid") == "product-card-quantity"),
+        )
+        if ((not name) or (quantity and name == quantity)) and href and "/pn/" in href:
+            slug = href.split("/pn/")[1].split("/pvid/")[0]
+            name = slug.replace("-", " ").strip() or name
+        rows.append(_row("zepto", search_term, location, name, price, quantity, href, _image_url(card), raw_text))
+    return rows
+
+
+def _is_blinkit_card(node: Node) -> bool:
+    if node.get("role") != "button" or node.get("id") == "product_container":
+        return False
+    return node.find(lambda child: child.tag == "div" and child.own_text().strip() == "ADD") is not None
+
+
+def parse_blinkit(doc: Node, search_term: str, location: str = "") -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    for card in _outermost(doc.find_all(_is_blinkit_card)):
+        raw_text = card.text()
+        # Blinkit renders the name with line-clamp-2 and the pack size with line-clamp-1
+        name = _first_text(card, lambda node: "tw-line-clamp-2" in node.classes()) or _first_text(card, _is_heading)
+        quantity = _first_text(card, lambda node: "tw-line-clamp-1" in node.classes())
+        price = _first_text(card, _own_text_contains(["₹"]))
+        name, price, quantity = fill_from_raw_text(raw_text, name, price, quantity)
+        if not price:
+            # Skip placeholders/skeleton cards without price
+            continue
+        if name.strip().upper() == "ADD":
+            continue
+        links: List[str] = [card.get("href")]
+        node: Optional[Node] = card
+        for _ in range(4):
+            if node is None:
+                break
+            links.extend(node.get(attr) for attr in URL_DATA_ATTRS)
+            node = node.parent
+        links.extend(a.get("href") for a in card.find_all(lambda child: child.tag == "a"))
+        url = resolve_url([link for link in links if link], BLINKIT_BASE, search_term)
+        rows.append(_row("blinkit", search_term, location, name, price, quantity, url, _image_url(card), raw_text))
+    return rows
+
+
+def _is_instamart_card(node: Node) -> bool:
+    testid = node.get("data-testid")
+    cls = node.get("class")
+    if node.tag == "div" and (
+        "item-card" in testid or "product-card" in testid
+        or "itemCard" in cls or "product-card" in cls or "_1ds9T" in cls
+    ):
+        return True
+    return node.tag == "a" and "instamart" in node.get("href")
+
+
+def parse_instamart(doc: Node, search_term: str, location: str = "") -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    for card in _outermost(doc.find_all(_is_instamart_card)):
+        raw_text = card.text()
+        if not raw_text:
+            continue
+        name, price, quantity = fill_from_raw_text(
+            raw_text,
+            _first_text(card, _is_heading),
+            _first_text(card, _own_text_contains(["₹"])),
+            _first_text(card, _own_text_contains(QUANTITY_UNITS)),
+        )
+        href = resolve_url([card.get("href")], INSTAMART_BASE) if card.tag == "a" else None
+        rows.append(_row("instamart", search_term, location, name, price, quantity, href, _image_url(card), raw_text))
+    return rows
+
+
+PARSERS: Dict[str, Callable[[Node, str, str], List[Dict[str, Any]]]] = {
+    "zepto": parse_zepto,
+    "blinkit": parse_blinkit,
+    "instamart": parse_instamart,
+}
+
+
+def parse_html(html: str, platform: str, search_term: str, location: str = "") -> List[Dict[str, Any]]:
+    """Parse a results page into SearchRow-shaped dicts for the given platform."""
+    parser = PARSERS.get(platform.lower())
+    if parser is None:
+        raise ValueError(f"unknown platform: {platform}")
+    return parser(parse_document(html), search_term, location)
+
+
+def guess_page_meta(path: str) -> Tuple[Optional[str], Optional[str]]:
+    """Infer (platform, term) from names like blinkit_milk_page.html."""
+    match = _PAGE_FILE_RE.match(os.path.basename(path))
+    if not match:
+        return None, None
+    return match.group(1).lower(), match.group(2).replace("_", " ")
+
+
+def parse_file(path: str, platform: Optional[str] = None, search_term: Optional[str] = None) -> List[Dict[str, Any]]:
+    guessed_platform, guessed_term = guess_page_meta(path)
+    platform = platform or guessed_platform
+    search_term = search_term or guessed_term or ""
+    if not platform:
+        raise ValueError(f"cannot tell the platform of {path}; pass --platform")
+    with open(path, "r", encoding="utf-8", errors="ignore") as fh:
+        return parse_html(fh.read(), platform, search_term)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Re-extract rows from saved result pages.")
+    ap.add_argument("paths", nargs="+", help="HTML files or glob patterns")
+    ap.add_argument("--platform", choices=sorted(PARSERS), help="override platform detection")
+    ap.add_argument("--term", help="override the search term taken from the file name")
+    ap.add_argument("--out", help="write rows to this JSON file instead of stdout")
+    args = ap.parse_args(argv)
+
+    files: List[str] = []
+    for pattern in args.paths:
+        files.extend(sorted(glob.glob(pattern)) or [pattern])
+
+    rows: List[Dict[str, Any]] = []
+    for path in files:
+        try:
+            page_rows = parse_file(path, args.platform, args.term)
+        except Exception as e:
+            print(f" Could not parse {path}: {e}", file=sys.stderr)
+            continue
+        print(f" {path}: {len(page_rows)} rows", file=sys.stderr)
+        rows.extend(page_rows)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(rows, fh, indent=4, ensure_ascii=False)
+    else:
+        sys.stdout.reconfigure(encoding="utf-8")  # type: ignore[attr-defined]
+        json.dump(rows, sys.stdout, indent=4, ensure_ascii=False)
+        sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
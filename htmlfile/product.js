@@ -63,7 +63,10 @@ document.addEventListener('DOMContentLoaded', () => {
 
             // Trigger scrapes
             setStatus(`Scraping "${term}" (attempt ${attempt}/${maxAttempts}) ...`);
-            await scrapeBoth(term);
+            await scrapeBoth(term, (rows) => {
+                renderProducts((preExisting || []).concat(rows), term);
+                setStatus(`Scraping "${term}" ... ${rows.length} new results so far`);
+            });
 
             // Reload combined after scrape
             const fresh = await fetchCombined(term, { silentIfEmpty: true });
@@ -610,22 +613,77 @@ document.addEventListener('DOMContentLoaded', () => {
         return fetchAndRender(term, opts);
     }
 
-    async function scrapeBoth(term) {
+    async function waitForJob(base, body) {
+        // POST /scrape answers 202 with a job id; poll until the job finishes.
+        if (!body.job_id) return body;
+        const deadline = Date.now() + 180000;
+        while (Date.now() < deadline) {
+            await new Promise(resolve => setTimeout(resolve, 1500));
+            const res = await fetch(`${base}/jobs/${body.job_id}`);
+            if (!res.ok) return { status: 'error', error: `Job ${body.job_id} not found` };
+            const job = await res.json();
+            if (job.state === 'done') return job;
+            if (job.state === 'error') return { status: 'error', error: job.error || 'Scrape error' };
+            if (job.progress) setStatus(`Scraping "${job.term}"... ${job.progress.cards} results found`);
+        }
+        return { status: 'error', error: 'Scrape is taking too long' };
+    }
+
+    function streamScrape(base, term, onRow) {
+        // GET /scrape/stream pushes each row as it is scraped; resolves with the final event body,
+        // or null when streaming is unavailable so the caller can fall back to POST + polling.
+        return new Promise((resolve) => {
+            if (!window.EventSource) return resolve(null);
+            const source = new EventSource(`${base}/scrape/stream?term=${encodeURIComponent(term)}`);
+            let settled = false;
+            const finish = (body) => {
+                if (settled) return;
+                settled = true;
+                clearTimeout(timer);
+                source.close();
+                resolve(body);
+            };
+            const timer = setTimeout(() => finish({ status: 'error', error: 'Scrape is taking too long' }), 180000);
+            source.addEventListener('row', (e) => onRow(JSON.parse(e.data)));
+            source.addEventListener('done', (e) => finish(JSON.parse(e.data)));
+            source.addEventListener('cached', (e) => finish(JSON.parse(e.data)));
+            source.addEventListener('failed', (e) => finish({ status: 'error', ...JSON.parse(e.data) }));
+            source.onerror = () => finish(null);
+        });
+    }
+
+    async function scrapeViaJob(base, term) {
+        const res = await fetch(`${base}/scrape`, {
+            method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ product: term })
+        });
+        const body = await res.json();
+        if (!res.ok) return { status: 'error', ...body };
+        return waitForJob(base, body);
+    }
+
+    async function scrapeBoth(term, onRows = null) {
         const errors = [];
-        const responses = await Promise.allSettled([
-            fetch('http://localhost:5000/scrape', {
-                method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ product: term })
-            }),
-            fetch('http://localhost:5001/scrape', {
-                method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ product: term })
-            })
-        ]);
+        const streamed = [];
+        let renderTimer = null;
+        const onRow = (row) => {
+            streamed.push(row);
+            if (!onRows || renderTimer) return;
+            renderTimer = setTimeout(() => {
+                renderTimer = null;
+                onRows(streamed.slice());
+            }, 250);
+        };
+        const bases = ['http://localhost:5000', 'http://localhost:5001'];
+        const responses = await Promise.allSettled(bases.map(async (base) => {
+            const body = await streamScrape(base, term, onRow);
+            return body || scrapeViaJob(base, term);
+        }));
+        if (renderTimer) clearTimeout(renderTimer);
 
         for (const res of responses) {
             if (res.status === 'fulfilled') {
-                const ok = res.value.ok;
-                const body = await res.value.json();
-                if (!ok || body.status === 'error') {
+                const body = res.value;
+                if (body.status === 'error') {
                     errors.push(body.error || body.stderr || 'Scrape error');
                 }
             } else {
@@ -0,0 +1,262 @@
+"""Append-only JSONL fallback store for scraped rows.
+
+Replaces the rewrite-the-whole-file JSON fallbacks. OUTPUT_FILE=scraped_data.json
+now maps to segments scraped_data.00001.jsonl, scraped_data.00002.jsonl, ... with
+one row per line. Appends only ever add bytes to the newest segment, so a scrape
+costs O(rows written) instead of O(history).
+
+* Atomic appends: each call takes an exclusive lock file (across threads and
+  processes), writes all its lines with a single write() and fsyncs.
+* Rotation: a new segment starts when the active one would pass
+  JSONL_MAX_BYTES; only the newest JSONL_MAX_SEGMENTS segments are kept.
+* Offset index: scraped_data.idx.jsonl records (term, segment, offset, length)
+  per appended term, so readers seek straight to a term's rows instead of
+  parsing everything.
+
+A legacy JSON array file found next to an empty store is imported once; the
+file itself is left in place and scraped_data.imported marks it as done.
+"""
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+    import msvcrt
+
+MAX_BYTES = int(os.getenv("JSONL_MAX_BYTES", str(16 * 1024 * 1024)))
+MAX_SEGMENTS = int(os.getenv("JSONL_MAX_SEGMENTS", "10"))
+
+_stores: Dict[str, "JsonlStore"] = {}
+_stores_lock = threading.Lock()
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Exclusive lock on `path` (created if missing) across processes; not re-entrant, pair it with a thread lock."""
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path, "a+b") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        else:
+            fh.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def normalize_term(term: Any) -> str:
+    return " ".join(str(term or "").lower().split())
+
+
+class JsonlStore:
+    """Rotating, indexed JSONL segments behind one legacy OUTPUT_FILE name."""
+
+    def __init__(self, output_file: str) -> None:
+        root, ext = os.path.splitext(os.path.abspath(output_file))
+        self.base = root if ext in (".json", ".jsonl") else os.path.abspath(output_file)
+        self.legacy_file = f"{self.base}.json"
+        self.index_file = f"{self.base}.idx.jsonl"
+        self.lock_file = f"{self.base}.lock"
+        self.import_marker = f"{self.base}.imported"
+        self._thread_lock = threading.Lock()
+
+    # -- files ---------------------------------------------------------------
+
+    def _segment_path(self, seq: int) -> str:
+        return f"{self.base}.{seq:05d}.jsonl"
+
+    def segments(self) -> List[int]:
+        folder, prefix = os.path.split(self.base)
+        pattern = re.compile(re.escape(prefix) + r"\.(\d{5})\.jsonl$")
+        try:
+            names = os.listdir(folder or ".")
+        except OSError:
+            return []
+        return sorted(int(m.group(1)) for m in (pattern.match(name) for name in names) if m)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._thread_lock, file_lock(self.lock_file):
+            yield
+
+    @staticmethod
+    def _write_all(path: str, data: bytes) -> int:
+        """Append data with one write() on an O_APPEND descriptor; returns the start offset."""
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            offset = os.lseek(fd, 0, os.SEEK_END)
+            view = memoryview(data)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+            os.fsync(fd)
+            return offset
+        finally:
+            os.close(fd)
+
+    # -- writing -------------------------------------------------------------
+
+    def _rotate_if_needed(self, incoming: int) -> int:
+        segs = self.segments()
+        seq = segs[-1] if segs else 1
+        path = self._segment_path(seq)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size and size + incoming > MAX_BYTES:
+            seq += 1
+            print(f" Rotating {os.path.basename(path)} ({size} bytes); new segment {os.path.basename(self._segment_path(seq))}")
+            self._prune(segs + [seq])
+        return seq
+
+    def _prune(self, segs: List[int]) -> None:
+        doomed = segs[:-MAX_SEGMENTS] if MAX_SEGMENTS > 0 else []
+        if not doomed:
+            return
+        for seq in doomed:
+            try:
+                os.remove(self._segment_path(seq))
+            except OSError:
+                pass
+        keep = [entry for entry in self._index_entries() if entry.get("seg") not in doomed]
+        tmp_path = f"{self.index_file}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            for entry in keep:
+                fh.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.index_file)
+
+    def _append_locked(self, rows: List[Dict[str, Any]]) -> int:
+        groups: Dict[str, List[bytes]] = {}
+        for row in rows:
+            line = json.dumps(row, ensure_ascii=False, default=str).encode("utf-8") + b"\n"
+            groups.setdefault(normalize_term(row.get("search_term")), []).append(line)
+        payload = b"".join(b"".join(lines) for lines in groups.values())
+        seq = self._rotate_if_needed(len(payload))
+        offset = self._write_all(self._segment_path(seq), payload)
+
+        entries: List[bytes] = []
+        now = time.time()
+        for term, lines in groups.items():
+            length = sum(len(line) for line in lines)
+            entry = {"term": term, "seg": seq, "offset": offset, "length": length, "rows": len(lines), "ts": now}
+            entries.append(json.dumps(entry).encode("utf-8") + b"\n")
+            offset += length
+        self._write_all(self.index_file, b"".join(entries))
+        return len(rows)
+
+    def append(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Append rows (grouped by search term) and index them; safe across processes."""
+        materialized = [dict(row) for row in rows]
+        with self._locked():
+            self._import_legacy_locked()
+            if not materialized:
+                return 0
+            return self._append_locked(materialized)
+
+    def _import_legacy_locked(self) -> None:
+        if os.path.exists(self.import_marker) or self.segments() or not os.path.exists(self.legacy_file):
+            return
+        try:
+            with open(self.legacy_file, "r", encoding="utf-8") as fh:
+                data = json.load(fh) or []
+        except Exception as e:
+            print(f" Could not import legacy {self.legacy_file}: {e}")
+            return
+        rows = [row for row in data if isinstance(row, dict)] if isinstance(data, list) else []
+        if rows:
+            self._append_locked(rows)
+        # Leave the legacy file alone (it may be tracked sample data); the marker stops a re-import
+        marker = {"source": os.path.basename(self.legacy_file), "rows": len(rows), "ts": time.time()}
+        with open(self.import_marker, "w", encoding="utf-8") as fh:
+            json.dump(marker, fh)
+        print(f" Imported {len(rows)} rows from {os.path.basename(self.legacy_file)} into the JSONL store")
+
+    # -- reading -------------------------------------------------------------
+
+    def _index_entries(self) -> List[Dict[str, Any]]:
+        entries: List[Dict[str, Any]] = []
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue  # a torn last line from a crash
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _read_entry(self, entry: Dict[str, Any]) -> List[Dict[str, Any]]:
+        try:
+            with open(self._segment_path(int(entry["seg"])), "rb") as fh:
+                fh.seek(int(entry["offset"]))
+                chunk = fh.read(int(entry["length"]))
+        except (OSError, KeyError, ValueError):
+            return []
+        rows: List[Dict[str, Any]] = []
+        for line in chunk.splitlines():
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(row, dict):
+                rows.append(row)
+        return rows
+
+    def _ensure_imported(self) -> None:
+        if not self.segments() and os.path.exists(self.legacy_file):
+            with self._locked():
+                self._import_legacy_locked()
+
+    def _collect(self, entries: List[Dict[str, Any]], platform_prefix: str, limit: int) -> List[Dict[str, Any]]:
+        items: List[Dict[str, Any]] = []
+        for entry in reversed(entries):
+            rows = self._read_entry(entry)
+            for row in reversed(rows):
+                if platform_prefix and not str(row.get("platform") or "").lower().startswith(platform_prefix):
+                    continue
+                items.append(row)
+                if len(items) >= limit:
+                    return items
+        return items
+
+    def rows_for_term(self, term: str, platform_prefix: str = "", limit: int = 100) -> List[Dict[str, Any]]:
+        """Newest rows whose search term contains `term` (case-insensitive), via the offset index."""
+        self._ensure_imported()
+        wanted = normalize_term(term)
+        entries = [entry for entry in self._index_entries() if wanted in str(entry.get("term", ""))]
+        return self._collect(entries, platform_prefix.lower(), limit)
+
+    def latest(self, platform_prefix: str = "", limit: int = 100) -> List[Dict[str, Any]]:
+        """Newest rows across all terms."""
+        self._ensure_imported()
+        return self._collect(self._index_entries(), platform_prefix.lower(), limit)
+
+
+def open_store(output_file: str) -> JsonlStore:
+    """Shared store instance per OUTPUT_FILE (so in-process appends share a lock)."""
+    key = os.path.abspath(output_file)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = JsonlStore(output_file)
+            _stores[key] = store
+        return store
@@ -0,0 +1,145 @@
+"""Delivery locations for location-specific pricing.
+
+Locations come from SCRAPE_LOCATIONS (``label:lat:lng:pin`` entries separated by
+``;``) or from a JSON file (SCRAPE_LOCATIONS_FILE, default locations.json) holding
+``[{"label": "Koramangala", "lat": 12.9352, "lng": 77.6245, "pin": "560034"}]``.
+Zepto's older ZEPTO_LOCATIONS labels are kept as label-only entries.
+
+Every location gets its own browser (own geolocation override and pin), and the
+label is what ends up in each row's ``location`` field.
+"""
+import json
+import os
+from typing import Any, Iterable, List, NamedTuple, Optional, Tuple
+
+LOCATIONS_FILE = os.getenv("SCRAPE_LOCATIONS_FILE", "locations.json")
+
+
+class Location(NamedTuple):
+    label: str
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+    pin: Optional[str] = None
+
+
+def _float(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_locations(raw: str) -> List[Location]:
+    """Parse ``label:lat:lng:pin;label2:...`` (lat/lng/pin optional)."""
+    found: List[Location] = []
+    for entry in raw.replace("\n", ";").split(";"):
+        parts = [part.strip() for part in entry.split(":")]
+        if not parts or not parts[0]:
+            continue
+        parts += [""] * (4 - len(parts))
+        found.append(Location(parts[0], _float(parts[1]), _float(parts[2]), parts[3] or None))
+    return found
+
+
+def format_locations(where: Iterable[Location]) -> str:
+    """Inverse of parse_locations(), for handing a selection to a scraper subprocess."""
+    return ";".join(
+        ":".join("" if part is None else str(part) for part in (loc.label, loc.lat, loc.lng, loc.pin)) for loc in where
+    )
+
+
+def _from_file(path: str) -> List[Location]:
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except Exception as e:
+        print(f"Could not read {path}: {e}")
+        return []
+    found: List[Location] = []
+    for item in data if isinstance(data, list) else []:
+        if isinstance(item, dict) and str(item.get("label") or "").strip():
+            pin = item.get("pin")
+            found.append(Location(
+                str(item["label"]).strip(),
+                _float(item.get("lat")),
+                _float(item.get("lng")),
+                str(pin) if pin else None,
+            ))
+    return found
+
+
+def load_locations(platform: str = "") -> List[Location]:
+    """All configured locations (env first, then the JSON file)."""
+    found = parse_locations(os.getenv("SCRAPE_LOCATIONS", "")) or _from_file(LOCATIONS_FILE)
+    if platform == "zepto":
+        known = {loc.label.lower() for loc in found}
+        for label in os.getenv("ZEPTO_LOCATIONS", "").split(","):
+            label = label.strip()
+            if label and label.lower() not in known:
+                found.append(Location(label))
+    return found
+
+
+def find(label: str, platform: str = "") -> Optional[Location]:
+    if not label:
+        return None
+    wanted = label.strip().lower()
+    for loc in load_locations(platform):
+        if loc.label.lower() == wanted:
+            return loc
+    return None
+
+
+def select(names: Iterable[str], platform: str = "") -> List[Location]:
+    """Resolve requested labels (or ``all``) to configured locations; unknown labels raise ValueError."""
+    names = [name.strip() for name in names if name and name.strip()]
+    configured = load_locations(platform)
+    if any(name.lower() == "all" for name in names):
+        return configured
+    picked: List[Location] = []
+    unknown: List[str] = []
+    for name in names:
+        loc = next((loc for loc in configured if loc.label.lower() == name.lower()), None)
+        if loc is None:
+            unknown.append(name)
+        elif loc not in picked:
+            picked.append(loc)
+    if unknown:
+        raise ValueError(f"unknown location(s): {', '.join(unknown)}")
+    return picked
+
+
+def split_names(value: Any) -> List[str]:
+    """Accept a list or a comma-separated string from a request body."""
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [part.strip() for part in str(value or "").split(",") if part.strip()]
+
+
+def coords(location: Optional[Location], default_lat: Any, default_lng: Any) -> Tuple[float, float]:
+    if location is not None and location.lat is not None and location.lng is not None:
+        return location.lat, location.lng
+    return float(default_lat), float(default_lng)
+
+
+def pin_for(label: str, default_pin: str, platform: str = "") -> str:
+    loc = find(label, platform)
+    return loc.pin if loc is not None and loc.pin else default_pin
+
+
+def set_geolocation(driver: Any, lat: float, lng: float) -> None:
+    """Emulate the browser's position (per-driver, so each location keeps its own)."""
+    try:
+        driver.execute_cdp_cmd("Browser.grantPermissions", {"permissions": ["geolocation"]})
+    except Exception:
+        pass
+    try:
+        driver.execute_cdp_cmd("Emulation.setGeolocationOverride", {
+            "latitude": lat,
+            "longitude": lng,
+            "accuracy": 50
+        })
+    except Exception:
+        pass
@@ -0,0 +1,206 @@
+"""Fold the old one-collection-per-term data into the shared products collection.
+
+Before the products collection, every search term had its own collection in a
+per-platform database: snapit_zepto.<term>, snapit_blinkit.blinkit_<term> and
+snapit_instamart.instamart_<term>. This copies every row into
+PRODUCTS_DB.PRODUCTS_COLLECTION with the platform_key / term_norm / scraped_at
+keys the servers query on.
+
+Rows are upserted by fingerprint (see mongo_client.fingerprint), so repeated
+scrapes of one product collapse into a single document carrying the latest
+price and every term it was found under; a legacy row never replaces a newer
+price already in the collection, and running the tool again adds nothing. scraped_at falls back to the ObjectId's creation time. Product rows
+saved before fingerprints existed, or whose fingerprint still included the
+search term, are re-keyed as well, keeping the newest copy of each product.
+
+    python migrate_products.py --dry-run
+    python migrate_products.py
+    python migrate_products.py --drop     # drop each source collection once copied
+    python migrate_products.py --history  # also build price history from the old rows
+"""
+import argparse
+import os
+from typing import Any, Dict, List, Tuple
+
+from pymongo import UpdateOne
+
+import mongo_client
+
+# (platform, database, uri) of the legacy per-term collections
+LEGACY_SOURCES: List[Tuple[str, str, str]] = [
+    (
+        "zepto",
+        os.getenv("ZEPTO_DB", os.getenv("MONGO_DB", "snapit_zepto")),
+        os.getenv("ZEPTO_MONGO_URI", mongo_client.MONGO_URI),
+    ),
+    (
+        "blinkit",
+        os.getenv("BLINKIT_DB", "snapit_blinkit"),
+        os.getenv("BLINKIT_MONGO_URI", mongo_client.MONGO_URI),
+    ),
+    (
+        "instamart",
+        os.getenv("INSTAMART_DB", "snapit_instamart"),
+        os.getenv("INSTAMART_MONGO_URI", mongo_client.MONGO_URI),
+    ),
+]
+
+
+def legacy_doc(doc: Dict[str, Any], platform: str, collection_name: str) -> Dict[str, Any]:
+    row = dict(doc)
+    if not row.get("search_term"):
+        # Collections were named after the term (blinkit_/instamart_ prefixed)
+        row["search_term"] = collection_name.split("_", 1)[1] if collection_name.startswith(f"{platform}_") else collection_name
+        row["search_term"] = row["search_term"].replace("_", " ")
+    scraped_at = doc["_id"].generation_time if hasattr(doc.get("_id"), "generation_time") else None
+    return mongo_client.product_doc(row, platform, scraped_at)
+
+
+def legacy_upserts(doc: Dict[str, Any]) -> List[UpdateOne]:
+    """Fold one legacy row into its product without overwriting a newer price.
+
+    The first op inserts the product (or just adds the term and an earlier
+    first_seen); the second moves price / scraped_at only when this row is
+    newer than what the product holds, so live scrapes and out-of-order rows in
+    an unordered bulk write keep the latest price.
+    """
+    doc = dict(doc)
+    fp = doc["fingerprint"] = mongo_client.fingerprint(doc)
+    terms = doc.pop("terms", None) or ([doc["term_norm"]] if doc.get("term_norm") else [])
+    latest = {key: doc.pop(key) for key in mongo_client.MUTABLE_FIELDS if key in doc}
+    first_seen = doc.pop("first_seen", None) or latest.get("scraped_at")
+    insert: Dict[str, Any] = {"$setOnInsert": {**doc, **latest}}
+    if first_seen is not None:
+        insert["$min"] = {"first_seen": first_seen}
+    if terms:
+        insert["$addToSet"] = {"terms": {"$each": terms}}
+    ops = [UpdateOne({"fingerprint": fp}, insert, upsert=True)]
+    if latest.get("scraped_at") is not None:
+        ops.append(UpdateOne({"fingerprint": fp, "scraped_at": {"$lt": latest["scraped_at"]}}, {"$set": latest}))
+    return ops
+
+
+def _upsert(target: Any, docs: List[Dict[str, Any]], history: bool) -> int:
+    result = target.bulk_write([op for doc in docs for op in legacy_upserts(doc)], ordered=False)
+    if history:
+        mongo_client.record_prices(docs)
+    return result.upserted_count
+
+
+def migrate_collection(
+    source: Any, target: Any, platform: str, batch: int, dry_run: bool, history: bool = False
+) -> Tuple[int, int]:
+    """Copy one legacy collection oldest-first; returns (rows seen, products added)."""
+    seen = inserted = 0
+    pending: List[Dict[str, Any]] = []
+    for doc in source.find().sort("_id", 1):
+        if not (doc.get("product_name") or doc.get("search_term")):
+            continue  # connection tests and other non-product documents
+        seen += 1
+        pending.append(legacy_doc(doc, platform, source.name))
+        if len(pending) >= batch:
+            inserted += 0 if dry_run else _upsert(target, pending, history)
+            pending = []
+    if pending and not dry_run:
+        inserted += _upsert(target, pending, history)
+    return seen, inserted
+
+
+def _move_rollups(old_fp: str, new_fp: str) -> None:
+    """Fold one fingerprint's price buckets into another's (the target keeps its own `last`)."""
+    rollups = mongo_client.price_history_collection()
+    ops = [
+        UpdateOne(
+            {"fingerprint": new_fp, "granularity": row["granularity"], "bucket": row["bucket"]},
+            {
+                "$min": {"min": row.get("min")},
+                "$max": {"max": row.get("max")},
+                "$inc": {"sum": row.get("sum") or 0, "count": row.get("count") or 0},
+                "$setOnInsert": {key: row.get(key) for key in (
+                    "last", "platform_key", "term_norm", "product_name", "location", "expire_at",
+                )},
+            },
+            upsert=True,
+        )
+        for row in rollups.find({"fingerprint": old_fp})
+    ]
+    if ops:
+        rollups.bulk_write(ops, ordered=False)
+        rollups.delete_many({"fingerprint": old_fp})
+
+
+def backfill_keys(target: Any) -> Tuple[int, int]:
+    """Re-key product rows to the current fingerprint, keeping the newest copy of each product.
+
+    Covers rows saved before fingerprints existed and rows whose fingerprint
+    still included the search term: copies of one product found under several
+    terms merge into one document whose `terms` lists them all, and their price
+    buckets merge with them. A row without a fingerprint has its price folded
+    into the history first (each row is seen once, so this stays safe to
+    re-run). Returns (rows updated, duplicate rows removed).
+    """
+    updated = removed = 0
+    stale = {"$or": [{"fingerprint": {"$exists": False}}, {"terms": {"$exists": False}}]}
+    for doc in target.find(stale).sort("scraped_at", -1):
+        fp = mongo_client.fingerprint(doc)
+        old_fp = doc.get("fingerprint")
+        terms = [doc["term_norm"]] if doc.get("term_norm") else []
+        if old_fp is None:
+            mongo_client.record_prices([{**doc, "fingerprint": fp}])
+        elif old_fp != fp:
+            _move_rollups(old_fp, fp)
+        kept = target.find_one({"fingerprint": fp, "_id": {"$ne": doc["_id"]}}, {"_id": 1})
+        if kept is not None:
+            if terms:
+                target.update_one({"_id": kept["_id"]}, {"$addToSet": {"terms": {"$each": terms}}})
+            target.delete_one({"_id": doc["_id"]})
+            removed += 1
+            continue
+        target.update_one(
+            {"_id": doc["_id"]},
+            {"$set": {
+                "fingerprint": fp,
+                "terms": terms,
+                "name_tokens": mongo_client.name_tokens(doc.get("product_name")),
+                "first_seen": doc.get("first_seen") or doc.get("scraped_at"),
+            }},
+        )
+        updated += 1
+    return updated, removed
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Copy per-term collections into the products collection")
+    ap.add_argument("--dry-run", action="store_true", help="count rows without writing")
+    ap.add_argument("--drop", action="store_true", help="drop each source collection after it is copied")
+    ap.add_argument("--history", action="store_true",
+                    help="also fold legacy prices into the price history (once: a second run counts them again)")
+    ap.add_argument("--batch", type=int, default=1000, help="rows per bulk write (default 1000)")
+    args = ap.parse_args()
+
+    target = mongo_client.products_collection()
+    total_seen = total_inserted = 0
+    for platform, db_name, uri in LEGACY_SOURCES:
+        db = mongo_client.get_collection(None, db_name=db_name, uri=uri).database
+        for name in sorted(db.list_collection_names()):
+            own = (mongo_client.PRODUCTS_COLLECTION, mongo_client.PRICE_HISTORY_COLLECTION)
+            if name.startswith("system.") or (db_name == mongo_client.PRODUCTS_DB and name in own):
+                continue
+            seen, inserted = migrate_collection(db[name], target, platform, args.batch, args.dry_run, args.history)
+            total_seen += seen
+            total_inserted += inserted
+            print(f" {db_name}.{name}: {seen} rows, {inserted} new products")
+            if args.drop and not args.dry_run and seen:
+                db.drop_collection(name)
+                print(f"   dropped {db_name}.{name}")
+    if not args.dry_run:
+        updated, removed = backfill_keys(target)
+        if updated or removed:
+            print(f" Fingerprinted {updated} existing product rows, removed {removed} older duplicates")
+    action = "would copy" if args.dry_run else "new products"
+    print(f"\n Done: {total_seen} rows seen, {total_inserted if not args.dry_run else total_seen} {action}"
+          f" into {mongo_client.PRODUCTS_DB}.{mongo_client.PRODUCTS_COLLECTION}.")
+
+
+if __name__ == "__main__":
+    main()
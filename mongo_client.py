@@ -1,15 +1,68 @@
+import asyncio
+import atexit
+import functools
+import hashlib
+import inspect
+import json
 import os
-from typing import Any, Dict, Iterable, List, Optional
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Protocol, Sequence, Tuple, TypeVar
 
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING, TEXT, MongoClient, UpdateOne
 from pymongo.collection import Collection
 from pymongo.database import Database
 
+import query_stats
+
 # Configure via environment variables (defaults to local Mongo)
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 # Default DB for Zepto; other sources should pass db_name explicitly (e.g., blinkit, instamart)
 MONGO_DB = os.getenv("MONGO_DB", "snapit_zepto")
 MONGO_COLLECTION = os.getenv("MONGO_COLLECTION", "prices")
+# Scraped rows from every platform live in one collection (see migrate_products.py
+# for folding in the old per-term collections)
+PRODUCTS_URI = os.getenv("PRODUCTS_MONGO_URI", MONGO_URI)
+PRODUCTS_DB = os.getenv("PRODUCTS_DB", "snapit")
+PRODUCTS_COLLECTION = os.getenv("PRODUCTS_COLLECTION", "products")
+PLATFORMS = ("zepto", "blinkit", "instamart")
+# mongo (default) or sqlite: an embedded, indexed store for single-node setups without Mongo
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo").strip().lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapit.sqlite3"))
+# Hourly / daily min-avg-max price buckets per product fingerprint, kept up on every save
+PRICE_HISTORY_COLLECTION = os.getenv("PRICE_HISTORY_COLLECTION", "price_rollups")
+ROLLUP_GRANULARITIES = ("hour", "day")
+# Retention (days, 0 keeps forever): products not seen again are dropped, hourly
+# buckets expire once the daily ones cover them, daily buckets bound the trend range
+PRODUCT_RETENTION_DAYS = float(os.getenv("PRODUCT_RETENTION_DAYS", "180"))
+ROLLUP_RETENTION_DAYS = {
+    "hour": float(os.getenv("HOURLY_ROLLUP_RETENTION_DAYS", "14")),
+    "day": float(os.getenv("DAILY_ROLLUP_RETENTION_DAYS", "730")),
+}
+# Price history is found through its product doc, so a product is kept as long as its buckets
+if PRODUCT_RETENTION_DAYS > 0:
+    if min(ROLLUP_RETENTION_DAYS.values()) <= 0:
+        PRODUCT_RETENTION_DAYS = 0.0
+    else:
+        PRODUCT_RETENTION_DAYS = max(PRODUCT_RETENTION_DAYS, *ROLLUP_RETENTION_DAYS.values())
+
+# Buffered ingest: scrapers hand rows to a background writer that bulk-writes them
+# by size or age and spools batches to disk while the store is unreachable
+INGEST_BUFFER = os.getenv("INGEST_BUFFER", "1") != "0"
+INGEST_BATCH = int(os.getenv("INGEST_BATCH", "500"))
+INGEST_FLUSH_SECONDS = float(os.getenv("INGEST_FLUSH_SECONDS", "2"))
+INGEST_REPLAY_SECONDS = float(os.getenv("INGEST_REPLAY_SECONDS", "30"))
+INGEST_SPOOL_DIR = os.getenv(
+    "INGEST_SPOOL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingest_spool")
+)
+
+# Threads behind the async helpers (shared by every event loop, so Flask's
+# per-request loops reuse pooled clients and connections)
+ASYNC_WORKERS = int(os.getenv("MONGO_ASYNC_WORKERS", "16"))
 
 # Cache clients per URI so different sources can use separate DBs/URIs
 _clients: Dict[str, MongoClient[Any]] = {}
@@ -30,7 +83,8 @@ def _get_client_for_uri(uri: Optional[str]) -> MongoClient[Any]:
     if not target_uri:
         raise RuntimeError("MONGO_URI is not set. Please export your MongoDB connection string.")
     if target_uri not in _clients:
-        _clients[target_uri] = MongoClient(target_uri)
+        listeners = query_stats.listeners(lambda: _clients[target_uri])
+        _clients[target_uri] = MongoClient(target_uri, event_listeners=listeners)
     return _clients[target_uri]
 
 
@@ -79,6 +133,811 @@ def save_records(
     return len(result.inserted_ids)
 
 
+def normalize_term(term: Any) -> str:
+    """Lower-case, single-spaced search term; the `term_norm` / `terms` keys of the products collection."""
+    return " ".join(str(term or "").lower().split())
+
+
+def name_tokens(name: Any) -> List[str]:
+    """Lower-case word tokens of a product name, in order, without repeats."""
+    return list(dict.fromkeys(re.findall(r"[a-z0-9]+", str(name or "").lower())))
+
+
+def platform_key(value: Any) -> str:
+    """'Zepto' / 'blinkit_milk' / 'Instamart' -> zepto / blinkit / instamart ('' if unknown)."""
+    text = str(value or "").lower()
+    for name in PLATFORMS:
+        if name in text:
+            return name
+    return ""
+
+
+def products_collection() -> Collection[Dict[str, Any]]:
+    col = get_collection(PRODUCTS_COLLECTION, db_name=PRODUCTS_DB, uri=PRODUCTS_URI)
+    ensure_product_indexes(col)
+    return col
+
+
+def ensure_product_indexes(col: Collection[Dict[str, Any]]) -> None:
+    """Compound indexes for the products collection, created once per process."""
+    key = f"{PRODUCTS_URI}.{PRODUCTS_DB}.{PRODUCTS_COLLECTION}"
+    if _indexes_created.get(key):
+        return
+    # platform + term (+ location) reads, newest first; `terms` holds every term a product was found under
+    col.create_index(
+        [("platform_key", ASCENDING), ("terms", ASCENDING), ("location", ASCENDING), ("scraped_at", DESCENDING)],
+        name="platform_terms_location_time",
+    )
+    # one term across all platforms
+    col.create_index([("terms", ASCENDING), ("scraped_at", DESCENDING)], name="terms_time")
+    # the single-term versions of those two, from before products were shared between terms
+    existing = col.index_information()
+    for name in ("platform_term_location_time", "term_time"):
+        if name in existing:
+            col.drop_index(name)
+    # newest rows per platform (/latest without a term)
+    col.create_index([("platform_key", ASCENDING), ("scraped_at", DESCENDING)], name="platform_time")
+    # free-form product-name search ($text) and token prefix lookups
+    col.create_index([("product_name", TEXT)], name="product_name_text")
+    col.create_index("name_tokens", name="name_tokens")
+    # one document per product sighting key; rows from before fingerprints have none
+    col.create_index(
+        "fingerprint", name="fingerprint_unique", unique=True,
+        partialFilterExpression={"fingerprint": {"$exists": True}},
+    )
+    # products not re-scraped within PRODUCT_RETENTION_DAYS expire
+    ensure_ttl_index(col, "scraped_at", "scraped_at_ttl", int(PRODUCT_RETENTION_DAYS * 86400))
+    _indexes_created[key] = True
+
+
+def ensure_ttl_index(col: Collection[Dict[str, Any]], field: str, name: str, seconds: int) -> None:
+    """Create, retune (collMod) or drop (seconds <= 0) a TTL index so it follows the configured retention."""
+    existing = col.index_information().get(name)
+    if seconds <= 0:
+        if existing:
+            col.drop_index(name)
+    elif existing is None:
+        col.create_index(field, name=name, expireAfterSeconds=seconds)
+    elif existing.get("expireAfterSeconds") != seconds:
+        col.database.command("collMod", col.name, index={"name": name, "expireAfterSeconds": seconds})
+
+
+def product_doc(record: Dict[str, Any], platform: str, scraped_at: Optional[datetime] = None) -> Dict[str, Any]:
+    """A scraped row plus the products-collection keys (platform_key, term_norm, terms, scraped_at)."""
+    doc = dict(record)
+    doc["platform_key"] = platform_key(platform) or platform_key(doc.get("platform")) or platform.lower()
+    doc["term_norm"] = normalize_term(doc.get("search_term"))
+    doc["terms"] = [doc["term_norm"]] if doc["term_norm"] else []
+    doc["name_tokens"] = name_tokens(doc.get("product_name"))
+    if not isinstance(doc.get("scraped_at"), datetime):
+        doc["scraped_at"] = scraped_at or datetime.now(timezone.utc)
+    return doc
+
+
+# Fields that change between scrapes of the same product; everything else is set on insert only
+MUTABLE_FIELDS = ("price", "scraped_at")
+
+
+# Search result pages used as a stand-in URL when a card has no product link
+SEARCH_URL_RE = re.compile(r"/(s|search)/?\?(.*&)?(q|query)=")
+
+
+def fingerprint(doc: Dict[str, Any]) -> str:
+    """Stable id for a product: platform, URL (or name words when the URL is only a
+    search page), quantity, location.
+
+    The search term is left out on purpose, so a product found under several
+    terms is one document (and one price history); the terms go into `terms`.
+    """
+    url = str(doc.get("url") or "").strip().lower()
+    if SEARCH_URL_RE.search(url):
+        url = ""  # search-page fallback (see batch_extract.resolve_url): every link-less card has one
+    ident = url.split("?")[0] or " ".join(name_tokens(doc.get("product_name")))
+    parts = [
+        str(doc.get("platform_key") or ""),
+        ident,
+        normalize_term(doc.get("quantity")),
+        normalize_term(doc.get("location")),
+    ]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def product_upsert(doc: Dict[str, Any]) -> UpdateOne:
+    """Upsert by fingerprint: new products are inserted whole, known ones get price / scraped_at and the term."""
+    doc = dict(doc)
+    doc["fingerprint"] = fingerprint(doc)
+    terms = doc.pop("terms", None) or ([doc["term_norm"]] if doc.get("term_norm") else [])
+    changing = {key: doc.pop(key) for key in MUTABLE_FIELDS if key in doc}
+    doc.setdefault("first_seen", changing.get("scraped_at"))
+    update: Dict[str, Any] = {"$set": changing, "$setOnInsert": doc}
+    if terms:
+        update["$addToSet"] = {"terms": {"$each": terms}}
+    return UpdateOne({"fingerprint": doc["fingerprint"]}, update, upsert=True)
+
+
+def _scraped_docs(records: Iterable[Dict[str, Any]], platform: str) -> List[Dict[str, Any]]:
+    """One product doc per product in a scrape's rows, fingerprint set."""
+    now = datetime.now(timezone.utc)
+    # Last row wins when a scrape lists the same product twice; its terms are kept
+    docs: Dict[str, Dict[str, Any]] = {}
+    for doc in (product_doc(rec, platform, now) for rec in records):
+        fp = doc["fingerprint"] = fingerprint(doc)
+        if fp in docs:
+            doc["terms"] = list(dict.fromkeys(docs[fp]["terms"] + doc["terms"]))
+        docs[fp] = doc
+    return list(docs.values())
+
+
+def save_products(records: Iterable[Dict[str, Any]], platform: str) -> int:
+    """Upsert scraped rows into the product store; re-scrapes update rows in place."""
+    docs = _scraped_docs(records, platform)
+    if not docs:
+        return 0
+    return product_store().save(docs)
+
+
+def find_products(
+    term: Optional[str] = None,
+    platforms: Optional[Sequence[str]] = None,
+    location: Optional[str] = None,
+    limit: int = 100,
+    projection: Optional[Dict[str, int]] = None,
+) -> List[Dict[str, Any]]:
+    """Newest rows for a term (exact normalized match) on the given platforms, as JSON-ready dicts."""
+    return product_store().latest(term, platforms, location, limit, projection)
+
+
+def search_products(
+    term: str,
+    platforms: Optional[Sequence[str]] = None,
+    location: Optional[str] = None,
+    limit: int = 100,
+    projection: Optional[Dict[str, int]] = None,
+) -> Tuple[List[Dict[str, Any]], str]:
+    """Rows searched as `term` (exact, then prefix), else product names matching it; see indexed_search()."""
+    return product_store().search(term, platforms, location, limit, projection)
+
+
+def find_price_history(
+    product: str,
+    platforms: Optional[Sequence[str]] = None,
+    granularity: str = "day",
+    days: int = 90,
+    limit: int = 10,
+) -> List[Dict[str, Any]]:
+    """Pre-aggregated price series for up to `limit` matching products, oldest point first."""
+    return product_store().price_history(product, platforms, granularity, days, limit)
+
+
+# -- price history ---------------------------------------------------------------
+
+def parse_price(value: Any) -> Optional[float]:
+    """'₹1,299.50' / '45' / 45 -> float; None when there is no number."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.search(r"\d[\d,]*(?:\.\d+)?", str(value or ""))
+    return float(match.group(0).replace(",", "")) if match else None
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    ts = ts.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0) if granularity == "day" else ts
+
+
+def history_since(granularity: str, days: int) -> datetime:
+    """Start of the oldest bucket a `days`-long history query returns."""
+    return bucket_start(datetime.now(timezone.utc) - timedelta(days=days), granularity)
+
+
+def is_fingerprint(value: str) -> bool:
+    return re.fullmatch(r"[0-9a-f]{40}", value.strip().lower()) is not None
+
+
+def rollup_point(row: Dict[str, Any]) -> Dict[str, Any]:
+    """One /history/price point from a rollup bucket (min, max, sum, count, last)."""
+    count = int(row.get("count") or 0)
+    bucket = row["bucket"]
+    return {
+        "t": bucket.isoformat() if isinstance(bucket, datetime) else str(bucket),
+        "min": row.get("min"),
+        "avg": round(float(row.get("sum") or 0) / count, 2) if count else None,
+        "max": row.get("max"),
+        "last": row.get("last"),
+        "count": count,
+    }
+
+
+def history_series(products: List[Dict[str, Any]], points: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "fingerprint": doc["fingerprint"],
+            "product_name": doc.get("product_name"),
+            "platform": doc.get("platform_key"),
+            "location": doc.get("location"),
+            "quantity": doc.get("quantity"),
+            "points": points.get(doc["fingerprint"], []),
+        }
+        for doc in products
+    ]
+
+
+def price_history_collection() -> Collection[Dict[str, Any]]:
+    col = get_collection(PRICE_HISTORY_COLLECTION, db_name=PRODUCTS_DB, uri=PRODUCTS_URI)
+    key = f"{PRODUCTS_URI}.{PRODUCTS_DB}.{PRICE_HISTORY_COLLECTION}"
+    if not _indexes_created.get(key):
+        # one bucket per product and period; also serves "this product, this range" reads
+        col.create_index(
+            [("fingerprint", ASCENDING), ("granularity", ASCENDING), ("bucket", ASCENDING)],
+            name="fingerprint_granularity_bucket", unique=True,
+        )
+        # each bucket carries its own expiry (see rollup_expiry); buckets without one are kept
+        col.create_index("expire_at", name="expire_at_ttl", expireAfterSeconds=0)
+        _indexes_created[key] = True
+    return col
+
+
+def rollup_expiry(bucket: datetime, granularity: str) -> Optional[datetime]:
+    days = ROLLUP_RETENTION_DAYS.get(granularity, 0)
+    return bucket + timedelta(days=days) if days > 0 else None
+
+
+def price_rollup_ops(doc: Dict[str, Any]) -> List[UpdateOne]:
+    """Bucket upserts folding one priced sighting into its hourly and daily rollups."""
+    price = parse_price(doc.get("price"))
+    seen_at = doc.get("scraped_at")
+    if price is None or not isinstance(seen_at, datetime):
+        return []
+    fp = doc.get("fingerprint") or fingerprint(doc)
+    ops: List[UpdateOne] = []
+    for granularity in ROLLUP_GRANULARITIES:
+        bucket = bucket_start(seen_at, granularity)
+        ops.append(UpdateOne(
+            {"fingerprint": fp, "granularity": granularity, "bucket": bucket},
+            {
+                "$min": {"min": price},
+                "$max": {"max": price},
+                "$inc": {"sum": price, "count": 1},
+                "$set": {"last": price},
+                "$setOnInsert": {
+                    "platform_key": doc.get("platform_key"),
+                    "term_norm": doc.get("term_norm"),
+                    "product_name": doc.get("product_name"),
+                    "location": doc.get("location"),
+                    "expire_at": rollup_expiry(bucket, granularity),
+                },
+            },
+            upsert=True,
+        ))
+    return ops
+
+
+def record_prices(docs: Iterable[Dict[str, Any]]) -> int:
+    """Fold product docs' prices into the Mongo rollups; returns the number of sightings counted."""
+    ops: List[UpdateOne] = []
+    for doc in docs:
+        ops.extend(price_rollup_ops(doc))
+    if not ops:
+        return 0
+    price_history_collection().bulk_write(ops, ordered=False)
+    return len(ops) // len(ROLLUP_GRANULARITIES)
+
+
+def _product_filter(platforms: Optional[Sequence[str]], location: Optional[str]) -> Dict[str, Any]:
+    query: Dict[str, Any] = {}
+    if platforms:
+        keys = [platform_key(name) or name for name in platforms]
+        query["platform_key"] = keys[0] if len(keys) == 1 else {"$in": keys}
+    if location:
+        query["location"] = location
+    return query
+
+
+# Bulky or index-only fields left out of results unless asked for with fields=
+HEAVY_FIELDS = ("raw_text", "name_tokens", "name_norm")
+_FIELD_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$")
+
+
+def parse_fields(raw: Optional[str]) -> Optional[Dict[str, int]]:
+    """`fields=` query value -> find() projection.
+
+    Empty: everything but HEAVY_FIELDS. "all" / "*": None (whole documents).
+    "product_name,price": just those fields (plus _id). Raises ValueError on a bad name.
+    """
+    raw = (raw or "").strip()
+    if not raw:
+        return {name: 0 for name in HEAVY_FIELDS}
+    if raw in ("all", "*"):
+        return None
+    names = list(dict.fromkeys(name.strip() for name in raw.split(",") if name.strip()))
+    bad = [name for name in names if not _FIELD_NAME.match(name)]
+    if bad or not names:
+        raise ValueError(f"invalid field name(s): {', '.join(bad) or raw}")
+    # "price,price.x" would be a path collision in Mongo; the parent already covers the child
+    return {
+        name: 1 for name in names
+        if not any(name.startswith(other + ".") for other in names if other != name)
+    }
+
+
+def wants_field(projection: Optional[Dict[str, int]], field: str) -> bool:
+    if not projection:
+        return True
+    if next(iter(projection.values())):
+        return field in projection or field == "_id"
+    return field not in projection
+
+
+def apply_projection(doc: Dict[str, Any], projection: Optional[Dict[str, int]]) -> Dict[str, Any]:
+    """What find(query, projection) would return for `doc` (top-level names; dotted names keep the parent)."""
+    if not projection:
+        return doc
+    top = {name.split(".", 1)[0] for name in projection}
+    if next(iter(projection.values())):
+        return {key: val for key, val in doc.items() if key in top or key == "_id"}
+    return {key: val for key, val in doc.items() if key not in top}
+
+
+def indexed_search(
+    col: Collection[Dict[str, Any]],
+    norm_field: str,
+    value: str,
+    base_query: Dict[str, Any],
+    sort_field: str,
+    limit: int = 100,
+    tokens_field: str = "name_tokens",
+    projection: Optional[Dict[str, int]] = None,
+) -> Tuple[List[Dict[str, Any]], str]:
+    """Index-backed lookup, first step with hits wins; returns (docs, "exact" | "prefix" | "tokens" | "text" | "none").
+
+    1. norm_field equals the normalized value (index seek)
+    2. norm_field starts with it (anchored regex = index range scan)
+    3. the name carries every word of the value (multikey index on tokens_field)
+    4. $text search over the collection's text index, best matches first
+
+    `projection` is passed to every find() (see parse_fields()).
+    """
+    norm = normalize_term(value)
+    if not norm:
+        return [], "none"
+    steps: List[Tuple[str, Dict[str, Any]]] = [
+        ("exact", {norm_field: norm}),
+        ("prefix", {norm_field: {"$regex": "^" + re.escape(norm)}}),
+        ("tokens", {tokens_field: {"$all": name_tokens(norm)}}),
+    ]
+    for mode, clause in steps:
+        docs = list(col.find({**base_query, **clause}, projection).sort(sort_field, DESCENDING).limit(limit))
+        if docs:
+            return docs, mode
+    score = {"score": {"$meta": "textScore"}}
+    # textScore can be added to an inclusion or an exclusion projection alike
+    cursor = col.find({**base_query, "$text": {"$search": norm}}, {**(projection or {}), **score})
+    docs = list(cursor.sort([("score", score["score"]), (sort_field, DESCENDING)]).limit(limit))
+    for doc in docs:
+        doc.pop("score", None)
+    return docs, "text" if docs else "none"
+
+
+# -- storage backends ------------------------------------------------------------
+
+class ProductStore(Protocol):
+    """Where scraped products and their price rollups live; picked by STORAGE_BACKEND."""
+
+    def label(self) -> str: ...
+
+    def save(self, docs: List[Dict[str, Any]]) -> int: ...
+
+    def latest(
+        self, term: Optional[str], platforms: Optional[Sequence[str]], location: Optional[str], limit: int,
+        projection: Optional[Dict[str, int]] = None,
+    ) -> List[Dict[str, Any]]: ...
+
+    def search(
+        self, term: str, platforms: Optional[Sequence[str]], location: Optional[str], limit: int,
+        projection: Optional[Dict[str, int]] = None,
+    ) -> Tuple[List[Dict[str, Any]], str]: ...
+
+    def price_history(
+        self, product: str, platforms: Optional[Sequence[str]], granularity: str, days: int, limit: int
+    ) -> List[Dict[str, Any]]: ...
+
+    def expire(self) -> Dict[str, int]: ...
+
+
+def _json_id(doc: Dict[str, Any]) -> Dict[str, Any]:
+    if "_id" in doc:
+        doc["_id"] = str(doc["_id"])
+    return doc
+
+
+class MongoProductStore:
+    """The products / price_rollups collections in PRODUCTS_DB."""
+
+    def label(self) -> str:
+        return f"MongoDB collection '{PRODUCTS_COLLECTION}'"
+
+    def save(self, docs: List[Dict[str, Any]]) -> int:
+        result = products_collection().bulk_write([product_upsert(doc) for doc in docs], ordered=False)
+        try:
+            record_prices(docs)
+        except Exception as e:
+            print(f" Price history not updated: {e}")
+        return result.upserted_count + result.matched_count
+
+    def latest(
+        self, term: Optional[str], platforms: Optional[Sequence[str]], location: Optional[str], limit: int,
+        projection: Optional[Dict[str, int]] = None,
+    ) -> List[Dict[str, Any]]:
+        query = _product_filter(platforms, location)
+        if term:
+            query["terms"] = normalize_term(term)
+        cursor = products_collection().find(query, projection).sort("scraped_at", DESCENDING).limit(limit)
+        return [_json_id(doc) for doc in cursor]
+
+    def search(
+        self, term: str, platforms: Optional[Sequence[str]], location: Optional[str], limit: int,
+        projection: Optional[Dict[str, int]] = None,
+    ) -> Tuple[List[Dict[str, Any]], str]:
+        docs, mode = indexed_search(
+            products_collection(), "terms", term, _product_filter(platforms, location), "scraped_at", limit,
+            projection=projection,
+        )
+        return [_json_id(doc) for doc in docs], mode
+
+    def _history_products(self, product: str, platforms: Optional[Sequence[str]], limit: int) -> List[Dict[str, Any]]:
+        """Products a history query is about: a fingerprint, else names carrying every word of `product`."""
+        col = products_collection()
+        projection = {"fingerprint": 1, "product_name": 1, "platform_key": 1, "location": 1, "quantity": 1}
+        if is_fingerprint(product):
+            return list(col.find({"fingerprint": product.strip().lower()}, projection).limit(1))
+        tokens = name_tokens(product)
+        if not tokens:
+            return []
+        query = {**_product_filter(platforms, None), "name_tokens": {"$all": tokens}, "fingerprint": {"$exists": True}}
+        return list(col.find(query, projection).sort("scraped_at", DESCENDING).limit(limit))
+
+    def price_history(
+        self, product: str, platforms: Optional[Sequence[str]], granularity: str, days: int, limit: int
+    ) -> List[Dict[str, Any]]:
+        products = self._history_products(product, platforms, limit)
+        if not products:
+            return []
+        cursor = price_history_collection().find(
+            {
+                "fingerprint": {"$in": [doc["fingerprint"] for doc in products]},
+                "granularity": granularity,
+                "bucket": {"$gte": history_since(granularity, days)},
+            },
+            {"_id": 0, "fingerprint": 1, "bucket": 1, "min": 1, "max": 1, "sum": 1, "count": 1, "last": 1},
+        ).sort([("fingerprint", ASCENDING), ("bucket", ASCENDING)])
+        points: Dict[str, List[Dict[str, Any]]] = {}
+        for row in cursor:
+            points.setdefault(row["fingerprint"], []).append(rollup_point(row))
+        return history_series(products, points)
+
+    def expire(self) -> Dict[str, int]:
+        """Re-date rollups whose expiry doesn't match the current retention, then delete what is past it.
+
+        The TTL indexes do the same in the background (about once a minute); this
+        makes a compaction run deterministic and catches up after retention changes.
+        """
+        now = datetime.now(timezone.utc)
+        counts = {"products": 0, "rollups": 0, "rollups_redated": 0}
+        if PRODUCT_RETENTION_DAYS > 0:
+            cutoff = now - timedelta(days=PRODUCT_RETENTION_DAYS)
+            counts["products"] = products_collection().delete_many({"scraped_at": {"$lt": cutoff}}).deleted_count
+        rollups = price_history_collection()
+        for granularity, days in ROLLUP_RETENTION_DAYS.items():
+            if not days or days <= 0:
+                # Retention off: only buckets still dated from an earlier setting need touching
+                result = rollups.update_many(
+                    {"granularity": granularity, "expire_at": {"$type": "date"}}, {"$unset": {"expire_at": ""}}
+                )
+            else:
+                expire_at = {"$add": ["$bucket", int(days * 86400 * 1000)]}
+                result = rollups.update_many(
+                    {"granularity": granularity, "$expr": {"$ne": ["$expire_at", expire_at]}},
+                    [{"$set": {"expire_at": expire_at}}],
+                )
+            counts["rollups_redated"] += result.modified_count
+        counts["rollups"] = rollups.delete_many({"expire_at": {"$lt": now}}).deleted_count
+        return counts
+
+
+_store: Optional[ProductStore] = None
+
+
+def product_store() -> ProductStore:
+    """The configured backend, created on first use."""
+    global _store
+    if _store is None:
+        if STORAGE_BACKEND == "sqlite":
+            import sqlite_store
+            _store = sqlite_store.SqliteProductStore(SQLITE_PATH)
+        elif STORAGE_BACKEND == "mongo":
+            _store = MongoProductStore()
+        else:
+            raise RuntimeError(f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r} (use mongo or sqlite)")
+    return _store
+
+
+def jsonl_fallback_enabled() -> bool:
+    """JSONL copies only guard against an unreachable Mongo; the SQLite store is local."""
+    return STORAGE_BACKEND != "sqlite"
+
+
+# -- buffered ingest -------------------------------------------------------------
+
+def _spool_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    return str(value)
+
+
+def _spool_hook(obj: Dict[str, Any]) -> Any:
+    if set(obj) == {"$date"}:
+        return datetime.fromisoformat(obj["$date"])
+    return obj
+
+
+def _sighting_batches(docs: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Split queued docs into store.save() batches holding each product at most once.
+
+    A product queued by several scrapes is kept as several sightings: the k-th
+    sighting goes into the k-th round, so its terms are all added, each price is
+    folded into the rollups, and the newest sighting is written last.
+    """
+    rounds: List[List[Dict[str, Any]]] = []
+    seen: Dict[str, int] = {}
+    for doc in docs:
+        fp = doc.get("fingerprint") or fingerprint(doc)
+        n = seen[fp] = seen.get(fp, -1) + 1
+        if n == len(rounds):
+            rounds.append([])
+        rounds[n].append(doc)
+    size = max(INGEST_BATCH, 1)
+    return [batch[start:start + size] for batch in rounds for start in range(0, len(batch), size)]
+
+
+class IngestBuffer:
+    """Write-behind queue in front of product_store().save().
+
+    Rows are grouped until INGEST_BATCH docs are waiting or the oldest has waited
+    INGEST_FLUSH_SECONDS, then written as unordered bulk upserts by a
+    background thread (one more round per repeat sighting of a product, see
+    _sighting_batches). A batch the store rejects is written to INGEST_SPOOL_DIR
+    (one fsynced JSON-lines file per batch) and replayed oldest-first every
+    INGEST_REPLAY_SECONDS and after each successful write. Spool files are
+    claimed by rename, so several processes can share the directory.
+    """
+
+    def __init__(self, spool_dir: str) -> None:
+        self.spool_dir = spool_dir
+        self._pending: List[Dict[str, Any]] = []
+        self._oldest = 0.0
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._next_replay = 0.0
+
+    def add(self, docs: List[Dict[str, Any]]) -> int:
+        with self._cond:
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.extend(docs)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return len(docs)
+
+    def _take(self) -> List[Dict[str, Any]]:
+        with self._cond:
+            docs = self._pending
+            self._pending = []
+            return docs
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    waited = time.monotonic() - self._oldest
+                    if self._pending and (len(self._pending) >= INGEST_BATCH or waited >= INGEST_FLUSH_SECONDS):
+                        break
+                    timeout = INGEST_FLUSH_SECONDS - waited if self._pending else INGEST_REPLAY_SECONDS
+                    self._cond.wait(max(timeout, 0.05))
+                    if not self._pending and time.monotonic() >= self._next_replay:
+                        break
+            self.flush()
+
+    def flush(self) -> int:
+        """Write everything queued now (and any spooled batches); returns docs written."""
+        with self._write_lock:
+            written = 0
+            batches = _sighting_batches(self._take())
+            for i, batch in enumerate(batches):
+                try:
+                    written += product_store().save(batch)
+                except Exception as e:
+                    self._spool([doc for rest in batches[i:] for doc in rest], e)
+                    return written
+            written += self._replay()
+            return written
+
+    def _spool(self, docs: List[Dict[str, Any]], error: Exception) -> None:
+        os.makedirs(self.spool_dir, exist_ok=True)
+        name = f"{time.time():.6f}-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl"
+        tmp_path = os.path.join(self.spool_dir, name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            for doc in docs:
+                fh.write(json.dumps(doc, ensure_ascii=False, default=_spool_default) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, os.path.join(self.spool_dir, name))
+        self._next_replay = time.monotonic() + INGEST_REPLAY_SECONDS
+        print(f" Store unavailable ({error}); spooled {len(docs)} rows to {name}")
+
+    def spooled(self) -> List[str]:
+        try:
+            return sorted(name for name in os.listdir(self.spool_dir) if name.endswith(".jsonl"))
+        except OSError:
+            return []
+
+    def _replay(self) -> int:
+        """Write spooled batches oldest-first; stops at the first one the store still rejects."""
+        replayed = 0
+        for name in self.spooled():
+            path = os.path.join(self.spool_dir, name)
+            claimed = f"{path}.{os.getpid()}.replaying"
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue  # another process took it
+            batches: List[List[Dict[str, Any]]] = []
+            done = 0
+            try:
+                with open(claimed, "r", encoding="utf-8") as fh:
+                    batches = _sighting_batches([json.loads(line, object_hook=_spool_hook) for line in fh if line.strip()])
+                for batch in batches:
+                    replayed += product_store().save(batch)
+                    done += 1
+            except Exception as e:
+                if done:
+                    # batches already written must not be replayed again
+                    self._spool([doc for rest in batches[done:] for doc in rest], e)
+                    os.remove(claimed)
+                else:
+                    os.rename(claimed, path)
+                self._next_replay = time.monotonic() + INGEST_REPLAY_SECONDS
+                print(f" Spool replay paused ({e}); {len(self.spooled())} batch(es) waiting")
+                break
+            os.remove(claimed)
+            print(f" Replayed {sum(map(len, batches))} spooled rows from {name}")
+        if not replayed:
+            self._next_replay = time.monotonic() + INGEST_REPLAY_SECONDS
+        return replayed
+
+
+_ingest: Optional[IngestBuffer] = None
+_ingest_lock = threading.Lock()
+
+
+def ingest_buffer() -> IngestBuffer:
+    global _ingest
+    with _ingest_lock:
+        if _ingest is None:
+            _ingest = IngestBuffer(INGEST_SPOOL_DIR)
+            atexit.register(_ingest.flush)
+        return _ingest
+
+
+def ingest_products(records: Iterable[Dict[str, Any]], platform: str) -> int:
+    """Queue scraped rows for a background bulk upsert (INGEST_BUFFER=0 writes them now)."""
+    if not INGEST_BUFFER:
+        return save_products(records, platform)
+    docs = _scraped_docs(records, platform)
+    return ingest_buffer().add(docs) if docs else 0
+
+
+def flush_ingest() -> bool:
+    """Write queued (and spooled) rows now, e.g. before answering a finished scrape job.
+
+    Returns False while rows are still spooled because the store is unavailable.
+    """
+    buffer = ingest_buffer()
+    buffer.flush()
+    return not buffer.spooled()
+
+
+# -- async access -----------------------------------------------------------------
+
+T = TypeVar("T")
+_async_pool: Optional[ThreadPoolExecutor] = None
+_async_pool_lock = threading.Lock()
+
+
+async def run_async(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Await a blocking storage call on the shared worker pool.
+
+    pymongo 4.6 has no asyncio API and Motor binds a client to one event loop,
+    while Flask runs every async view on a fresh loop; a shared pool over the
+    cached clients gives the same concurrency without a client per request.
+    """
+    global _async_pool
+    with _async_pool_lock:
+        if _async_pool is None:
+            _async_pool = ThreadPoolExecutor(max_workers=ASYNC_WORKERS, thread_name_prefix="storage")
+    return await asyncio.get_running_loop().run_in_executor(_async_pool, functools.partial(fn, *args, **kwargs))
+
+
+class AsyncCollection:
+    """Awaitable view of a pymongo collection: `await col.find_one(...)`, `await col.find_list(...)`.
+
+    Methods come back as coroutine functions; plain attributes (`col.name`,
+    `col.database`) are returned as they are.
+    """
+
+    def __init__(self, col: Collection[Dict[str, Any]]) -> None:
+        self.sync = col
+
+    def __getattr__(self, name: str) -> Any:
+        method = getattr(self.sync, name)
+        # Database / Collection define __call__ (to raise), so callable() is not enough
+        if not inspect.isroutine(method):
+            return method
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            return await run_async(method, *args, **kwargs)
+
+        return call
+
+    async def find_list(
+        self,
+        query: Optional[Dict[str, Any]] = None,
+        projection: Optional[Dict[str, Any]] = None,
+        sort: Optional[List[Tuple[str, int]]] = None,
+        limit: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """find() materialized in the worker thread (cursors iterate lazily, so they can't be awaited)."""
+        def run() -> List[Dict[str, Any]]:
+            cursor = self.sync.find(query or {}, projection)
+            if sort:
+                cursor = cursor.sort(sort)
+            return list(cursor.limit(limit))
+
+        return await run_async(run)
+
+
+def get_async_collection(
+    name: Optional[str] = None,
+    db_name: Optional[str] = None,
+    uri: Optional[str] = None,
+) -> AsyncCollection:
+    """Async counterpart of get_collection()."""
+    return AsyncCollection(get_collection(name, db_name=db_name, uri=uri))
+
+
+async def find_products_async(
+    term: Optional[str] = None,
+    platforms: Optional[Sequence[str]] = None,
+    location: Optional[str] = None,
+    limit: int = 100,
+    projection: Optional[Dict[str, int]] = None,
+) -> List[Dict[str, Any]]:
+    return await run_async(find_products, term, platforms, location, limit, projection)
+
+
+async def search_products_async(
+    term: str,
+    platforms: Optional[Sequence[str]] = None,
+    location: Optional[str] = None,
+    limit: int = 100,
+    projection: Optional[Dict[str, int]] = None,
+) -> Tuple[List[Dict[str, Any]], str]:
+    return await run_async(search_products, term, platforms, location, limit, projection)
+
+
 if __name__ == "__main__":
     # Example usage: set env vars, then run this file to test the connection
     try:
@@ -0,0 +1,253 @@
+"""Network-capture scraping: build rows from the sites' own search API responses.
+
+With EXTRACT_MODE=network the Blinkit and Instamart scrapers start Chrome with
+performance logging, enable CDP Network events, open the search URL and read the
+JSON bodies of the search API calls the page makes (Network.getResponseBody).
+Rows come straight from that JSON, so there is no DOM scrolling, no XPath and no
+fixed sleep: capture returns once the search responses have gone quiet.
+
+Captured bodies can be recorded with CAPTURE_DUMP_DIR and replayed through
+fixture_server.py (point BLINKIT_BASE_URL / INSTAMART_BASE_URL at it) to exercise
+the whole path against a local stand-in.
+"""
+import json
+import os
+import re
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import quote
+
+import resource_blocking
+import scrape_jobs
+
+CAPTURE_TIMEOUT = float(os.getenv("CAPTURE_TIMEOUT", "20"))
+# Seconds without a new matching response before capture is considered complete
+CAPTURE_IDLE = float(os.getenv("CAPTURE_IDLE", "1.5"))
+CAPTURE_DUMP_DIR = os.getenv("CAPTURE_DUMP_DIR", "")
+
+# Search API URL patterns per platform (regex, matched against the response URL)
+SEARCH_API_PATTERNS: Dict[str, str] = {
+    "blinkit": os.getenv("BLINKIT_SEARCH_API_PATTERN", r"/v\d+/(layout/)?search"),
+    "instamart": os.getenv("INSTAMART_SEARCH_API_PATTERN", r"/api/instamart/search"),
+}
+
+PLATFORM_LABELS = {"blinkit": "Blinkit", "instamart": "Instamart"}
+
+NAME_KEYS = ("product_name", "display_name", "name", "title")
+PRICE_KEYS = ("offer_price", "selling_price", "final_price", "normal_price", "store_price", "price", "mrp")
+QUANTITY_KEYS = ("quantity", "variant", "unit", "weight", "pack_size", "sku_quantity_with_combo")
+IMAGE_KEYS = ("image_url", "image", "images", "thumbnail", "media")
+ID_KEYS = ("product_id", "prid", "item_id", "id")
+
+PERFORMANCE_LOGGING = resource_blocking.PERFORMANCE_LOGGING
+
+
+def enable_performance_logging(options: Any) -> None:
+    """Ask chromedriver to expose DevTools Network events through get_log('performance')."""
+    options.set_capability("goog:loggingPrefs", PERFORMANCE_LOGGING)
+
+
+def _scalar(value: Any) -> str:
+    """Flatten the wrapped values search APIs like to use ({"text": ...}, lists, numbers)."""
+    if value is None or isinstance(value, bool):
+        return ""
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (int, float)):
+        return f"{value:g}"
+    if isinstance(value, dict):
+        for key in ("text", "value", "url", "name"):
+            if key in value:
+                return _scalar(value[key])
+        return ""
+    if isinstance(value, list):
+        for item in value:
+            found = _scalar(item)
+            if found:
+                return found
+    return ""
+
+
+def _first(record: Dict[str, Any], keys: Iterable[str]) -> Tuple[str, Any]:
+    for key in keys:
+        if key in record:
+            val = _scalar(record[key])
+            if val:
+                return key, record[key]
+    return "", None
+
+
+def _price(record: Dict[str, Any]) -> str:
+    for key in PRICE_KEYS:
+        raw = record.get(key)
+        if isinstance(raw, dict) and "text" not in raw:
+            # e.g. {"price": {"mrp": 32, "offer_price": 29}}
+            val = _price(raw)
+        else:
+            val = _scalar(raw)
+        if val:
+            return val if "₹" in val else f"₹{val}"
+    return ""
+
+
+def _product_url(platform: str, record: Dict[str, Any], name: str, base_url: str) -> Optional[str]:
+    for key in ("url", "product_url", "deeplink", "share_url"):
+        val = _scalar(record.get(key))
+        if val.startswith("http"):
+            return val
+        if val.startswith("/"):
+            return base_url.rstrip("/") + val
+    _, raw_id = _first(record, ID_KEYS)
+    product_id = _scalar(raw_id)
+    if not product_id:
+        identity = record.get("identity")
+        product_id = _scalar(identity.get("id")) if isinstance(identity, dict) else ""
+    if not product_id:
+        return None
+    if platform == "blinkit":
+        slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-") or "item"
+        return f"{base_url.rstrip('/')}/prn/{slug}/prid/{quote(product_id)}"
+    return f"{base_url.rstrip('/')}/instamart/item/{quote(product_id)}"
+
+
+def _walk(node: Any) -> Iterator[Dict[str, Any]]:
+    stack: List[Any] = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            yield current
+            stack.extend(reversed(list(current.values())))
+        elif isinstance(current, list):
+            stack.extend(reversed(current))
+
+
+def rows_from_payload(
+    platform: str,
+    payload: Any,
+    search_term: str,
+    location: str = "",
+    base_url: str = "",
+) -> List[Dict[str, Any]]:
+    """Pull product records out of a search API JSON body (structure-agnostic walk)."""
+    rows: List[Dict[str, Any]] = []
+    seen: Set[Tuple[str, str, str]] = set()
+    for record in _walk(payload):
+        name_key, raw_name = _first(record, NAME_KEYS)
+        if not name_key:
+            continue
+        name = _scalar(raw_name)
+        price = _price(record)
+        if not price:
+            continue
+        _, raw_qty = _first(record, QUANTITY_KEYS)
+        quantity = _scalar(raw_qty)
+        key = (name.lower(), price, quantity.lower())
+        if key in seen:
+            continue
+        seen.add(key)
+        _, raw_image = _first(record, IMAGE_KEYS)
+        image_url = _scalar(raw_image) or None
+        rows.append({
+            "search_term": search_term,
+            "product_name": name,
+            "price": price,
+            "quantity": quantity,
+            "platform": PLATFORM_LABELS.get(platform, platform.title()),
+            "location": location,
+            "url": _product_url(platform, record, name, base_url),
+            "image_url": image_url,
+            "raw_text": "\n".join(part for part in (name, quantity, price) if part),
+        })
+    return rows
+
+
+def enable_network(driver: Any) -> None:
+    driver.execute_cdp_cmd("Network.enable", {})
+    # Drop anything logged before this search so only its responses are considered
+    # (blocked-request accounting still gets to see it)
+    resource_blocking.collect(driver)
+
+
+def _network_events(driver: Any) -> Iterator[Dict[str, Any]]:
+    for entry in driver.get_log("performance"):
+        try:
+            message = json.loads(entry["message"])["message"]
+        except Exception:
+            continue
+        if isinstance(message, dict) and str(message.get("method", "")).startswith("Network."):
+            resource_blocking.observe(message)
+            yield message
+
+
+def capture_json_responses(driver: Any, platform: str, timeout: float = CAPTURE_TIMEOUT) -> List[Any]:
+    """Collect JSON bodies of matching search API responses until they go quiet."""
+    pattern = re.compile(SEARCH_API_PATTERNS[platform])
+    pending: Dict[str, str] = {}
+    bodies: List[Any] = []
+    deadline = time.time() + timeout
+    last_hit = 0.0
+    while time.time() < deadline:
+        for event in _network_events(driver):
+            params = event.get("params") or {}
+            method = event.get("method")
+            if method == "Network.responseReceived":
+                response = params.get("response") or {}
+                url = str(response.get("url", ""))
+                if pattern.search(url) and "json" in str(response.get("mimeType", "")).lower():
+                    pending[params.get("requestId", "")] = url
+            elif method == "Network.loadingFinished" and params.get("requestId") in pending:
+                request_id = params["requestId"]
+                url = pending.pop(request_id)
+                try:
+                    body = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+                    bodies.append(json.loads(body.get("body") or "null"))
+                    last_hit = time.time()
+                    print(f"   Captured search response: {url}")
+                except Exception as e:
+                    print(f"   Could not read response body for {url}: {e}")
+        if bodies and not pending and time.time() - last_hit >= CAPTURE_IDLE:
+            break
+        time.sleep(0.2)
+    return bodies
+
+
+def dump_bodies(platform: str, search_term: str, bodies: List[Any]) -> None:
+    """Record captured bodies so fixture_server.py can replay them later."""
+    if not CAPTURE_DUMP_DIR or not bodies:
+        return
+    os.makedirs(CAPTURE_DUMP_DIR, exist_ok=True)
+    name = re.sub(r"[^a-z0-9]+", "_", search_term.lower()).strip("_") or "term"
+    path = os.path.join(CAPTURE_DUMP_DIR, f"{platform}_{name}.json")
+    payload: Any = bodies[0] if len(bodies) == 1 else bodies
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(payload, fh, ensure_ascii=False)
+    print(f" Saved captured search JSON to {path}")
+
+
+def scrape_via_network(
+    driver: Any,
+    platform: str,
+    search_url: str,
+    search_term: str,
+    location: str = "",
+    base_url: str = "",
+    max_results: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Open search_url and turn the intercepted search API JSON into rows."""
+    enable_network(driver)
+    driver.get(search_url)
+    print(f" Opened search URL (network capture): {search_url}")
+    bodies = capture_json_responses(driver, platform)
+    dump_bodies(platform, search_term, bodies)
+    rows: List[Dict[str, Any]] = []
+    for body in bodies:
+        rows.extend(rows_from_payload(platform, body, search_term, location, base_url))
+    if max_results is not None:
+        rows = rows[:max_results]
+    if rows:
+        # nothing is credited when the scraper falls back to the DOM, which reports its own cards
+        scrape_jobs.progress(cards=len(rows))
+    for row in rows:
+        print(f"      + Scraped: {row['product_name'] or 'Unknown'}")
+        scrape_jobs.emit_row(row)
+    return rows
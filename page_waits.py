@@ -0,0 +1,134 @@
+"""Readiness waits for the scrapers, replacing fixed time.sleep() pauses.
+
+settle() polls the page a few times a second and returns as soon as it looks
+done: the document has loaded, an injected MutationObserver has seen no DOM
+changes for WAIT_QUIET seconds, no new network resources have started, and (when
+a card XPath is given) enough result cards are present. The old sleep length is
+kept as the hard upper bound, so a slow page behaves exactly as before.
+
+Every wait is recorded; report() summarises actual vs capped time per stage.
+Set WAIT_MODE=fixed to go back to the plain sleeps.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import scrape_events
+
+WAIT_MODE = os.getenv("WAIT_MODE", "event").strip().lower()
+WAIT_POLL = float(os.getenv("WAIT_POLL", "0.2"))
+# Seconds without DOM mutations / new requests before the page counts as settled
+WAIT_QUIET = float(os.getenv("WAIT_QUIET", "0.6"))
+
+# arguments[0] = card XPath (or null). Installs the observer on first call per document.
+PROBE_SCRIPT = r"""
+const xpath = arguments[0];
+if (!window.__snapitWait) {
+  window.__snapitWait = {last: performance.now()};
+  new MutationObserver(() => { window.__snapitWait.last = performance.now(); })
+    .observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+}
+let count = 0;
+if (xpath) {
+  count = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null).snapshotLength;
+}
+return {
+  state: document.readyState,
+  url: location.href,
+  count: count,
+  quietMs: performance.now() - window.__snapitWait.last,
+  resources: performance.getEntriesByType('resource').length,
+};
+"""
+
+_timings: Dict[str, List[Tuple[float, float, bool]]] = {}
+_timings_lock = threading.Lock()
+
+
+def event_mode_enabled() -> bool:
+    return WAIT_MODE != "fixed"
+
+
+def _record(label: str, elapsed: float, cap: float, ready: bool) -> None:
+    with _timings_lock:
+        _timings.setdefault(label, []).append((elapsed, cap, ready))
+    scrape_events.emit("timing", stage=label, seconds=round(elapsed, 2), cap=cap, ready=ready)
+
+
+def settle(
+    driver: Any,
+    label: str,
+    cap: float,
+    card_xpath: Optional[str] = None,
+    min_count: int = 1,
+    quiet: float = WAIT_QUIET,
+    url_contains: str = "",
+) -> float:
+    """Wait until the page is ready (or `cap` seconds pass); returns the seconds waited."""
+    started = time.time()
+    if not event_mode_enabled():
+        time.sleep(cap)
+        _record(label, cap, cap, False)
+        return cap
+
+    deadline = started + cap
+    ready = False
+    last_resources = -1
+    resources_since = started
+    while True:
+        now = time.time()
+        try:
+            probe = driver.execute_script(PROBE_SCRIPT, card_xpath) or {}
+        except Exception:
+            # Mid-navigation the script can fail; just try again on the next tick
+            probe = {}
+        resources = int(probe.get("resources") or 0)
+        if resources != last_resources:
+            last_resources = resources
+            resources_since = now
+        ready = (
+            probe.get("state") in ("interactive", "complete")
+            and url_contains in str(probe.get("url") or "")
+            and (card_xpath is None or int(probe.get("count") or 0) >= min_count)
+            and float(probe.get("quietMs") or 0) >= quiet * 1000
+            and now - resources_since >= quiet
+        )
+        if ready or now >= deadline:
+            break
+        time.sleep(min(WAIT_POLL, max(0.0, deadline - now)))
+
+    elapsed = time.time() - started
+    _record(label, elapsed, cap, ready)
+    print(f"   ⏱ {label}: {elapsed:.1f}s (cap {cap:g}s{'' if ready else ', not ready'})")
+    return elapsed
+
+
+def report() -> Dict[str, Dict[str, Any]]:
+    """Per-stage wait statistics collected in this process."""
+    with _timings_lock:
+        snapshot = {label: list(rows) for label, rows in _timings.items()}
+    out: Dict[str, Dict[str, Any]] = {}
+    for label, rows in snapshot.items():
+        waited = [row[0] for row in rows]
+        capped = sum(row[1] for row in rows)
+        out[label] = {
+            "waits": len(rows),
+            "avg_s": round(sum(waited) / len(waited), 2),
+            "max_s": round(max(waited), 2),
+            "saved_s": round(capped - sum(waited), 1),
+            "hit_cap": sum(1 for row in rows if not row[2]),
+        }
+    return out
+
+
+def print_report() -> None:
+    stats = report()
+    if not stats:
+        return
+    print("\n Wait summary (actual vs fixed sleeps):")
+    for label, row in sorted(stats.items()):
+        print(
+            f"   {label}: {row['waits']} waits, avg {row['avg_s']}s, max {row['max_s']}s,"
+            f" saved {row['saved_s']}s, {row['hit_cap']} hit the cap"
+        )
@@ -0,0 +1,198 @@
+"""Concurrent multi-term scraping across browser processes and tabs.
+
+Terms are split round-robin over SCRAPE_PROCESSES worker processes (one Chrome
+each). Inside a worker, SCRAPE_TABS search pages are opened at once so their
+loads overlap, then extracted tab by tab. Workers only return rows; the parent
+process is the single writer to Mongo and the JSON output, so nothing races.
+
+    SEARCH_TERMS_FILE=search_terms.txt SCRAPE_PROCESSES=4 SCRAPE_TABS=3 python scraped_blinkit.py
+    python parallel_scrape.py --platform blinkit --processes 4 --tabs 3 milk bread eggs
+
+Tabs need a URL-addressable search page, so Zepto (search is typed into the
+page) runs its share of terms one after another inside each process.
+
+When delivery locations are configured (see locations.py) every location gets its
+own set of workers, each browser launched with that location's geolocation and pin.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from types import ModuleType
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import browser_pool
+import locations
+import page_waits
+import resource_blocking
+
+SCRAPE_PROCESSES = int(os.getenv("SCRAPE_PROCESSES", "1"))
+SCRAPE_TABS = int(os.getenv("SCRAPE_TABS", "1"))
+# Upper bound on Chrome processes running at once across all locations
+SCRAPE_MAX_BROWSERS = int(os.getenv("SCRAPE_MAX_BROWSERS", "8"))
+
+TermRows = Tuple[str, List[Dict[str, Any]]]
+
+
+def concurrency_requested(platform: str = "") -> bool:
+    return SCRAPE_PROCESSES > 1 or SCRAPE_TABS > 1 or bool(locations.load_locations(platform))
+
+
+def supports_tabs(scraper: ModuleType) -> bool:
+    return hasattr(scraper, "search_url") and hasattr(scraper, "extract_current_page")
+
+
+def split_terms(terms: Sequence[str], parts: int) -> List[List[str]]:
+    """Round-robin terms into at most `parts` non-empty chunks."""
+    parts = max(1, min(parts, len(terms)))
+    chunks: List[List[str]] = [[] for _ in range(parts)]
+    for idx, term in enumerate(terms):
+        chunks[idx % parts].append(term)
+    return [chunk for chunk in chunks if chunk]
+
+
+def _scrape_tab_batch(
+    scraper: ModuleType, driver: Any, terms: Sequence[str], location_text: str = ""
+) -> List[TermRows]:
+    """Start every term's search page in its own tab, then extract each one."""
+    main_handle = driver.current_window_handle
+    opened: List[Tuple[str, str]] = []
+    for term in terms:
+        driver.switch_to.new_window("tab")
+        resource_blocking.apply(driver, scraper.PLATFORM)
+        # Assigning location returns immediately, so the page loads overlap
+        url = scraper.search_url(term, location_text) if location_text else scraper.search_url(term)
+        driver.execute_script("window.location.href = arguments[0];", url)
+        opened.append((term, driver.current_window_handle))
+        print(f" Opened tab for: {term}")
+
+    results: List[TermRows] = []
+    for term, handle in opened:
+        driver.switch_to.window(handle)
+        try:
+            if location_text:
+                rows = scraper.extract_current_page(driver, term, location_text)
+            else:
+                rows = scraper.extract_current_page(driver, term)
+        except Exception as e:
+            print(f" Error while scraping {term} in tab: {e}")
+            rows = []
+        results.append((term, list(rows)))
+        resource_blocking.collect(driver)
+        try:
+            driver.close()
+        except Exception:
+            pass
+    driver.switch_to.window(main_handle)
+    return results
+
+
+def scrape_worker(
+    platform: str, terms: List[str], tabs: int, location: Optional[locations.Location] = None
+) -> List[TermRows]:
+    """Run in a child process: one browser, terms scraped in tab batches or serially."""
+    scraper = browser_pool.load_scraper(platform)
+    driver = scraper.create_driver(location) if location else scraper.create_driver()
+    if driver is None:
+        return [(term, []) for term in terms]
+    label = location.label if location else ""
+    results: List[TermRows] = []
+    try:
+        if location:
+            scraper.prepare_session(driver, location)
+        else:
+            scraper.prepare_session(driver)
+        if tabs > 1 and supports_tabs(scraper):
+            for start in range(0, len(terms), tabs):
+                results.extend(_scrape_tab_batch(scraper, driver, terms[start:start + tabs], label))
+        else:
+            for term in terms:
+                try:
+                    rows = scraper.scrape_term(driver, term, label) if label else scraper.scrape_term(driver, term)
+                    results.append((term, list(rows)))
+                    resource_blocking.collect(driver)
+                except Exception as e:
+                    print(f" Error while scraping {term}: {e}")
+                    results.append((term, []))
+    finally:
+        try:
+            driver.quit()
+        except OSError:
+            pass
+        page_waits.print_report()
+        resource_blocking.print_report()
+    return results
+
+
+def run(
+    platform: str,
+    terms: Sequence[str],
+    processes: int = SCRAPE_PROCESSES,
+    tabs: int = SCRAPE_TABS,
+    save: bool = True,
+    where: Optional[Sequence[locations.Location]] = None,
+) -> List[Dict[str, Any]]:
+    """Scrape terms concurrently (per location, if any) and merge the rows in this single-writer process."""
+    terms = [term for term in terms if term.strip()]
+    if not terms:
+        print(" No search terms provided. Exiting without running browser.")
+        return []
+    scraper = browser_pool.load_scraper(platform)
+    if where is None:
+        where = locations.load_locations(platform)
+    targets: List[Optional[locations.Location]] = list(where) or [None]
+    chunks = split_terms(terms, processes)
+    tasks = [(target, chunk) for target in targets for chunk in chunks]
+    if tabs > 1 and not supports_tabs(scraper):
+        print(f" {platform} search is not URL-addressable; ignoring SCRAPE_TABS={tabs}")
+    workers = max(1, min(len(tasks), SCRAPE_MAX_BROWSERS))
+    print(
+        f" Scraping {len(terms)} terms x {len(targets)} location(s) on {platform}"
+        f" with {workers} process(es) x {tabs} tab(s)"
+    )
+
+    started = time.time()
+    all_rows: List[Dict[str, Any]] = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(scrape_worker, platform, chunk, tabs, target) for target, chunk in tasks]
+        for future in as_completed(futures):
+            try:
+                worker_results = future.result()
+            except Exception as e:
+                print(f" Worker failed: {e}")
+                continue
+            for term, rows in worker_results:
+                all_rows.extend(rows)
+                if save:
+                    scraper.save_term_results(term, rows)
+                if not rows:
+                    print(f"   -> No {platform} results saved for {term}")
+
+    if save and all_rows:
+        scraper.append_output(all_rows)
+    print(f"\n {len(all_rows)} rows for {len(terms)} terms in {time.time() - started:.1f}s")
+    return all_rows
+
+
+def main(argv: List[str]) -> int:
+    ap = argparse.ArgumentParser(description="Scrape many terms concurrently.")
+    ap.add_argument("--platform", required=True, choices=sorted(browser_pool.SCRAPER_MODULES))
+    ap.add_argument("--processes", type=int, default=SCRAPE_PROCESSES)
+    ap.add_argument("--tabs", type=int, default=SCRAPE_TABS)
+    ap.add_argument("--location", dest="locations", action="append", help="location label (repeatable, or 'all')")
+    ap.add_argument("terms", nargs="*", help="terms to scrape (default: SEARCH_TERMS / search_terms.txt)")
+    args = ap.parse_args(argv)
+
+    terms = list(args.terms)
+    if not terms:
+        # The scrapers read terms from env/file at import time (CLI args are ours here)
+        sys.argv = sys.argv[:1]
+        terms = list(browser_pool.load_scraper(args.platform).load_search_terms())
+    where = locations.select(args.locations, args.platform) if args.locations else None
+    run(args.platform, terms, max(1, args.processes), max(1, args.tabs), where=where)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,222 @@
+"""Per-query cost stats for every Mongo call the process makes (QUERY_STATS=1).
+
+mongo_client registers a pymongo CommandListener on each client, so /results,
+/latest, the seller endpoints and the scrapers' writes are all covered without
+touching the call sites. Calls are grouped by collection, command and query
+shape (the filter and sort with values replaced by "?"), and each group keeps
+call count, errors, latency (total / max) and documents returned.
+
+    QUERY_STATS=1              # record stats (off by default)
+    QUERY_SLOW_MS=100          # calls slower than this go to the slow log
+    QUERY_EXPLAIN_SAMPLE=0.05  # fraction of find / aggregate / count calls re-run as explain
+
+Sampled explains run on a background thread with executionStats verbosity and
+add keys examined, docs examined and the plan's stages to the group; a group
+whose winning plan contains COLLSCAN is listed under "collscans". report()
+returns everything as a JSON-ready dict (the servers expose it at GET
+/stats/queries).
+"""
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from pymongo import monitoring
+
+ENABLED = os.getenv("QUERY_STATS", "0") == "1"
+SLOW_MS = float(os.getenv("QUERY_SLOW_MS", "100"))
+EXPLAIN_SAMPLE = float(os.getenv("QUERY_EXPLAIN_SAMPLE", "0"))
+
+# Commands worth grouping; explain only makes sense for the read ones
+TRACKED = {"find", "aggregate", "count", "distinct", "insert", "update", "delete", "findAndModify"}
+EXPLAINABLE = {"find", "aggregate", "count", "distinct"}
+# Driver bookkeeping that must not be passed back into explain
+_DRIVER_FIELDS = {"lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "apiVersion", "cursor"}
+
+_lock = threading.Lock()
+_groups: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+_slow: Deque[Dict[str, Any]] = deque(maxlen=50)
+_explain_queue: "queue.Queue[Tuple[Tuple[str, str, str], str, Dict[str, Any], Callable[[], Any]]]" = queue.Queue(maxsize=100)
+_explain_thread: Optional[threading.Thread] = None
+
+
+def query_shape(value: Any) -> Any:
+    """Filter/sort with literal values replaced by "?" (operators and field names kept)."""
+    if isinstance(value, dict):
+        return {key: query_shape(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [query_shape(val) for val in value[:1]] if value else []
+    return "?"
+
+
+def _shape_key(command_name: str, command: Dict[str, Any]) -> str:
+    if command_name == "aggregate":
+        parts: Dict[str, Any] = {"pipeline": [query_shape(stage) for stage in command.get("pipeline") or []]}
+    elif command_name in ("update", "delete"):
+        statements = command.get("updates") or command.get("deletes") or [{}]
+        parts = {"q": query_shape(statements[0].get("q") or {})}
+    elif command_name == "insert":
+        parts = {}
+    else:
+        parts = {"filter": query_shape(command.get("filter") or command.get("query") or {})}
+        if command.get("sort"):
+            parts["sort"] = dict(command["sort"])
+    return repr(parts)
+
+
+def _returned(command_name: str, reply: Dict[str, Any]) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or [])
+    if command_name == "distinct":
+        return len(reply.get("values") or [])
+    return int(reply.get("n") or 0)
+
+
+def _group(key: Tuple[str, str, str]) -> Dict[str, Any]:
+    group = _groups.get(key)
+    if group is None:
+        group = {
+            "collection": key[0], "command": key[1], "shape": key[2],
+            "calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "returned": 0, "slow": 0,
+            "explained": 0, "explain_errors": 0, "explain_error": None,
+            "keys_examined": 0, "docs_examined": 0, "explain_returned": 0,
+            "stages": [], "collscan": False,
+        }
+        _groups[key] = group
+    return group
+
+
+def _walk(value: Any, stages: Set[str], stats: List[Dict[str, Any]]) -> None:
+    if isinstance(value, dict):
+        if isinstance(value.get("stage"), str):
+            stages.add(value["stage"])
+        if isinstance(value.get("executionStats"), dict):
+            stats.append(value["executionStats"])
+        for val in value.values():
+            _walk(val, stages, stats)
+    elif isinstance(value, list):
+        for val in value:
+            _walk(val, stages, stats)
+
+
+def _run_explains() -> None:
+    while True:
+        key, db_name, command, get_client = _explain_queue.get()
+        try:
+            result = get_client()[db_name].command({"explain": command, "verbosity": "executionStats"})
+        except Exception as e:
+            # counted rather than printed: a failing explain repeats for every sampled call
+            with _lock:
+                group = _group(key)
+                group["explain_errors"] += 1
+                group["explain_error"] = str(e)
+            continue
+        stages: Set[str] = set()
+        stats: List[Dict[str, Any]] = []
+        _walk(result, stages, stats)
+        with _lock:
+            group = _group(key)
+            group["explained"] += 1
+            for entry in stats[:1]:
+                group["keys_examined"] += int(entry.get("totalKeysExamined") or 0)
+                group["docs_examined"] += int(entry.get("totalDocsExamined") or 0)
+                group["explain_returned"] += int(entry.get("nReturned") or 0)
+            group["stages"] = sorted(set(group["stages"]) | stages)
+            group["collscan"] = group["collscan"] or "COLLSCAN" in stages
+
+
+def _queue_explain(key: Tuple[str, str, str], db_name: str, command: Dict[str, Any], get_client: Callable[[], Any]) -> None:
+    global _explain_thread
+    with _lock:
+        if _explain_thread is None:
+            _explain_thread = threading.Thread(target=_run_explains, name="query-explain", daemon=True)
+            _explain_thread.start()
+    try:
+        _explain_queue.put_nowait((key, db_name, command, get_client))
+    except queue.Full:
+        pass
+
+
+class QueryListener(monitoring.CommandListener):
+    """Times tracked commands and samples some of them for explain."""
+
+    def __init__(self, get_client: Callable[[], Any]) -> None:
+        self._get_client = get_client
+        self._started: Dict[Tuple[Any, int], Tuple[Tuple[str, str, str], str, Dict[str, Any]]] = {}
+        self._started_lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name not in TRACKED:
+            return
+        command = dict(event.command)
+        collection = f"{event.database_name}.{command.get(event.command_name)}"
+        key = (collection, event.command_name, _shape_key(event.command_name, command))
+        with self._started_lock:
+            self._started[(event.connection_id, event.request_id)] = (key, event.database_name, command)
+
+    def _finish(self, event: Any, reply: Optional[Dict[str, Any]]) -> None:
+        with self._started_lock:
+            entry = self._started.pop((event.connection_id, event.request_id), None)
+        if entry is None:
+            return
+        key, db_name, command = entry
+        ms = event.duration_micros / 1000.0
+        with _lock:
+            group = _group(key)
+            group["calls"] += 1
+            group["total_ms"] += ms
+            group["max_ms"] = max(group["max_ms"], ms)
+            if reply is None:
+                group["errors"] += 1
+            else:
+                group["returned"] += _returned(key[1], reply)
+            if ms >= SLOW_MS:
+                group["slow"] += 1
+                _slow.append({"collection": key[0], "command": key[1], "shape": key[2], "ms": round(ms, 1), "at": time.time()})
+        if reply is not None and key[1] in EXPLAINABLE and EXPLAIN_SAMPLE > 0 and random.random() < EXPLAIN_SAMPLE:
+            explain_cmd = {name: val for name, val in command.items() if name not in _DRIVER_FIELDS}
+            _queue_explain(key, db_name, explain_cmd, self._get_client)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, dict(event.reply))
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, None)
+
+
+def listeners(get_client: Callable[[], Any]) -> List[monitoring.CommandListener]:
+    """event_listeners for a new MongoClient (empty unless QUERY_STATS=1)."""
+    return [QueryListener(get_client)] if ENABLED else []
+
+
+def report() -> Dict[str, Any]:
+    """Groups by total time spent, with averages and scan ratios filled in."""
+    with _lock:
+        groups = [dict(group) for group in _groups.values()]
+        slow = list(_slow)
+    for group in groups:
+        group["avg_ms"] = round(group["total_ms"] / group["calls"], 2) if group["calls"] else None
+        group["total_ms"] = round(group["total_ms"], 1)
+        group["max_ms"] = round(group["max_ms"], 1)
+        if group["explained"]:
+            # docs the server read per doc it returned; ~1 means the index did the work
+            group["scan_ratio"] = round(group["docs_examined"] / max(group["explain_returned"], 1), 1)
+    groups.sort(key=lambda group: group["total_ms"], reverse=True)
+    return {
+        "enabled": ENABLED,
+        "slow_ms": SLOW_MS,
+        "explain_sample": EXPLAIN_SAMPLE,
+        "queries": groups,
+        "collscans": [group for group in groups if group["collscan"]],
+        "slow": slow,
+    }
+
+
+def reset() -> None:
+    with _lock:
+        _groups.clear()
+        _slow.clear()
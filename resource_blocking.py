@@ -0,0 +1,148 @@
+"""Block heavy or useless requests (images, fonts, video, trackers) during scrapes.
+
+The scrapers only read text and image URLs from result pages, so the bytes behind
+those URLs, web fonts, video and analytics scripts are wasted bandwidth and load
+time. apply() hands a per-platform URL blocklist to Chrome via CDP
+Network.setBlockedURLs. Blocked requests show up in the performance log as
+Network.loadingFailed events; collect() counts them and report() turns the counts
+into an (estimated) bytes-saved figure.
+
+    BLOCK_RESOURCES=images,fonts,media,trackers   # default; "none" turns blocking off
+    BLINKIT_BLOCK_RESOURCES=fonts,trackers        # per-platform override
+    BLOCK_URL_PATTERNS=*example-cdn.com/banners/* # extra patterns (category "custom")
+"""
+import fnmatch
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List
+
+CATEGORY_PATTERNS: Dict[str, List[str]] = {
+    "images": ["*.png*", "*.jpg*", "*.jpeg*", "*.webp*", "*.gif*", "*.avif*", "*.ico*"],
+    "fonts": ["*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*", "*fonts.googleapis.com*", "*fonts.gstatic.com*"],
+    "media": ["*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*", "*.m4s*", "*.lottie*"],
+    "trackers": [
+        "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*",
+        "*connect.facebook.net*", "*facebook.com/tr*", "*hotjar.com*", "*clarity.ms*", "*clevertap*",
+        "*moengage*", "*appsflyer*", "*branch.io*", "*mixpanel.com*", "*amplitude.com*", "*segment.io*",
+        "*newrelic.com*", "*nr-data.net*",
+    ],
+}
+DEFAULT_CATEGORIES = "images,fonts,media,trackers"
+# Rough transfer size per blocked request; blocked bodies are never downloaded, so
+# the saving can only be estimated.
+ESTIMATED_BYTES = {"images": 35_000, "fonts": 30_000, "media": 400_000, "trackers": 25_000, "custom": 20_000}
+RESOURCE_TYPES = {"Image": "images", "Font": "fonts", "Media": "media", "Script": "trackers", "Ping": "trackers"}
+PERFORMANCE_LOGGING = {"performance": "ALL"}
+
+_lock = threading.Lock()
+_urls: Dict[str, str] = {}
+_blocked: Dict[str, int] = {}
+
+
+def categories(platform: str) -> List[str]:
+    raw = os.getenv(f"{platform.upper()}_BLOCK_RESOURCES", os.getenv("BLOCK_RESOURCES", DEFAULT_CATEGORIES))
+    if raw.strip().lower() in ("", "0", "none", "off"):
+        return []
+    return [part.strip().lower() for part in raw.split(",") if part.strip().lower() in CATEGORY_PATTERNS]
+
+
+def custom_patterns() -> List[str]:
+    return [part.strip() for part in os.getenv("BLOCK_URL_PATTERNS", "").split(",") if part.strip()]
+
+
+def blocked_patterns(platform: str) -> List[str]:
+    patterns: List[str] = []
+    for category in categories(platform):
+        patterns.extend(CATEGORY_PATTERNS[category])
+    return patterns + custom_patterns()
+
+
+def blocking_enabled(platform: str) -> bool:
+    return bool(blocked_patterns(platform))
+
+
+def enable_reporting(options: Any, platform: str) -> None:
+    """Turn on the performance log so blocked requests can be counted."""
+    if blocking_enabled(platform):
+        options.set_capability("goog:loggingPrefs", PERFORMANCE_LOGGING)
+
+
+def apply(driver: Any, platform: str) -> None:
+    """Install the blocklist on the driver's current tab (call again for new tabs)."""
+    patterns = blocked_patterns(platform)
+    if not patterns:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    except Exception as e:
+        print(f" Request blocking unavailable: {e}")
+
+
+def _category(url: str, resource_type: str) -> str:
+    for category, patterns in CATEGORY_PATTERNS.items():
+        if any(fnmatch.fnmatchcase(url, pattern) for pattern in patterns):
+            return category
+    if url and any(fnmatch.fnmatchcase(url, pattern) for pattern in custom_patterns()):
+        return "custom"
+    return RESOURCE_TYPES.get(resource_type, "custom")
+
+
+def observe(message: Dict[str, Any]) -> None:
+    """Feed one DevTools Network.* message (other log readers pass theirs through here)."""
+    method = message.get("method")
+    params = message.get("params") or {}
+    with _lock:
+        if method == "Network.requestWillBeSent":
+            request_id = str(params.get("requestId", ""))
+            _urls[request_id] = str((params.get("request") or {}).get("url", ""))
+            if len(_urls) > 5000:
+                _urls.clear()
+        elif method == "Network.loadingFailed" and params.get("blockedReason"):
+            url = _urls.pop(str(params.get("requestId", "")), "")
+            category = _category(url, str(params.get("type", "")))
+            _blocked[category] = _blocked.get(category, 0) + 1
+
+
+def observe_entries(entries: Iterable[Dict[str, Any]]) -> None:
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except Exception:
+            continue
+        if isinstance(message, dict):
+            observe(message)
+
+
+def collect(driver: Any) -> None:
+    """Drain the performance log and count blocked requests seen since the last call."""
+    try:
+        observe_entries(driver.get_log("performance"))
+    except Exception:
+        pass
+
+
+def report() -> Dict[str, Any]:
+    with _lock:
+        counts = dict(_blocked)
+    per_category = {
+        category: {"requests": count, "est_bytes": count * ESTIMATED_BYTES.get(category, ESTIMATED_BYTES["custom"])}
+        for category, count in counts.items()
+    }
+    return {
+        "blocked_requests": sum(counts.values()),
+        "est_bytes_saved": sum(row["est_bytes"] for row in per_category.values()),
+        "by_category": per_category,
+    }
+
+
+def print_report() -> None:
+    stats = report()
+    if not stats["blocked_requests"]:
+        return
+    parts = ", ".join(f"{category} {row['requests']}" for category, row in sorted(stats["by_category"].items()))
+    print(
+        f"\n Blocked {stats['blocked_requests']} requests ({parts}),"
+        f" ~{stats['est_bytes_saved'] / 1_000_000:.1f} MB saved (estimated)"
+    )
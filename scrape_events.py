@@ -0,0 +1,97 @@
+"""NDJSON event pipe between a scraper subprocess and the server that started it.
+
+With SCRAPER_MODE=subprocess the servers used to capture the scrapers' stdout
+(emoji progress lines) and echo it back. Now the server opens a dedicated pipe
+and passes its descriptor in SCRAPE_EVENTS_FD; the scraper writes one JSON object
+per line to it:
+
+    {"type": "progress", "cards": 24}
+    {"type": "term", "term": "milk", "rows": [...]}       # a finished term, to be stored and streamed
+    {"type": "error", "term": "milk", "error": "..."}
+    {"type": "timing", "stage": "blinkit results", "seconds": 1.4, "cap": 6, "ready": true}
+
+While the pipe is open the parent owns storage: save_term_results() and
+append_output() in the scraper hand their rows over as `term` events instead of
+writing to Mongo and the JSONL store, and the parent writes them in batches.
+Each row crosses the pipe once: there is no per-card row event, so
+/scrape/stream gets a subprocess scrape's rows a term at a time.
+stdout stays free-form logging.
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, IO, Iterator, Optional, Tuple
+
+EVENTS_ENV = "SCRAPE_EVENTS_FD"
+
+_stream: Optional[IO[str]] = None
+_stream_lock = threading.Lock()
+_stream_failed = False
+
+
+def enabled() -> bool:
+    """True inside a scraper started with an event pipe (the parent stores the rows)."""
+    return bool(os.getenv(EVENTS_ENV)) and not _stream_failed
+
+
+def _open_stream() -> Optional[IO[str]]:
+    global _stream, _stream_failed
+    if _stream is None and not _stream_failed:
+        raw = os.getenv(EVENTS_ENV, "")
+        try:
+            if raw.startswith("handle:"):
+                import msvcrt
+                fd = msvcrt.open_osfhandle(int(raw[len("handle:"):]), os.O_WRONLY)
+            else:
+                fd = int(raw)
+            _stream = os.fdopen(fd, "w", encoding="utf-8", buffering=1)
+        except (OSError, ValueError) as e:
+            _stream_failed = True
+            print(f" Event pipe unavailable ({e}); saving rows locally.")
+    return _stream
+
+
+def emit(event_type: str, **fields: Any) -> None:
+    """Write one event line to the parent (no-op outside an event-pipe subprocess)."""
+    if not enabled():
+        return
+    line = json.dumps({"type": event_type, **fields}, ensure_ascii=False, default=str)
+    with _stream_lock:
+        stream = _open_stream()
+        if stream is None:
+            return
+        try:
+            stream.write(line + "\n")
+        except OSError:
+            pass
+
+
+# -- parent side ---------------------------------------------------------------
+
+def open_pipe(env: Dict[str, str]) -> Tuple[IO[str], int, Dict[str, Any]]:
+    """Create the pipe; sets SCRAPE_EVENTS_FD in env and returns (reader, write_fd, Popen kwargs).
+
+    Close write_fd in the parent once the child has started.
+    """
+    read_fd, write_fd = os.pipe()
+    if os.name == "nt":
+        import msvcrt
+        handle = msvcrt.get_osfhandle(write_fd)
+        os.set_handle_inheritable(handle, True)
+        env[EVENTS_ENV] = f"handle:{handle}"
+        popen_kwargs: Dict[str, Any] = {"close_fds": False}
+    else:
+        env[EVENTS_ENV] = str(write_fd)
+        popen_kwargs = {"pass_fds": (write_fd,)}
+    return os.fdopen(read_fd, "r", encoding="utf-8", errors="ignore"), write_fd, popen_kwargs
+
+
+def read_events(reader: IO[str]) -> Iterator[Dict[str, Any]]:
+    """Yield events until the child closes its end; malformed lines are skipped."""
+    for line in reader:
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(event, dict):
+            yield event
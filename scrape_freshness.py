@@ -0,0 +1,121 @@
+"""Last-successful-scrape timestamps so /scrape can skip terms scraped recently.
+
+Each server records, per (platform, normalized term, location label), when a
+scrape last finished with rows. A /scrape for data younger than the TTL is
+answered from storage instead of opening a browser; `force=1` skips the check.
+
+    SCRAPE_FRESH_TTL=900            # seconds, all platforms (0 disables)
+    BLINKIT_SCRAPE_FRESH_TTL=300    # per-platform override
+
+Timestamps live in SCRAPE_FRESHNESS_FILE (default scrape_freshness.json) so a
+restart, or the other server scraping the same platform, does not forget them.
+Updates hold an exclusive lock on scrape_freshness.json.lock for the whole
+read-modify-replace, so concurrent servers and scrapers don't drop each
+other's entries; readers need no lock since the file is replaced atomically.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+import jsonl_store
+
+FRESHNESS_FILE = os.getenv(
+    "SCRAPE_FRESHNESS_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "scrape_freshness.json"),
+)
+
+_lock = threading.Lock()
+
+
+def ttl(platform: str) -> float:
+    return float(os.getenv(f"{platform.upper()}_SCRAPE_FRESH_TTL", os.getenv("SCRAPE_FRESH_TTL", "900")))
+
+
+def _entry_key(platform: str, term: str, label: str = "") -> str:
+    return "|".join((platform.lower(), " ".join(term.lower().split()), label))
+
+
+def _load() -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(FRESHNESS_FILE, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+        return data if isinstance(data, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f" Ignoring unreadable {FRESHNESS_FILE}: {e}")
+        return {}
+
+
+def _labels(where: Any) -> Iterable[str]:
+    return [getattr(loc, "label", str(loc)) for loc in where] if where else [""]
+
+
+def mark(platform: str, term: str, counts: Dict[str, int]) -> None:
+    """Record a successful scrape; counts maps location label ("" = default) to rows saved."""
+    now = time.time()
+    with _lock, jsonl_store.file_lock(f"{FRESHNESS_FILE}.lock"):
+        data = _load()
+        for label, count in counts.items():
+            if count > 0:
+                data[_entry_key(platform, term, label)] = {"scraped_at": now, "count": count}
+        cutoff = now - max(ttl(platform), 86400)
+        data = {key: val for key, val in data.items() if float(val.get("scraped_at") or 0) >= cutoff}
+        try:
+            tmp_path = f"{FRESHNESS_FILE}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump(data, fh)
+            os.replace(tmp_path, FRESHNESS_FILE)
+        except Exception as e:
+            print(f" Could not save scrape timestamps: {e}")
+
+
+def mark_result(platform: str, term: str, where: Any, resp: Dict[str, Any]) -> None:
+    """mark() from a scrape response body (per-location counts when it fanned out)."""
+    counts = resp.get("locations")
+    if not isinstance(counts, dict):
+        counts = {label: int(resp.get("count") or 0) for label in _labels(where)}
+    mark(platform, term, counts)
+
+
+def lookup(platform: str, term: str, where: Any = None) -> Optional[Dict[str, Any]]:
+    """{age_s, scraped_at, count} when every requested location is within the TTL, else None."""
+    limit = ttl(platform)
+    if limit <= 0:
+        return None
+    with _lock:
+        data = _load()
+    now = time.time()
+    entries = [data.get(_entry_key(platform, term, label)) for label in _labels(where)]
+    if not all(entries):
+        return None
+    oldest = min(float(entry["scraped_at"]) for entry in entries if entry)
+    if now - oldest > limit:
+        return None
+    return {
+        "age_s": int(now - oldest),
+        "scraped_at": oldest,
+        "count": sum(int(entry.get("count") or 0) for entry in entries if entry),
+        "ttl_s": int(limit),
+    }
+
+
+def cached_body(platform: str, term: str, fresh: Dict[str, Any]) -> Dict[str, Any]:
+    """/scrape response when the stored data is still fresh."""
+    return {
+        "status": "ok",
+        "served": "cache",
+        "platform": platform,
+        "term": term,
+        "count": fresh["count"],
+        "age_s": fresh["age_s"],
+        "ttl_s": fresh["ttl_s"],
+    }
+
+
+def force_requested(data: Dict[str, Any], args: Any) -> bool:
+    """force=1 in the JSON body or query string."""
+    raw = data.get("force", args.get("force", ""))
+    return str(raw).strip().lower() in ("1", "true", "yes")
@@ -0,0 +1,456 @@
+"""Background scrape jobs for the Flask servers.
+
+POST /scrape used to hold a request thread for the whole browser session. Now the
+servers submit a job here and answer at once with its id; a bounded pool of
+SCRAPE_JOB_WORKERS threads runs the jobs, and GET /jobs/<id> reports state,
+progress (result cards found / rows saved so far), timings and the row count.
+
+Scrapes are single-flight per (platform, normalized term, locations): a request
+for a scrape that is already queued or running attaches to that job instead of
+starting another browser session and writing a duplicate batch.
+
+Progress is reported from inside the scrapers with progress() and emit_row();
+the job a call belongs to travels in a context variable, so nothing has to be
+threaded through the scraper signatures. Emitted rows are kept on the job so
+GET /scrape/stream can push them to the browser as Server-Sent Events while the
+scrape is still running (sse_events()).
+"""
+import contextvars
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+import locations
+import scrape_events
+import scrape_freshness
+
+JOB_WORKERS = int(os.getenv("SCRAPE_JOB_WORKERS", "2"))
+JOB_MAX_PENDING = int(os.getenv("SCRAPE_JOB_MAX_PENDING", "50"))
+# Finished jobs stay queryable for this many seconds
+JOB_TTL = float(os.getenv("SCRAPE_JOB_TTL", "3600"))
+# Seconds between progress events (and keep-alives) on an idle SSE stream
+STREAM_HEARTBEAT = float(os.getenv("SCRAPE_STREAM_HEARTBEAT", "5"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+
+_current_job: contextvars.ContextVar[Optional["Job"]] = contextvars.ContextVar("scrape_job", default=None)
+
+
+class JobQueueFull(Exception):
+    """Raised when SCRAPE_JOB_MAX_PENDING jobs are already waiting."""
+
+
+def scrape_key(platform: str, term: str, where: Any = None) -> Tuple[str, str, Tuple[str, ...]]:
+    """In-flight key: platform, normalized term and the sorted location labels ("" = default)."""
+    labels = sorted(getattr(loc, "label", str(loc)) for loc in where) if where else []
+    return platform.lower(), " ".join(term.lower().split()), tuple(labels)
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat() if ts else None
+
+
+class Job:
+    """One scrape request and everything GET /jobs/<id> reports about it."""
+
+    def __init__(self, platform: str, term: str, meta: Optional[Dict[str, Any]] = None) -> None:
+        self.id = uuid.uuid4().hex[:16]
+        self.platform = platform
+        self.term = term
+        self.meta = dict(meta or {})
+        self.state = QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cards = 0
+        self.rows = 0
+        self.count: Optional[int] = None
+        self.error: Optional[str] = None
+        self.error_kind: Optional[str] = None
+        self.result: Dict[str, Any] = {}
+        self.key: Optional[Tuple[str, str, Tuple[str, ...]]] = None
+        self.attached = 0
+        self.streamed: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._done = threading.Event()
+
+    def add_progress(self, cards: int = 0, rows: int = 0) -> None:
+        with self._changed:
+            self.cards += cards
+            self.rows += rows
+            self._changed.notify_all()
+
+    def add_row(self, row: Dict[str, Any]) -> None:
+        with self._changed:
+            self.streamed.append(dict(row))
+            self._changed.notify_all()
+
+    def rows_since(self, index: int, timeout: float) -> List[Dict[str, Any]]:
+        """Rows emitted after `index`, waiting up to `timeout` for new ones (or the job to finish)."""
+        with self._changed:
+            if len(self.streamed) <= index and not self._done.is_set():
+                self._changed.wait(timeout)
+            return self.streamed[index:]
+
+    def mark_finished(self) -> None:
+        with self._changed:
+            self.finished_at = time.time()
+            self._done.set()
+            self._changed.notify_all()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        now = time.time()
+        started = self.started_at or now
+        with self._lock:
+            body: Dict[str, Any] = {
+                "job_id": self.id,
+                "platform": self.platform,
+                "term": self.term,
+                "state": self.state,
+                "progress": {"cards": self.cards, "rows": self.rows},
+                "timings": {
+                    "created_at": _iso(self.created_at),
+                    "started_at": _iso(self.started_at),
+                    "finished_at": _iso(self.finished_at),
+                    "queued_ms": int((started - self.created_at) * 1000),
+                    "run_ms": int(((self.finished_at or now) - started) * 1000) if self.started_at else 0,
+                },
+                "count": self.count,
+                "attached": self.attached,
+            }
+        body.update(self.meta)
+        if self.error:
+            body["error"] = self.error
+            body["error_kind"] = self.error_kind
+        if self.result:
+            body["result"] = self.result
+        return body
+
+
+class JobQueue:
+    """Bounded worker pool plus an id -> Job registry."""
+
+    def __init__(self, workers: int = JOB_WORKERS, max_pending: int = JOB_MAX_PENDING) -> None:
+        self.max_pending = max(1, max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="scrape-job")
+        self._jobs: Dict[str, Job] = {}
+        self._finished: Deque[Job] = deque()
+        self._inflight: Dict[Tuple[str, str, Tuple[str, ...]], Job] = {}
+        self._lock = threading.Lock()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - JOB_TTL
+        while self._finished and (self._finished[0].finished_at or 0) < cutoff:
+            self._jobs.pop(self._finished.popleft().id, None)
+
+    def pending(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.state == QUEUED)
+
+    def submit(
+        self,
+        platform: str,
+        term: str,
+        runner: Callable[[Job], Dict[str, Any]],
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> Job:
+        """Queue runner(job); it returns the response-style dict stored as job.result."""
+        return self.submit_once(None, platform, term, runner, meta)[0]
+
+    def submit_once(
+        self,
+        key: Optional[Tuple[str, str, Tuple[str, ...]]],
+        platform: str,
+        term: str,
+        runner: Callable[[Job], Dict[str, Any]],
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[Job, bool]:
+        """Like submit(), but joins the unfinished job with the same key; returns (job, created)."""
+        with self._lock:
+            self._prune()
+            existing = self._inflight.get(key) if key is not None else None
+            if existing is not None and not existing.finished:
+                existing.attached += 1
+                print(f" [job {existing.id}] {platform} '{term}' already in flight; request attached")
+                return existing, False
+            if self.pending() >= self.max_pending:
+                raise JobQueueFull(f"{self.max_pending} scrape jobs already waiting; try again shortly")
+            job = Job(platform, term, meta)
+            job.key = key
+            self._jobs[job.id] = job
+            if key is not None:
+                self._inflight[key] = job
+        self._executor.submit(self._run, job, runner)
+        return job, True
+
+    def _run(self, job: Job, runner: Callable[[Job], Dict[str, Any]]) -> None:
+        job.state = RUNNING
+        job.started_at = time.time()
+        token = _current_job.set(job)
+        try:
+            result = runner(job) or {}
+            job.result = result
+            job.count = int(result.get("count", job.rows) or 0)
+            job.state = ERROR if result.get("status") == "error" else DONE
+            if job.state == ERROR:
+                job.error = str(result.get("error") or "scrape failed")
+                job.error_kind = "scrape"
+        except TimeoutError as e:
+            job.state, job.error, job.error_kind = ERROR, str(e), "timeout"
+        except Exception as e:
+            job.state, job.error, job.error_kind = ERROR, str(e), "exception"
+        finally:
+            _current_job.reset(token)
+            with self._lock:
+                if job.key is not None and self._inflight.get(job.key) is job:
+                    del self._inflight[job.key]
+                job.mark_finished()
+                self._finished.append(job)
+            print(f" [job {job.id}] {job.platform} '{job.term}' {job.state} in {job.finished_at - job.started_at:.1f}s")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_queue() -> JobQueue:
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
+
+
+def accepted_body(job: Job, created: bool) -> Dict[str, Any]:
+    """202 body for POST /scrape; `coalesced` is true when the request joined a running job."""
+    return {
+        "status": "queued" if job.state == QUEUED else job.state,
+        "job_id": job.id,
+        "job_url": f"/jobs/{job.id}",
+        "term": job.term,
+        "platform": job.platform,
+        "served": "live",
+        "coalesced": not created,
+    }
+
+
+def current_job() -> Optional[Job]:
+    return _current_job.get()
+
+
+def progress(cards: int = 0, rows: int = 0) -> None:
+    """Called from scraper code: credit cards/rows to the job running in this context (if any)."""
+    job = _current_job.get()
+    if job is not None:
+        job.add_progress(cards, rows)
+    elif cards:
+        scrape_events.emit("progress", cards=cards)
+
+
+def emit_row(row: Dict[str, Any]) -> None:
+    """Called from scraper code as each card becomes a row; feeds /scrape/stream.
+
+    Scraper subprocesses send nothing here: their rows reach the parent once, in
+    the `term` event, which streams them to the job (see run_subprocess()).
+    """
+    job = _current_job.get()
+    if job is not None:
+        job.add_row(row)
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def _sse(event: str, body: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(body, ensure_ascii=False, default=str)}\n\n"
+
+
+def sse_final(body: Dict[str, Any], status: int) -> Iterator[str]:
+    """A one-event stream for a request that never became a job: `cached` or `failed`."""
+    yield _sse("cached" if status == 200 else "failed", body)
+
+
+def sse_events(job: Job, created: bool) -> Iterator[str]:
+    """Stream a job: `queued`, one `row` per scraped card, periodic `progress`, then `done` or `failed`."""
+    yield _sse("queued", accepted_body(job, created))
+    sent = 0
+    while True:
+        finished = job.finished
+        rows = job.rows_since(sent, STREAM_HEARTBEAT)
+        for row in rows:
+            yield _sse("row", row)
+        sent += len(rows)
+        if finished:
+            break
+        if not rows:
+            yield _sse("progress", {"job_id": job.id, "state": job.state, "progress": {"cards": job.cards, "rows": job.rows}})
+    final = job.to_dict()
+    final["streamed"] = sent
+    yield _sse("failed" if job.state == ERROR else "done", final)
+
+
+def submit_in_context(executor: Any, fn: Callable[..., Any], *args: Any) -> Any:
+    """executor.submit() that keeps the caller's job context (for fan-out threads)."""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def run_subprocess(
+    job: Job,
+    platform: str,
+    cmd: List[str],
+    env: Dict[str, str],
+    cwd: str,
+    timeout: float = 120,
+) -> Dict[str, Any]:
+    """Run a scraper script with an NDJSON event pipe (scrape_events.py) and store its rows here.
+
+    Progress feeds the job as it arrives; each finished term is streamed to it, saved
+    with the platform's save_term_results() and the whole run appended to the
+    JSONL store once, so the parent is the only writer.
+    """
+    import browser_pool
+
+    scraper = browser_pool.load_scraper(platform)
+    env = dict(env)
+    reader, write_fd, popen_kwargs = scrape_events.open_pipe(env)
+    try:
+        proc = subprocess.Popen(
+            cmd, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors="ignore",
+            **popen_kwargs,
+        )
+    except Exception:
+        reader.close()
+        raise
+    finally:
+        os.close(write_fd)
+    killed = threading.Event()
+
+    def _kill() -> None:
+        killed.set()
+        proc.kill()
+
+    # stdout/stderr are plain logs now; drain them so the child never blocks on a full pipe
+    stdout_tail: Deque[str] = deque(maxlen=20)
+    stderr_tail: Deque[str] = deque(maxlen=10)
+    drains = [
+        threading.Thread(target=lambda: stdout_tail.extend(line.rstrip() for line in proc.stdout or []), daemon=True),
+        threading.Thread(target=lambda: stderr_tail.extend(line.rstrip() for line in proc.stderr or []), daemon=True),
+    ]
+    for thread in drains:
+        thread.start()
+    timer = threading.Timer(timeout, _kill)
+    timer.start()
+
+    terms: Dict[str, int] = {}
+    errors: List[Dict[str, Any]] = []
+    waits: Dict[str, float] = {}
+    run_rows: List[Dict[str, Any]] = []
+    try:
+        with reader:
+            for event in scrape_events.read_events(reader):
+                kind = event.get("type")
+                if kind == "progress":
+                    job.add_progress(cards=int(event.get("cards") or 0))
+                elif kind == "term":
+                    term = str(event.get("term") or job.term)
+                    rows = [row for row in event.get("rows") or [] if isinstance(row, dict)]
+                    terms[term] = terms.get(term, 0) + len(rows)
+                    for row in rows:
+                        job.add_row(row)
+                    if rows:
+                        scraper.save_term_results(term, rows)
+                        run_rows.extend(rows)
+                        job.add_progress(rows=len(rows))
+                elif kind == "error":
+                    errors.append({key: event[key] for key in ("term", "error") if key in event})
+                elif kind == "timing":
+                    stage = str(event.get("stage") or "")
+                    waits[stage] = round(waits.get(stage, 0.0) + float(event.get("seconds") or 0), 2)
+        returncode = proc.wait()
+    finally:
+        timer.cancel()
+        for thread in drains:
+            thread.join(timeout=1)
+        if run_rows:
+            scraper.append_output(run_rows)
+    if killed.is_set():
+        raise TimeoutError(f"scrape timed out after {timeout:.0f}s")
+    resp: Dict[str, Any] = {
+        "status": "ok" if returncode == 0 else "error",
+        "mode": "subprocess",
+        "returncode": returncode,
+        "count": len(run_rows),
+        "terms": terms,
+        "errors": errors[:10],
+        "waits_s": waits,
+    }
+    if returncode != 0:
+        resp["error"] = stderr_tail[-1] if stderr_tail else (errors[-1].get("error") if errors else "scraper failed")
+        resp["stderr_tail"] = list(stderr_tail)
+        resp["stdout_tail"] = list(stdout_tail)
+    return resp
+
+
+def make_scrape_runner(
+    platform: str,
+    term: str,
+    where: Any,
+    script: str,
+    cwd: str,
+    env_overrides: Optional[Dict[str, str]] = None,
+    on_success: Optional[Callable[[], None]] = None,
+) -> Callable[[Job], Dict[str, Any]]:
+    """Job body shared by the servers: warm pool by default, scraper subprocess with SCRAPER_MODE=subprocess."""
+    import browser_pool
+    import mongo_client
+
+    def runner(job: Job) -> Dict[str, Any]:
+        if browser_pool.pool_mode_enabled():
+            resp = browser_pool.timed_scrape(platform, term, where=where)
+        else:
+            env = os.environ.copy()
+            env["SEARCH_TERMS"] = term
+            if where:
+                # The scraper then fans out over exactly these locations (parallel_scrape)
+                env["SCRAPE_LOCATIONS"] = locations.format_locations(where)
+                env["ZEPTO_LOCATIONS"] = ""
+            env.update(env_overrides or {})
+            resp = run_subprocess(job, platform, [sys.executable, script], env, cwd)
+        # rows are queued by the ingest buffer; make them readable before the job reports done
+        saved = mongo_client.flush_ingest()
+        if resp.get("status") != "error":
+            # spooled rows are not readable yet, so the term must not be served as fresh
+            if saved:
+                scrape_freshness.mark_result(platform, term, where, resp)
+            if on_success is not None:
+                on_success()
+        return resp
+
+    return runner
@@ -2,10 +2,10 @@
 
 import sys
 import io
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+if __name__ == "__main__":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
 import time
-import json
 import os
 from collections.abc import Sequence
 from typing import Any, TypedDict, cast
@@ -19,7 +19,15 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 
+import batch_extract
+import html_extract
+import jsonl_store
+import locations
 import mongo_client
+import page_waits
+import resource_blocking
+import scrape_events
+import scrape_jobs
 
 
 class SearchRow(TypedDict):
@@ -67,19 +75,30 @@ PRODUCTS_TO_SEARCH: list[str] = load_search_terms()
 
 # Optional MongoDB settings (set environment variables to enable)
 # Prefer Zepto-specific overrides; fall back to generic envs, then localhost defaults.
-ZEPTO_MONGO_URI = os.getenv("ZEPTO_MONGO_URI", os.getenv("MONGO_URI", "mongodb://localhost:27017"))
-ZEPTO_DB = os.getenv("ZEPTO_DB", os.getenv("MONGO_DB", "snapit_zepto"))
 ZEPTO_COLLECTION = os.getenv("ZEPTO_COLLECTION", os.getenv("MONGO_COLLECTION", "prices"))
 ZEPTO_LOCATION = os.getenv("ZEPTO_LOCATION", "")
 ZEPTO_LOCATIONS = [loc.strip() for loc in os.getenv("ZEPTO_LOCATIONS", "").split(",") if loc.strip()]
 OUTPUT_FILE = os.getenv("OUTPUT_FILE", "scraped_data.json")
 MAX_RESULTS = int(os.getenv("ZEPTO_MAX_RESULTS", "12"))
 
-def scrape_zepto() -> None:
-    if not PRODUCTS_TO_SEARCH:
-        print(" No search terms provided. Exiting without running browser.")
-        return
+PLATFORM = "zepto"
+HOME_URL = "https://www.zeptonow.com/"
+CARD_XPATH = '//a[contains(@href, "/pn/")]'
 
+
+def create_driver(location: locations.Location | None = None) -> WebDriver | None:
+    """Launch Chrome, emulating `location`'s coordinates when it has them."""
+    driver = launch_chrome()
+    if driver is not None:
+        resource_blocking.apply(driver, PLATFORM)
+    # Only emulate a position for locations that carry coordinates
+    if driver is not None and location is not None and location.lat is not None and location.lng is not None:
+        locations.set_geolocation(driver, location.lat, location.lng)
+    return driver
+
+
+def launch_chrome() -> WebDriver | None:
+    """Launch a headless Chrome session, retrying without the version pin if needed."""
     options: Any = uc.ChromeOptions()
     # Adding a realistic user agent
     options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
@@ -87,217 +106,338 @@ def scrape_zepto() -> None:
     options.add_argument('--disable-gpu')
     options.add_argument('--no-sandbox')
     options.add_argument('--disable-dev-shm-usage')
+    resource_blocking.enable_reporting(options, PLATFORM)
 
     # Pin to installed Chrome version to avoid mismatch
-    driver: WebDriver | None = None
     try:
-        driver = cast(WebDriver, uc.Chrome(options=options, version_main=144))
+        return cast(WebDriver, uc.Chrome(options=options, version_main=144))
     except Exception as e:
         try:
             import traceback
             print("DRIVER_INIT_FAILED (retry without pin)", e)
             traceback.print_exc()
-            driver = cast(WebDriver, uc.Chrome(options=options))
+            return cast(WebDriver, uc.Chrome(options=options))
         except Exception as e2:
             print("DRIVER_INIT_FAILED final", e2)
             import traceback
             traceback.print_exc()
-            return
-    wait: WebDriverWait[WebDriver] = WebDriverWait(driver, 20) # This is our "patience" timer
-    scraped_results: list[SearchRow] = []
-
-    def extract_image(element: WebElement) -> str | None:
-        """Pull the best image URL from a card if present."""
-        try:
-            img = cast(WebElement, element.find_element(By.XPATH, ".//img"))
-            for attr in ["src", "data-src", "data-srcset", "srcset"]:
-                val: str | None = cast(str | None, img.get_attribute(attr))
-                if val:
-                    # If srcset-style, take the first URL
-                    if " " in val and "http" in val:
-                        return val.split(" ")[0]
-                    return val
-        except Exception:
             return None
+
+
+def extract_image(element: WebElement) -> str | None:
+    """Pull the best image URL from a card if present."""
+    try:
+        img = cast(WebElement, element.find_element(By.XPATH, ".//img"))
+        for attr in ["src", "data-src", "data-srcset", "srcset"]:
+            val: str | None = cast(str | None, img.get_attribute(attr))
+            if val:
+                # If srcset-style, take the first URL
+                if " " in val and "http" in val:
+                    return val.split(" ")[0]
+                return val
+    except Exception:
         return None
+    return None
 
-    def get_search_input() -> WebElement:
-        # Prefer a real input field first
-        input_xpath = '//input[contains(@placeholder, "Search")] | //input[@type="text"]'
+
+def get_search_input(driver: WebDriver) -> WebElement:
+    wait: WebDriverWait[WebDriver] = WebDriverWait(driver, 20) # This is our "patience" timer
+    # Prefer a real input field first
+    input_xpath = '//input[contains(@placeholder, "Search")] | //input[@type="text"]'
+    try:
+        return cast(WebElement, wait.until(EC.element_to_be_clickable((By.XPATH, input_xpath))))
+    except TimeoutException:
+        pass
+
+    # Fall back to clicking a search trigger (if any), then re-find input
+    trigger_xpath = '//span[contains(text(), "Search")]'
+    triggers = cast(list[WebElement], wait.until(EC.presence_of_all_elements_located((By.XPATH, trigger_xpath))))
+    for trigger in triggers:
         try:
+            driver.execute_script("arguments[0].click();", trigger)
+            time.sleep(1)
             return cast(WebElement, wait.until(EC.element_to_be_clickable((By.XPATH, input_xpath))))
-        except TimeoutException:
+        except Exception:
+            continue
+
+    raise TimeoutException("Search input not found")
+
+
+def prepare_session(driver: WebDriver, location: locations.Location | None = None) -> None:
+    """Open the homepage and wait until the search input is usable."""
+    if location is not None:
+        print(f" Zepto location: {location.label} (via geolocation override)")
+    driver.get(HOME_URL)
+    print(" Website Opened. Waiting for page to stabilize...")
+    page_waits.settle(driver, "zepto home", 10)
+    get_search_input(driver)
+
+
+def scrape_term(driver: WebDriver, item: str, location_text: str = "") -> list[SearchRow]:
+    """Search one term in an already prepared session and return its rows."""
+    wait: WebDriverWait[WebDriver] = WebDriverWait(driver, 20)
+    print(f"Searching for: {item}")
+
+    search_box: WebElement = get_search_input(driver)
+
+    search_box.click()
+    time.sleep(1)
+
+    # Clear and Type
+    search_box.send_keys(Keys.CONTROL + "a")
+    search_box.send_keys(Keys.BACKSPACE)
+    search_box.send_keys(item)
+    search_box.send_keys(Keys.ENTER)
+
+    print(f"   Sent Enter for {item}, waiting for results...")
+    page_waits.settle(driver, "zepto results", 6, CARD_XPATH, url_contains="search")
+
+    # Extract top results for the current item
+    cards: list[WebElement] = cast(
+        list[WebElement],
+        wait.until(
+            EC.presence_of_all_elements_located(
+                (By.XPATH, CARD_XPATH)
+            )
+        ),
+    )
+    if len(cards) < MAX_RESULTS:
+        # Try a couple scrolls to load lazy cards
+        try:
+            for _ in range(2):
+                driver.execute_script("window.scrollBy(0, 600);")
+                page_waits.settle(driver, "zepto scroll", 1, CARD_XPATH, min_count=len(cards) + 1, quiet=0)
+                more: list[WebElement] = driver.find_elements(By.XPATH, CARD_XPATH)
+                if len(more) > len(cards):
+                    cards = more
+                if len(cards) >= MAX_RESULTS:
+                    break
+        except Exception:
             pass
+    print(f"   -> Found {len(cards)} result cards for {item}")
+    scrape_jobs.progress(cards=len(cards))
+
+    if batch_extract.html_mode_enabled():
+        try:
+            html_rows = cast(list[SearchRow], html_extract.parse_html(driver.page_source, PLATFORM, item, location_text))
+        except Exception as e:
+            print(f"   Page-source parsing failed, reading cards one by one: {e}")
+            html_rows = []
+        if html_rows:
+            for row in html_rows[:MAX_RESULTS]:
+                print(f"      + Scraped: {row['product_name'] or 'Unknown'}")
+                scrape_jobs.emit_row(row)
+            return html_rows[:MAX_RESULTS]
+    if batch_extract.batch_mode_enabled():
+        try:
+            batch_rows = rows_from_batch(driver, item, location_text)
+        except Exception as e:
+            print(f"   Batch extraction failed, reading cards one by one: {e}")
+            batch_rows = []
+        if batch_rows:
+            return batch_rows
+    return rows_from_elements(cards, item, location_text)
+
+
+def name_from_href(href: str | None) -> str:
+    """Zepto product URLs carry a readable slug: /pn/<slug>/pvid/<id>."""
+    if href and "/pn/" in href:
+        slug = href.split("/pn/")[1].split("/pvid/")[0]
+        return slug.replace("-", " ").strip()
+    return ""
+
+
+def rows_from_batch(driver: WebDriver, item: str, location_text: str = "") -> list[SearchRow]:
+    """Build rows from one injected extraction call instead of per-card round trips."""
+    cards = batch_extract.extract_cards(
+        driver,
+        CARD_XPATH,
+        name_selector="h5",
+        price_selector='h4[data-testid="product-card-price"]',
+        quantity_selector='span[data-testid="product-card-quantity"]',
+        images=True,
+    )
+    term_results: list[SearchRow] = []
+    for card in cards[:MAX_RESULTS]:
+        raw_text = batch_extract.card_text(card, "text")
+        href = cast(str | None, card.get("href"))
+        name, price, quantity = batch_extract.fill_from_raw_text(
+            raw_text,
+            batch_extract.card_text(card, "name"),
+            batch_extract.card_text(card, "price"),
+            batch_extract.card_text(card, "quantity"),
+        )
+        if (not name) or (quantity and name == quantity):
+            name = name_from_href(href) or name
+        term_results.append({
+            "search_term": item,
+            "product_name": name,
+            "price": price,
+            "quantity": quantity,
+            "platform": "Zepto",
+            "location": location_text,
+            "url": href,
+            "image_url": batch_extract.first_image_url(cast(str | None, card.get("image"))),
+            "raw_text": raw_text,
+        })
+        print(f"      + Scraped: {name or 'Unknown'}")
+        scrape_jobs.emit_row(term_results[-1])
+    return term_results
+
+
+def rows_from_elements(cards: list[WebElement], item: str, location_text: str = "") -> list[SearchRow]:
+    """Per-card WebDriver reads; used when EXTRACT_MODE=dom or the batch script fails."""
+    term_results: list[SearchRow] = []
+    count = 0
+    for card in cards:
+        if count >= MAX_RESULTS:
+            break
+        try:
+            name: str = ""
+            price: str = ""
+            quantity: str = ""
+            raw_text: str = card.text.strip()
+            href: str | None = cast(str | None, card.get_attribute("href"))
+            image_url = extract_image(card)
 
-        # Fall back to clicking a search trigger (if any), then re-find input
-        trigger_xpath = '//span[contains(text(), "Search")]'
-        triggers = cast(list[WebElement], wait.until(EC.presence_of_all_elements_located((By.XPATH, trigger_xpath))))
-        for trigger in triggers:
             try:
-                driver.execute_script("arguments[0].click();", trigger)
-                time.sleep(1)
-                return cast(WebElement, wait.until(EC.element_to_be_clickable((By.XPATH, input_xpath))))
+                name = cast(str, card.find_element(By.XPATH, './/h5').text.strip())
             except Exception:
-                continue
+                pass
+            try:
+                price = cast(str, card.find_element(By.XPATH, './/h4[@data-testid="product-card-price"]').text.strip())
+            except Exception:
+                pass
+            try:
+                quantity = cast(str, card.find_element(By.XPATH, './/span[@data-testid="product-card-quantity"]').text.strip())
+            except Exception:
+                pass
+
+            if raw_text:
+                lines = [line.strip() for line in raw_text.split("\n") if line.strip()]
+                if not price:
+                    for line in lines:
+                        if "₹" in line:
+                            price = line
+                            break
+                if not quantity:
+                    for line in lines:
+                        if any(unit in line.lower() for unit in ["kg", "g", "ml", "l", "pcs", "pack"]):
+                            quantity = line
+                            break
+                if not name and lines:
+                    candidate_lines = [
+                        line for line in lines
+                        if line.upper() != "ADD" and "₹" not in line
+                    ]
+                    if candidate_lines:
+                        name = max(candidate_lines, key=len)
+                    else:
+                        name = lines[0]
+
+            if (not name) or (quantity and name == quantity):
+                name = name_from_href(href) or name
+
+            row: SearchRow = {
+                "search_term": item,
+                "product_name": name,
+                "price": price,
+                "quantity": quantity,
+                "platform": "Zepto",
+                "location": location_text,
+                "url": href,
+                "image_url": image_url,
+                "raw_text": raw_text,
+            }
+            term_results.append(row)
+            print(f"      + Scraped: {name or 'Unknown'}")
+            scrape_jobs.emit_row(row)
+            count += 1
+        except Exception:
+            continue
+    return term_results
 
-        raise TimeoutException("Search input not found")
 
-    def save_to_mongo(records: Sequence[SearchRow], collection_name: str) -> None:
-        if not records:
-            return
-        try:
-            inserted = mongo_client.save_records(
-                cast(Sequence[dict[str, Any]], records),
-                collection_name=collection_name,
-                db_name=ZEPTO_DB,
-                uri=ZEPTO_MONGO_URI,
-            )
-            print(f" Saved {inserted} records to MongoDB collection '{collection_name}' in db '{ZEPTO_DB}'.")
-        except Exception as e:
-            print(f" MongoDB save failed for {collection_name}: {e}")
+def save_to_mongo(records: Sequence[SearchRow]) -> None:
+    if not records:
+        return
+    try:
+        queued = mongo_client.ingest_products(cast(Sequence[dict[str, Any]], records), PLATFORM)
+        print(f" Queued {queued} records for {mongo_client.product_store().label()}.")
+    except Exception as e:
+        print(f" Product save failed: {e}")
+
+
+def save_term_results(item: str, records: Sequence[SearchRow]) -> None:
+    """Save a term's rows to the products collection (or hand them to the parent server, see scrape_events.py)."""
+    if scrape_events.enabled():
+        scrape_events.emit("term", term=item, rows=list(records))
+        return
+    if records:
+        save_to_mongo(records)
+
+
+def append_output(scraped_results: Sequence[SearchRow]) -> None:
+    """Append a run's rows to the JSONL fallback store (see jsonl_store.py)."""
+    if scrape_events.enabled():
+        return  # the parent server already received them as `term` events
+    if not mongo_client.jsonl_fallback_enabled():
+        return  # STORAGE_BACKEND=sqlite: rows are already in the local store
+    store = jsonl_store.open_store(OUTPUT_FILE)
+    written = store.append(cast(Sequence[dict[str, Any]], scraped_results))
+    print(f"\n Data appended; {written} records added to {os.path.basename(store.base)}.*.jsonl")
+
+
+def scrape_zepto() -> None:
+    if not PRODUCTS_TO_SEARCH:
+        print(" No search terms provided. Exiting without running browser.")
+        return
+
+    import parallel_scrape
+    if parallel_scrape.concurrency_requested(PLATFORM):
+        parallel_scrape.run(PLATFORM, PRODUCTS_TO_SEARCH)
+        return
+
+    driver = create_driver()
+    if driver is None:
+        scrape_events.emit("error", error="browser could not be started")
+        return
+    scraped_results: list[SearchRow] = []
 
     try:
-        driver.get("https://www.zeptonow.com/")
+        driver.get(HOME_URL)
         print(" Website Opened. Waiting for page to stabilize...")
-        time.sleep(10) # Give it extra time for the first load
+        page_waits.settle(driver, "zepto home", 10)
 
         print(f"🔍 Search terms this run: {PRODUCTS_TO_SEARCH}")
 
-        locations_to_test: list[str] = [""]
+        locations_to_test: list[str] = [ZEPTO_LOCATION]
 
         for location_text in locations_to_test:
             print("\n=== Using default/current location (no changes) ===")
 
             # Wait for search to be available before starting
             try:
-                get_search_input()
+                get_search_input(driver)
             except TimeoutException:
                 print("❌ Search input not found on initial load. Taking a screenshot...")
                 driver.save_screenshot("search_input_not_found.png")
                 continue
 
             for item in PRODUCTS_TO_SEARCH:
-                term_results: list[SearchRow] = []
                 try:
-                    print(f"Searching for: {item}")
-
-                    search_box: WebElement = get_search_input()
-
-                    search_box.click()
-                    time.sleep(1)
-
-                    # Clear and Type
-                    search_box.send_keys(Keys.CONTROL + "a")
-                    search_box.send_keys(Keys.BACKSPACE)
-                    search_box.send_keys(item)
-                    search_box.send_keys(Keys.ENTER)
-
-                    print(f"   Sent Enter for {item}, waiting for results...")
-                    time.sleep(6) # Give the page a bit more time
-
-                    # Extract top results for the current item
-                    cards: list[WebElement] = cast(
-                        list[WebElement],
-                        wait.until(
-                            EC.presence_of_all_elements_located(
-                                (By.XPATH, '//a[contains(@href, "/pn/")]')
-                            )
-                        ),
-                    )
-                    if len(cards) < MAX_RESULTS:
-                        # Try a couple scrolls to load lazy cards
-                        try:
-                            for _ in range(2):
-                                driver.execute_script("window.scrollBy(0, 600);")
-                                time.sleep(1)
-                                more: list[WebElement] = driver.find_elements(By.XPATH, '//a[contains(@href, "/pn/")]')
-                                if len(more) > len(cards):
-                                    cards = more
-                                if len(cards) >= MAX_RESULTS:
-                                    break
-                        except Exception:
-                            pass
-                    print(f"   -> Found {len(cards)} result cards for {item}")
-
-                    count = 0
-                    for card in cards:
-                        if count >= MAX_RESULTS:
-                            break
-                        try:
-                            name: str = ""
-                            price: str = ""
-                            quantity: str = ""
-                            raw_text: str = card.text.strip()
-                            href: str | None = cast(str | None, card.get_attribute("href"))
-                            image_url = extract_image(card)
-
-                            try:
-                                name = cast(str, card.find_element(By.XPATH, './/h5').text.strip())
-                            except Exception:
-                                pass
-                            try:
-                                price = cast(str, card.find_element(By.XPATH, './/h4[@data-testid="product-card-price"]').text.strip())
-                            except Exception:
-                                pass
-                            try:
-                                quantity = cast(str, card.find_element(By.XPATH, './/span[@data-testid="product-card-quantity"]').text.strip())
-                            except Exception:
-                                pass
-
-                            if raw_text:
-                                lines = [line.strip() for line in raw_text.split("\n") if line.strip()]
-                                if not price:
-                                    for line in lines:
-                                        if "₹" in line:
-                                            price = line
-                                            break
-                                if not quantity:
-                                    for line in lines:
-                                        if any(unit in line.lower() for unit in ["kg", "g", "ml", "l", "pcs", "pack"]):
-                                            quantity = line
-                                            break
-                                if not name and lines:
-                                    candidate_lines = [
-                                        line for line in lines
-                                        if line.upper() != "ADD" and "₹" not in line
-                                    ]
-                                    if candidate_lines:
-                                        name = max(candidate_lines, key=len)
-                                    else:
-                                        name = lines[0]
-
-                            if (not name) or (quantity and name == quantity):
-                                if href and "/pn/" in href:
-                                    slug = href.split("/pn/")[1].split("/pvid/")[0]
-                                    name = slug.replace("-", " ").strip()
-
-                            row: SearchRow = {
-                                "search_term": item,
-                                "product_name": name,
-                                "price": price,
-                                "quantity": quantity,
-                                "platform": "Zepto",
-                                "location": location_text,
-                                "url": href,
-                                "image_url": image_url,
-                                "raw_text": raw_text,
-                            }
-                            scraped_results.append(row)
-                            term_results.append(row)
-                            print(f"      + Scraped: {name or 'Unknown'}")
-                            count += 1
-                        except Exception:
-                            continue
-
-                    # Save per-term to its own collection
-                    if term_results:
-                        save_to_mongo(term_results, collection_name=item)
+                    term_results = scrape_term(driver, item, location_text)
+                    resource_blocking.collect(driver)
+                    scraped_results.extend(term_results)
+                    save_term_results(item, term_results)
 
                 except TimeoutException:
                     print(f" Timed out waiting for search box for {item}. Taking a screenshot...")
+                    scrape_events.emit("error", term=item, error="timed out waiting for search box")
                     driver.save_screenshot(f"timeout_{item}.png")
                 except Exception as e:
                     print(f"Could not search for {item}. Taking a screenshot to see why...")
+                    scrape_events.emit("error", term=item, error=str(e))
                     driver.save_screenshot(f"error_{item}.png")
                     # This screenshot will tell us exactly what the bot was seeing!
 
@@ -307,22 +447,12 @@ def scrape_zepto() -> None:
         except OSError:
             pass
         if scraped_results:
-            existing: list[SearchRow] = []
-            if os.path.exists(OUTPUT_FILE):
-                try:
-                    with open(OUTPUT_FILE, "r", encoding="utf-8") as f:
-                        existing_raw = json.load(f) or []
-                    existing = [cast(SearchRow, rec) for rec in existing_raw if isinstance(rec, dict)]
-                except Exception:
-                    existing = []
-
-            combined: list[SearchRow] = existing + scraped_results
-            with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-                json.dump(combined, f, indent=4, ensure_ascii=False)
-            print(f"\n Data appended; total records now {len(combined)} in {OUTPUT_FILE}")
+            append_output(scraped_results)
         else:
             print("\n No data captured. Check screenshots for UI changes.")
+        page_waits.print_report()
+        resource_blocking.print_report()
         print("\n Session Ended.")
 
 if __name__ == "__main__":
-    scrape_zepto()
\ No newline at end of file
+    scrape_zepto()
@@ -3,7 +3,8 @@
 
 import sys
 import io
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+if __name__ == "__main__":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
 import undetected_chromedriver as uc  # type: ignore
 from selenium.webdriver.chrome.options import Options
@@ -15,14 +16,21 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.remote.webelement import WebElement
 import time
-import json
 import os
-from typing import Any, Callable, List, Optional, cast
+from typing import Any, List, Optional, cast
 from urllib.parse import quote, urljoin
 
+import batch_extract
+import html_extract
+import jsonl_store
+import locations
 import mongo_client
-
-SAVE_RECORDS = cast(Callable[[List[dict[str, Any]], Optional[str], Optional[str], Optional[str]], int], mongo_client.save_records)
+import network_capture
+import page_waits
+import resource_blocking
+import scrape_events
+import scrape_jobs
+import session_snapshots
 
 def load_search_terms() -> List[str]:
     """Load search terms from SEARCH_TERMS env (comma/newline-separated), search_terms.txt, or CLI args. No defaults."""
@@ -55,18 +63,27 @@ def load_search_terms() -> List[str]:
     return []
 
 PRODUCTS_TO_SEARCH = load_search_terms()
-BLINKIT_DB = os.getenv("BLINKIT_DB", "snapit_blinkit")
-BLINKIT_URI = os.getenv("BLINKIT_MONGO_URI", os.getenv("MONGO_URI", "mongodb://localhost:27017"))
 OUTPUT_FILE = os.getenv("OUTPUT_FILE", "scraped_blinkit.json")
 MAX_RESULTS = int(os.getenv("BLINKIT_MAX_RESULTS", "12"))
 DEFAULT_LAT = float(os.getenv("BLINKIT_LAT", "12.9716"))
 DEFAULT_LNG = float(os.getenv("BLINKIT_LNG", "77.5946"))
+DEFAULT_PIN = os.getenv("BLINKIT_PIN", "560001")
+# Override to point the scraper at a local stand-in (see fixture_server.py)
+BASE_URL = os.getenv("BLINKIT_BASE_URL", "https://www.blinkit.com").rstrip("/")
 
-def scrape_blinkit():
-    if not PRODUCTS_TO_SEARCH:
-        print(" No search terms provided. Exiting without running browser.")
-        return
 
+PLATFORM = "blinkit"
+HOME_URL = f"{BASE_URL}/"
+CARD_XPATH = (
+    "//*[@id='product_container']/following::div[@role='button'][.//div[normalize-space()='ADD']]"
+    " | //div[@role='button'][.//div[normalize-space()='ADD'] and @data-pf]"
+)
+ADD_CARD_XPATH = "//button[contains(.,'ADD')]/ancestor::*[self::article or self::div or self::li][1]"
+MODAL_XPATH = "//div[contains(@role,'dialog') or contains(@class,'modal')]"
+
+
+def create_driver(location: Optional[locations.Location] = None) -> Optional[ChromiumDriver]:
+    """Launch Chrome with geolocation allowed (at `location` if given), retrying without the version pin if needed."""
     options = Options()
     options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
     options.add_argument('--disable-gpu')
@@ -78,6 +95,9 @@ def scrape_blinkit():
     })
     if os.getenv("HEADLESS", "1") != "0":
         options.add_argument('--headless=new')
+    if batch_extract.network_mode_enabled():
+        network_capture.enable_performance_logging(options)
+    resource_blocking.enable_reporting(options, PLATFORM)
 
     driver: ChromiumDriver
     try:
@@ -92,275 +112,417 @@ def scrape_blinkit():
             print("DRIVER_INIT_FAILED final", e2)
             import traceback
             traceback.print_exc()
-            return
+            return None
 
-    wait = WebDriverWait(driver, 25)
-    scraped_results: List[dict[str, Any]] = []
+    resource_blocking.apply(driver, PLATFORM)
+    # Allow geolocation (fake) to reduce location prompts
+    lat, lng = locations.coords(location, DEFAULT_LAT, DEFAULT_LNG)
+    locations.set_geolocation(driver, lat, lng)
+    return driver
 
-    def extract_product_url(element: WebElement, product_name: str = "") -> Optional[str]:
-        """Attempt to pull a product URL from the element, its children, or ancestors."""
-        base = "https://www.blinkit.com"
-        candidates: List[str] = []
 
-        direct_href = element.get_attribute("href")
-        if direct_href:
-            candidates.append(direct_href)
+def extract_product_url(element: WebElement, product_name: str = "") -> Optional[str]:
+    """Attempt to pull a product URL from the element, its children, or ancestors."""
+    base = BASE_URL
+    candidates: List[str] = []
 
+    direct_href = element.get_attribute("href")
+    if direct_href:
+        candidates.append(direct_href)
+
+    for attr in ["data-pf", "data-href", "data-url", "data-link"]:
+        val = element.get_attribute(attr)
+        if val:
+            candidates.append(val)
+
+    # Walk up a few ancestors to catch data-* on parent containers
+    parent: Optional[WebElement] = element
+    for _ in range(3):
+        try:
+            parent = parent.find_element(By.XPATH, "..")
+        except Exception:
+            break
         for attr in ["data-pf", "data-href", "data-url", "data-link"]:
-            val = element.get_attribute(attr)
+            val = parent.get_attribute(attr)
             if val:
                 candidates.append(val)
 
-        # Walk up a few ancestors to catch data-* on parent containers
-        parent: Optional[WebElement] = element
-        for _ in range(3):
+    try:
+        anchors = element.find_elements(By.XPATH, ".//a[@href]")
+        for a in anchors:
+            href = a.get_attribute("href")
+            if href:
+                candidates.append(href)
+    except Exception:
+        pass
+
+    for href in candidates:
+        if href.startswith("http"):
+            return href
+        if href.startswith("/"):
+            return urljoin(base, href)
+    if product_name:
+        return f"{base}/s/?q={quote(product_name)}"
+    return None
+
+
+def handle_location_modal(driver: ChromiumDriver, pin: str = DEFAULT_PIN) -> bool:
+    """If a location modal is present, attempt detect or enter pin and close it (True if closed)."""
+    try:
+        dialog = driver.find_elements(By.XPATH, MODAL_XPATH)
+        if not dialog:
+            return False
+
+        detect_btn = driver.find_elements(By.XPATH, "//button[contains(.,'Detect my location')] | //button[contains(.,'Detect')]")
+        if detect_btn:
             try:
-                parent = parent.find_element(By.XPATH, "..")
+                driver.execute_script("arguments[0].click();", detect_btn[0])
+                WebDriverWait(driver, 8).until(EC.invisibility_of_element_located((By.XPATH, MODAL_XPATH)))
+                print(" Location modal closed via detect.")
+                return True
             except Exception:
-                break
-            for attr in ["data-pf", "data-href", "data-url", "data-link"]:
-                val = parent.get_attribute(attr)
-                if val:
-                    candidates.append(val)
+                pass
 
+        loc_input = None
         try:
-            anchors = element.find_elements(By.XPATH, ".//a[@href]")
-            for a in anchors:
-                href = a.get_attribute("href")
-                if href:
-                    candidates.append(href)
+            loc_input = driver.find_element(By.XPATH, "//input[contains(@placeholder,'delivery location') or contains(@placeholder,'location') or contains(@aria-label,'location')]")
         except Exception:
             pass
+        if loc_input:
+            driver.execute_script("arguments[0].click();", loc_input)
+            time.sleep(0.3)
+            loc_input.send_keys(Keys.CONTROL + "a")
+            loc_input.send_keys(Keys.BACKSPACE)
+            loc_input.send_keys(pin)
+            time.sleep(1.0)
+            loc_input.send_keys(Keys.ENTER)
+            time.sleep(1.0)
+            # pick first suggestion if present
+            suggestions = driver.find_elements(By.XPATH, "//li | //div[contains(@data-testid,'suggestion') or contains(@class,'suggestion')]")
+            if suggestions:
+                driver.execute_script("arguments[0].click();", suggestions[0])
+                time.sleep(0.8)
+            confirm = driver.find_elements(By.XPATH, "//button[contains(.,'Deliver') or contains(.,'Confirm') or contains(.,'Continue')]")
+            for btn in confirm:
+                try:
+                    driver.execute_script("arguments[0].click();", btn)
+                    time.sleep(0.6)
+                    break
+                except Exception:
+                    continue
+            try:
+                WebDriverWait(driver, 8).until(EC.invisibility_of_element_located((By.XPATH, MODAL_XPATH)))
+                print(" Location modal closed via pin.")
+                return True
+            except Exception:
+                pass
+    except Exception as e:
+        print(f" Location modal handling skipped: {e}")
+    return False
 
-        for href in candidates:
-            if href.startswith("http"):
-                return href
-            if href.startswith("/"):
-                return urljoin(base, href)
-        if product_name:
-            return f"{base}/s/?q={quote(product_name)}"
-        return None
 
-    # Allow geolocation (fake) to reduce location prompts
+def search_url(term: str, location_text: str = "") -> str:
+    # Blinkit keeps the delivery location in the session, not in the search URL
+    return f"{BASE_URL}/s/?q={quote(term)}"
+
+
+def open_search(driver: ChromiumDriver, term: str) -> None:
+    url = search_url(term)
+    driver.get(url)
+    print(f" Opened search URL: {url}")
+
+
+def prepare_session(driver: ChromiumDriver, location: Optional[locations.Location] = None) -> None:
+    """Open the homepage so later searches start from a warm, located session."""
+    label = location.label if location is not None else ""
+    driver.get(HOME_URL)
+    restored = session_snapshots.restore(driver, PLATFORM, label)
+    print(" Blinkit opened. Waiting for page to stabilize...")
+    page_waits.settle(driver, "blinkit home", 6)
+    modal_open = bool(driver.find_elements(By.XPATH, MODAL_XPATH))
+    if restored and not modal_open:
+        print(" Saved Blinkit location still applies; skipping location setup.")
+        return
+    if restored:
+        session_snapshots.invalidate(PLATFORM, label)
+    if location is not None or modal_open:
+        print(f" Setting Blinkit location: {label or 'default'}")
+        if handle_location_modal(driver, location.pin if location is not None and location.pin else DEFAULT_PIN):
+            session_snapshots.save(driver, PLATFORM, label)
+
+
+def scrape_term(driver: ChromiumDriver, item: str, location_text: str = "") -> List[dict[str, Any]]:
+    """Search one term in an already prepared session and return its rows."""
+    print(f"Searching for: {item}")
+    if batch_extract.network_mode_enabled():
+        network_rows = network_capture.scrape_via_network(
+            driver, PLATFORM, search_url(item), item, location_text, BASE_URL, MAX_RESULTS
+        )
+        if network_rows:
+            return network_rows
+        print("   No search API response captured, falling back to the DOM.")
+    open_search(driver, item)
+    page_waits.settle(driver, "blinkit results", 6, CARD_XPATH)
+    return extract_current_page(driver, item, location_text)
+
+
+def extract_current_page(driver: ChromiumDriver, item: str, location_text: str = "") -> List[dict[str, Any]]:
+    """Extract rows from a search page that is already open in the current tab."""
+    wait = WebDriverWait(driver, 25)
+    if handle_location_modal(driver, locations.pin_for(location_text, DEFAULT_PIN, PLATFORM)):
+        session_snapshots.save(driver, PLATFORM, session_snapshots.label_for(location_text, PLATFORM))
+    page_waits.settle(driver, "blinkit after location", 3, CARD_XPATH)
+
+    if os.getenv("DUMP_HTML"):
+        try:
+            with open(f"blinkit_{item}_page.html", "w", encoding="utf-8") as fh:
+                fh.write(driver.page_source)
+            print(f" Saved page HTML to blinkit_{item}_page.html for inspection.")
+        except Exception as e:
+            print(f" Could not dump HTML: {e}")
     try:
-        driver.execute_cdp_cmd("Emulation.setGeolocationOverride", {
-            "latitude": DEFAULT_LAT,
-            "longitude": DEFAULT_LNG,
-            "accuracy": 50
+        cards: List[WebElement] = wait.until(
+            EC.presence_of_all_elements_located(
+                (By.XPATH, CARD_XPATH)
+            )
+        )
+    except TimeoutException:
+        cards = driver.find_elements(By.XPATH, CARD_XPATH)
+
+    # Scroll multiple times to load more if we found too few
+    scroll_attempts = 0
+    while len(cards) < MAX_RESULTS and scroll_attempts < 6:
+        try:
+            driver.execute_script("window.scrollBy(0, document.body.scrollHeight);")
+            page_waits.settle(driver, "blinkit scroll", 1.5, CARD_XPATH, min_count=len(cards) + 1, quiet=0)
+            more_cards: List[WebElement] = driver.find_elements(By.XPATH, CARD_XPATH)
+            if len(more_cards) > len(cards):
+                cards = more_cards
+            else:
+                scroll_attempts += 1
+        except Exception:
+            break
+    # If we still only have a container, fall back to ancestors of ADD buttons
+    cards_xpath = CARD_XPATH
+    if len(cards) <= 1:
+        add_cards: List[WebElement] = driver.find_elements(By.XPATH, ADD_CARD_XPATH)
+        if add_cards:
+            cards = add_cards
+            cards_xpath = ADD_CARD_XPATH
+
+    print(f"   -> Found {len(cards)} result cards for {item}")
+    scrape_jobs.progress(cards=len(cards))
+
+    if batch_extract.html_mode_enabled():
+        try:
+            html_rows = html_extract.parse_html(driver.page_source, PLATFORM, item, location_text)
+        except Exception as e:
+            print(f"   Page-source parsing failed, reading cards one by one: {e}")
+            html_rows = []
+        if html_rows:
+            for row in html_rows[:MAX_RESULTS]:
+                print(f"      + Scraped: {row['product_name'] or 'Unknown'}")
+                scrape_jobs.emit_row(row)
+            return html_rows[:MAX_RESULTS]
+    if batch_extract.batch_mode_enabled():
+        try:
+            batch_rows = rows_from_batch(driver, cards_xpath, item, location_text)
+        except Exception as e:
+            print(f"   Batch extraction failed, reading cards one by one: {e}")
+            batch_rows = []
+        if batch_rows:
+            return batch_rows
+    return rows_from_elements(cards, item, location_text)
+
+
+def rows_from_batch(driver: ChromiumDriver, cards_xpath: str, item: str, location_text: str = "") -> List[dict[str, Any]]:
+    """Build rows from one injected extraction call instead of per-card round trips."""
+    cards = batch_extract.extract_cards(
+        driver,
+        cards_xpath,
+        name_selector="h3, h4, p",
+        lift_buttons=True,
+        ancestor_depth=3,
+        link_attrs=batch_extract.URL_DATA_ATTRS,
+        child_links=True,
+    )
+    term_results: List[dict[str, Any]] = []
+    for card in cards:
+        if len(term_results) >= MAX_RESULTS:
+            break
+        raw_text = batch_extract.card_text(card, "text")
+        name, price, quantity = batch_extract.fill_from_raw_text(
+            raw_text,
+            batch_extract.card_text(card, "name"),
+            batch_extract.card_text(card, "price"),
+            batch_extract.card_text(card, "quantity"),
+        )
+        if not price:
+            # Skip placeholders/skeleton cards without price
+            continue
+        if name.strip().upper() == "ADD":
+            continue
+        links = [str(link) for link in card.get("links") or []]
+        term_results.append({
+            "search_term": item,
+            "product_name": name,
+            "price": price,
+            "quantity": quantity,
+            "platform": "Blinkit",
+            "location": location_text,
+            "url": batch_extract.resolve_url(links, BASE_URL, item),
+            "raw_text": raw_text,
         })
-    except Exception:
-        pass
-
-    def handle_location_modal(pin: str = "560001"):
-        """If a location modal is present, attempt detect or enter pin and close it."""
+        print(f"      + Scraped: {name or 'Unknown'}")
+        scrape_jobs.emit_row(term_results[-1])
+    return term_results
+
+
+def rows_from_elements(cards: List[WebElement], item: str, location_text: str = "") -> List[dict[str, Any]]:
+    """Per-card WebDriver reads; used when EXTRACT_MODE=dom or the batch script fails."""
+    term_results: List[dict[str, Any]] = []
+    count = 0
+    for card in cards:
+        if count >= MAX_RESULTS:
+            break
         try:
-            dialog = driver.find_elements(By.XPATH, "//div[contains(@role,'dialog') or contains(@class,'modal')]")
-            if not dialog:
-                return
-
-            detect_btn = driver.find_elements(By.XPATH, "//button[contains(.,'Detect my location')] | //button[contains(.,'Detect')]")
-            if detect_btn:
+            target: WebElement = card
+            if card.tag_name.lower() == "button":
                 try:
-                    driver.execute_script("arguments[0].click();", detect_btn[0])
-                    WebDriverWait(driver, 8).until(EC.invisibility_of_element_located((By.XPATH, "//div[contains(@role,'dialog') or contains(@class,'modal')]") ))
-                    print(" Location modal closed via detect.")
-                    return
+                    target = card.find_element(By.XPATH, "ancestor::*[self::article or self::div or self::li][1]")
                 except Exception:
-                    pass
+                    target = card
+            name = ""
+            price = ""
+            quantity = ""
+            raw_text = target.text.strip()
+            href = extract_product_url(target, name or item)
 
-            loc_input = None
             try:
-                loc_input = driver.find_element(By.XPATH, "//input[contains(@placeholder,'delivery location') or contains(@placeholder,'location') or contains(@aria-label,'location')]")
+                name_el = target.find_element(By.XPATH, ".//*[self::h3 or self::h4 or self::p][1]")
+                name = name_el.text.strip()
+            except Exception:
+                pass
+            try:
+                price_el = target.find_element(By.XPATH, ".//*[contains(text(),'₹')]")
+                price = price_el.text.strip()
+            except Exception:
+                pass
+            try:
+                qty_el = target.find_element(By.XPATH, ".//*[contains(text(),'g') or contains(text(),'kg') or contains(text(),'ml') or contains(text(),'l') or contains(text(),'pcs') or contains(text(),'pack')]")
+                quantity = qty_el.text.strip()
             except Exception:
                 pass
-            if loc_input:
-                driver.execute_script("arguments[0].click();", loc_input)
-                time.sleep(0.3)
-                loc_input.send_keys(Keys.CONTROL + "a")
-                loc_input.send_keys(Keys.BACKSPACE)
-                loc_input.send_keys(pin)
-                time.sleep(1.0)
-                loc_input.send_keys(Keys.ENTER)
-                time.sleep(1.0)
-                # pick first suggestion if present
-                suggestions = driver.find_elements(By.XPATH, "//li | //div[contains(@data-testid,'suggestion') or contains(@class,'suggestion')]")
-                if suggestions:
-                    driver.execute_script("arguments[0].click();", suggestions[0])
-                    time.sleep(0.8)
-                confirm = driver.find_elements(By.XPATH, "//button[contains(.,'Deliver') or contains(.,'Confirm') or contains(.,'Continue')]")
-                for btn in confirm:
-                    try:
-                        driver.execute_script("arguments[0].click();", btn)
-                        time.sleep(0.6)
-                        break
-                    except Exception:
-                        continue
-                try:
-                    WebDriverWait(driver, 8).until(EC.invisibility_of_element_located((By.XPATH, "//div[contains(@role,'dialog') or contains(@class,'modal')]") ))
-                    print(" Location modal closed via pin.")
-                except Exception:
-                    pass
-        except Exception as e:
-            print(f" Location modal handling skipped: {e}")
 
-    def open_search(term: str) -> None:
-        url = f"https://www.blinkit.com/s/?q={quote(term)}"
-        driver.get(url)
-        print(f" Opened search URL: {url}")
+            if raw_text:
+                lines = [line.strip() for line in raw_text.split("\n") if line.strip()]
+                if not price:
+                    for line in lines:
+                        if "₹" in line:
+                            price = line
+                            break
+                if not quantity:
+                    for line in lines:
+                        low = line.lower()
+                        if any(unit in low for unit in ["kg", "g", "ml", "l", "pcs", "pack"]):
+                            quantity = line
+                            break
+                if not name and lines:
+                    candidate_lines = [line for line in lines if line.upper() != "ADD" and "₹" not in line]
+                    if candidate_lines:
+                        name = max(candidate_lines, key=len)
+                    else:
+                        name = lines[0]
+
+            if not price:
+                # Skip placeholders/skeleton cards without price
+                continue
+            if name.strip().upper() == "ADD":
+                continue
+
+            row: dict[str, Any] = {
+                "search_term": item,
+                "product_name": name,
+                "price": price,
+                "quantity": quantity,
+                "platform": "Blinkit",
+                "location": location_text,
+                "url": href,
+                "raw_text": raw_text,
+            }
+            term_results.append(row)
+            print(f"      + Scraped: {name or 'Unknown'}")
+            scrape_jobs.emit_row(row)
+            count += 1
+        except Exception:
+            continue
+    return term_results
 
-    def save_to_mongo(records: List[dict[str, Any]], collection_name: str) -> None:
-        if not records:
-            return
-        try:
-            inserted = SAVE_RECORDS(records, collection_name, BLINKIT_DB, BLINKIT_URI)
-            print(f" Saved {inserted} records to MongoDB collection '{collection_name}' in db '{BLINKIT_DB}'.")
-        except Exception as e:
-            print(f" MongoDB save failed for {collection_name}: {e}")
 
+def save_to_mongo(records: List[dict[str, Any]]) -> None:
+    if not records:
+        return
     try:
-        driver.get("https://www.blinkit.com/")
-        print(" Blinkit opened. Waiting for page to stabilize...")
-        time.sleep(6)
+        queued = mongo_client.ingest_products(records, PLATFORM)
+        print(f" Queued {queued} records for {mongo_client.product_store().label()}.")
+    except Exception as e:
+        print(f" Product save failed: {e}")
+
+
+def save_term_results(item: str, records: List[dict[str, Any]]) -> None:
+    if scrape_events.enabled():
+        scrape_events.emit("term", term=item, rows=list(records))
+        return
+    if records:
+        save_to_mongo(records)
+
+
+def append_output(scraped_results: List[dict[str, Any]]) -> None:
+    """Append a run's rows to the JSONL fallback store (see jsonl_store.py)."""
+    if scrape_events.enabled():
+        return  # the parent server already received them as `term` events
+    if not mongo_client.jsonl_fallback_enabled():
+        return  # STORAGE_BACKEND=sqlite: rows are already in the local store
+    store = jsonl_store.open_store(OUTPUT_FILE)
+    written = store.append(scraped_results)
+    print(f"\n Data appended; {written} records added to {os.path.basename(store.base)}.*.jsonl")
+
+
+def scrape_blinkit():
+    if not PRODUCTS_TO_SEARCH:
+        print(" No search terms provided. Exiting without running browser.")
+        return
+
+    import parallel_scrape
+    if parallel_scrape.concurrency_requested(PLATFORM):
+        parallel_scrape.run(PLATFORM, PRODUCTS_TO_SEARCH)
+        return
+
+    driver = create_driver()
+    if driver is None:
+        scrape_events.emit("error", error="browser could not be started")
+        return
+    scraped_results: List[dict[str, Any]] = []
+
+    try:
+        prepare_session(driver)
 
         print(f"🔍 Search terms this run: {PRODUCTS_TO_SEARCH}")
 
         for item in PRODUCTS_TO_SEARCH:
-            term_results: List[dict[str, Any]] = []
             try:
-                print(f"Searching for: {item}")
-                open_search(item)
-                time.sleep(6)
-                handle_location_modal()
-                time.sleep(3)
-
-                if os.getenv("DUMP_HTML"):
-                    try:
-                        with open(f"blinkit_{item}_page.html", "w", encoding="utf-8") as fh:
-                            fh.write(driver.page_source)
-                        print(f" Saved page HTML to blinkit_{item}_page.html for inspection.")
-                    except Exception as e:
-                        print(f" Could not dump HTML: {e}")
-                card_xpath = (
-                    "//*[@id='product_container']/following::div[@role='button'][.//div[normalize-space()='ADD']]"
-                    " | //div[@role='button'][.//div[normalize-space()='ADD'] and @data-pf]"
-                )
-                try:
-                    cards: List[WebElement] = wait.until(
-                        EC.presence_of_all_elements_located(
-                            (By.XPATH, card_xpath)
-                        )
-                    )
-                except TimeoutException:
-                    cards = driver.find_elements(By.XPATH, card_xpath)
-
-                # Scroll multiple times to load more if we found too few
-                scroll_attempts = 0
-                while len(cards) < MAX_RESULTS and scroll_attempts < 6:
-                    try:
-                        driver.execute_script("window.scrollBy(0, document.body.scrollHeight);")
-                        time.sleep(1.5)
-                        more_cards: List[WebElement] = driver.find_elements(By.XPATH, card_xpath)
-                        if len(more_cards) > len(cards):
-                            cards = more_cards
-                        else:
-                            scroll_attempts += 1
-                    except Exception:
-                        break
-                # If we still only have a container, fall back to ancestors of ADD buttons
-                if len(cards) <= 1:
-                    add_cards: List[WebElement] = driver.find_elements(
-                        By.XPATH,
-                        "//button[contains(.,'ADD')]/ancestor::*[self::article or self::div or self::li][1]"
-                    )
-                    if add_cards:
-                        cards = add_cards
-
-                print(f"   -> Found {len(cards)} result cards for {item}")
-
-                count = 0
-                for card in cards:
-                    if count >= MAX_RESULTS:
-                        break
-                    try:
-                        target: WebElement = card
-                        if card.tag_name.lower() == "button":
-                            try:
-                                target = card.find_element(By.XPATH, "ancestor::*[self::article or self::div or self::li][1]")
-                            except Exception:
-                                target = card
-                        name = ""
-                        price = ""
-                        quantity = ""
-                        raw_text = target.text.strip()
-                        href = extract_product_url(target, name or item)
-
-                        try:
-                            name_el = target.find_element(By.XPATH, ".//*[self::h3 or self::h4 or self::p][1]")
-                            name = name_el.text.strip()
-                        except Exception:
-                            pass
-                        try:
-                            price_el = target.find_element(By.XPATH, ".//*[contains(text(),'₹')]")
-                            price = price_el.text.strip()
-                        except Exception:
-                            pass
-                        try:
-                            qty_el = target.find_element(By.XPATH, ".//*[contains(text(),'g') or contains(text(),'kg') or contains(text(),'ml') or contains(text(),'l') or contains(text(),'pcs') or contains(text(),'pack')]")
-                            quantity = qty_el.text.strip()
-                        except Exception:
-                            pass
-
-                        if raw_text:
-                            lines = [line.strip() for line in raw_text.split("\n") if line.strip()]
-                            if not price:
-                                for line in lines:
-                                    if "₹" in line:
-                                        price = line
-                                        break
-                            if not quantity:
-                                for line in lines:
-                                    low = line.lower()
-                                    if any(unit in low for unit in ["kg", "g", "ml", "l", "pcs", "pack"]):
-                                        quantity = line
-                                        break
-                            if not name and lines:
-                                candidate_lines = [line for line in lines if line.upper() != "ADD" and "₹" not in line]
-                                if candidate_lines:
-                                    name = max(candidate_lines, key=len)
-                                else:
-                                    name = lines[0]
-
-                        if not price:
-                            # Skip placeholders/skeleton cards without price
-                            continue
-                        if name.strip().upper() == "ADD":
-                            continue
-
-                        row: dict[str, Any] = {
-                            "search_term": item,
-                            "product_name": name,
-                            "price": price,
-                            "quantity": quantity,
-                            "platform": "Blinkit",
-                            "location": "",
-                            "url": href,
-                            "raw_text": raw_text,
-                        }
-                        scraped_results.append(row)
-                        term_results.append(row)
-                        print(f"      + Scraped: {name or 'Unknown'}")
-                        count += 1
-                    except Exception:
-                        continue
-
-                if term_results:
-                    save_to_mongo(term_results, collection_name=f"blinkit_{item}")
+                term_results = scrape_term(driver, item)
+                resource_blocking.collect(driver)
+                scraped_results.extend(term_results)
+                save_term_results(item, term_results)
 
             except TimeoutException:
                 print(f" Timed out waiting for results for {item}. Taking a screenshot...")
+                scrape_events.emit("error", term=item, error="timed out waiting for results")
                 driver.save_screenshot(f"blinkit_timeout_{item}.png")
             except Exception as e:
                 print(f" Error while scraping {item}: {e}")
+                scrape_events.emit("error", term=item, error=str(e))
                 driver.save_screenshot(f"blinkit_error_{item}.png")
 
     finally:
@@ -370,30 +532,12 @@ def scrape_blinkit():
             pass
 
         if scraped_results:
-            def _clean(rows: List[dict[str, Any]]) -> List[dict[str, Any]]:
-                for r in rows:
-                    if '_id' in r and not isinstance(r['_id'], str):
-                        try:
-                            r['_id'] = str(r['_id'])
-                        except Exception:
-                            r['_id'] = None
-                return rows
-
-            existing: List[dict[str, Any]] = []
-            if os.path.exists(OUTPUT_FILE):
-                try:
-                    with open(OUTPUT_FILE, "r", encoding="utf-8") as f:
-                        existing = json.load(f) or []
-                except Exception:
-                    existing = []
-
-            combined: List[dict[str, Any]] = _clean(existing) + _clean(scraped_results)
-            with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-                json.dump(combined, f, indent=4, ensure_ascii=False)
-            print(f"\n Data appended; total records now {len(combined)} in {OUTPUT_FILE}")
+            append_output(scraped_results)
         else:
             print("\n No data captured. Check screenshots for UI changes.")
 
+        page_waits.print_report()
+        resource_blocking.print_report()
         print("\n Blinkit session ended.")
 
 if __name__ == "__main__":
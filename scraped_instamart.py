@@ -1,6 +1,7 @@
 import sys
 import io
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+if __name__ == "__main__":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
@@ -9,12 +10,21 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 import time
-import json
 import os
 from urllib.parse import quote
 from typing import TYPE_CHECKING
 
+import batch_extract
+import html_extract
+import jsonl_store
+import locations
 import mongo_client
+import network_capture
+import page_waits
+import resource_blocking
+import scrape_events
+import scrape_jobs
+import session_snapshots
 
 if TYPE_CHECKING:
     from pymongo import MongoClient  # pragma: no cover
@@ -50,20 +60,23 @@ def load_search_terms():
     return []
 
 PRODUCTS_TO_SEARCH = load_search_terms()
-INSTAMART_DB = os.getenv("INSTAMART_DB", "snapit_instamart")
-INSTAMART_URI = os.getenv("INSTAMART_MONGO_URI", os.getenv("MONGO_URI", "mongodb://localhost:27017"))
 OUTPUT_FILE = os.getenv("OUTPUT_FILE", "scraped_instamart.json")
+MAX_RESULTS = int(os.getenv("INSTAMART_MAX_RESULTS", "5"))
 DEFAULT_LAT = float(os.getenv("INSTAMART_LAT", "12.9716"))
 DEFAULT_LNG = float(os.getenv("INSTAMART_LNG", "77.5946"))
 DEFAULT_LAT = os.getenv("INSTAMART_LAT", "12.9716")
 DEFAULT_LNG = os.getenv("INSTAMART_LNG", "77.5946")
+# Override to point the scraper at a local stand-in (see fixture_server.py)
+BASE_URL = os.getenv("INSTAMART_BASE_URL", "https://www.swiggy.com").rstrip("/")
 
 
-def scrape_instamart():
-    if not PRODUCTS_TO_SEARCH:
-        print(" No search terms provided. Exiting without running browser.")
-        return
+PLATFORM = "instamart"
+DEFAULT_PIN = os.getenv("INSTAMART_PIN", "560001")
+CARD_XPATH = "//div[contains(@data-testid,'item-card') or contains(@data-testid,'product-card') or contains(@class,'itemCard') or contains(@class,'product-card') or contains(@class,'_1ds9T')] | //a[contains(@href,'instamart')]"
+
 
+def create_driver(location=None):
+    """Launch Chrome with geolocation allowed (at `location` if given), retrying without the version pin if needed."""
     options = uc.ChromeOptions()
     options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
     options.add_argument('--disable-gpu')
@@ -75,6 +88,9 @@ def scrape_instamart():
     })
     if os.getenv("HEADLESS", "1") != "0":
         options.add_argument('--headless=new')
+    if batch_extract.network_mode_enabled():
+        network_capture.enable_performance_logging(options)
+    resource_blocking.enable_reporting(options, PLATFORM)
 
     driver = None
     try:
@@ -89,192 +105,329 @@ def scrape_instamart():
             print("DRIVER_INIT_FAILED final", e2)
             import traceback
             traceback.print_exc()
-            return
-
-    wait = WebDriverWait(driver, 25)
+            return None
 
+    resource_blocking.apply(driver, PLATFORM)
     # Allow geolocation (fake) to reduce location prompts
+    lat, lng = locations.coords(location, DEFAULT_LAT, DEFAULT_LNG)
+    locations.set_geolocation(driver, lat, lng)
+    return driver
+
+
+def set_location(driver, pin: str = DEFAULT_PIN):
+    """Attempt to set a deliverable Bangalore pin for Instamart (True once a suggestion or confirm was clicked)."""
+    wait = WebDriverWait(driver, 25)
     try:
-        driver.execute_cdp_cmd("Emulation.setGeolocationOverride", {
-            "latitude": DEFAULT_LAT,
-            "longitude": DEFAULT_LNG,
-            "accuracy": 50
-        })
-    except Exception:
-        pass
-    scraped_results = []
+        # Try to click a location trigger if present
+        triggers = driver.find_elements(By.XPATH, "//button[contains(.,'Deliver') or contains(.,'Change') or contains(.,'Location') or contains(.,'Add address')]")
+        for trig in triggers:
+            try:
+                driver.execute_script("arguments[0].click();", trig)
+                time.sleep(0.4)
+                break
+            except Exception:
+                continue
+
+        input_xpath = (
+            "//input[contains(@placeholder,'location') or contains(@placeholder,'address') or"
+            " contains(@aria-label,'location') or contains(@aria-label,'address') or"
+            " contains(@name,'location') or contains(@name,'address')]"
+        )
+        loc_input = wait.until(EC.element_to_be_clickable((By.XPATH, input_xpath)))
+        driver.execute_script("arguments[0].click();", loc_input)
+        time.sleep(0.3)
+        loc_input.send_keys(Keys.CONTROL + "a")
+        loc_input.send_keys(Keys.BACKSPACE)
+        loc_input.send_keys(pin)
+        time.sleep(1.2)
+
+        suggestions = driver.find_elements(By.XPATH, "//li|//div[contains(@class,'suggestion') or contains(@data-testid,'suggestion')]")
+        applied = False
+        if suggestions:
+            driver.execute_script("arguments[0].click();", suggestions[0])
+            time.sleep(1.0)
+            applied = True
+        else:
+            loc_input.send_keys(Keys.ENTER)
+            time.sleep(1.0)
+
+        buttons = driver.find_elements(By.XPATH, "//button[contains(.,'Deliver') or contains(.,'Continue') or contains(.,'Save') or contains(.,'Confirm')]")
+        for btn in buttons:
+            try:
+                driver.execute_script("arguments[0].click();", btn)
+                time.sleep(0.8)
+                applied = True
+                break
+            except Exception:
+                continue
+
+        if not applied:
+            # Nothing was picked or confirmed, so there is no location worth snapshotting
+            print(f" No location suggestion or confirm button for pin {pin}")
+            return False
+        print(f" Location set attempt done for pin {pin}")
+        return True
+    except Exception as e:
+        print(f" Location set skipped/failed: {e}")
+        return False
 
-    def set_location(pin: str = "560001"):
-        """Attempt to set a deliverable Bangalore pin for Instamart."""
-        try:
-            # Try to click a location trigger if present
-            triggers = driver.find_elements(By.XPATH, "//button[contains(.,'Deliver') or contains(.,'Change') or contains(.,'Location') or contains(.,'Add address')]")
-            for trig in triggers:
-                try:
-                    driver.execute_script("arguments[0].click();", trig)
-                    time.sleep(0.4)
-                    break
-                except Exception:
-                    continue
-
-            input_xpath = (
-                "//input[contains(@placeholder,'location') or contains(@placeholder,'address') or"
-                " contains(@aria-label,'location') or contains(@aria-label,'address') or"
-                " contains(@name,'location') or contains(@name,'address')]"
-            )
-            loc_input = wait.until(EC.element_to_be_clickable((By.XPATH, input_xpath)))
-            driver.execute_script("arguments[0].click();", loc_input)
-            time.sleep(0.3)
-            loc_input.send_keys(Keys.CONTROL + "a")
-            loc_input.send_keys(Keys.BACKSPACE)
-            loc_input.send_keys(pin)
-            time.sleep(1.2)
-
-            suggestions = driver.find_elements(By.XPATH, "//li|//div[contains(@class,'suggestion') or contains(@data-testid,'suggestion')]")
-            if suggestions:
-                driver.execute_script("arguments[0].click();", suggestions[0])
-                time.sleep(1.0)
-            else:
-                loc_input.send_keys(Keys.ENTER)
-                time.sleep(1.0)
-
-            buttons = driver.find_elements(By.XPATH, "//button[contains(.,'Deliver') or contains(.,'Continue') or contains(.,'Save') or contains(.,'Confirm')]")
-            for btn in buttons:
-                try:
-                    driver.execute_script("arguments[0].click();", btn)
-                    time.sleep(0.8)
-                    break
-                except Exception:
-                    continue
-
-            print(f" Location set attempt done for pin {pin}")
-        except Exception as e:
-            print(f" Location set skipped/failed: {e}")
 
-    def open_search(term: str):
-        url = f"https://www.swiggy.com/instamart/search?query={quote(term)}&lat={DEFAULT_LAT}&lng={DEFAULT_LNG}"
-        driver.get(url)
-        print(f" Opened Instamart search URL: {url}")
+def search_url(term: str, location_text: str = "") -> str:
+    lat, lng = locations.coords(locations.find(location_text, PLATFORM), DEFAULT_LAT, DEFAULT_LNG)
+    return f"{BASE_URL}/instamart/search?query={quote(term)}&lat={lat}&lng={lng}"
+
 
-    def save_to_mongo(records, collection_name: str):
-        if not records:
-            return
+def open_search(driver, term: str, location_text: str = ""):
+    url = search_url(term, location_text)
+    driver.get(url)
+    print(f" Opened Instamart search URL: {url}")
+
+
+def prepare_session(driver, location=None):
+    """Open the Instamart homepage and set the delivery pin once per session."""
+    label = location.label if location is not None else ""
+    lat, lng = locations.coords(location, DEFAULT_LAT, DEFAULT_LNG)
+    driver.get(f"{BASE_URL}/instamart?lat={lat}&lng={lng}")
+    restored = session_snapshots.restore(driver, PLATFORM, label)
+    print(" Instamart opened. Waiting for page to stabilize...")
+    page_waits.settle(driver, "instamart home", 8)
+    if restored:
+        print(" Saved Instamart location restored; skipping location setup.")
+        return
+    if set_location(driver, location.pin if location is not None and location.pin else DEFAULT_PIN):
+        session_snapshots.save(driver, PLATFORM, label)
+
+
+def scrape_term(driver, item: str, location_text: str = "Bangalore"):
+    """Search one term (with one refresh-and-relocate retry) and return its rows."""
+    if batch_extract.network_mode_enabled():
+        print(f"Searching for: {item} (network capture)")
+        network_rows = network_capture.scrape_via_network(
+            driver, PLATFORM, search_url(item, location_text), item, location_text, BASE_URL, MAX_RESULTS
+        )
+        if network_rows:
+            return network_rows
+        print("   No search API response captured, falling back to the DOM.")
+    pin = locations.pin_for(location_text, DEFAULT_PIN, PLATFORM)
+    snapshot_label = session_snapshots.label_for(location_text, PLATFORM)
+    term_results = []
+    attempt = 0
+    while attempt < 2:
+        try:
+            print(f"Searching for: {item} (attempt {attempt+1})")
+            open_search(driver, item, location_text)
+            page_waits.settle(driver, "instamart results", 6, CARD_XPATH)
+            term_results = extract_current_page(driver, item, location_text)
+            break
+
+        except TimeoutException:
+            print(f" Timed out waiting for results for {item} (attempt {attempt+1}). Taking a screenshot...")
+            driver.save_screenshot(f"instamart_timeout_{item}_a{attempt+1}.png")
+            attempt += 1
+            if attempt < 2:
+                driver.refresh()
+                page_waits.settle(driver, "instamart refresh", 3)
+                # The saved location may be what went wrong; set it again and re-save
+                if set_location(driver, pin):
+                    session_snapshots.save(driver, PLATFORM, snapshot_label)
+                continue
+        except Exception as e:
+            print(f" Error while scraping {item} (attempt {attempt+1}): {e}")
+            driver.save_screenshot(f"instamart_error_{item}_a{attempt+1}.png")
+            attempt += 1
+            if attempt < 2:
+                driver.refresh()
+                page_waits.settle(driver, "instamart refresh", 3)
+                # The saved location may be what went wrong; set it again and re-save
+                if set_location(driver, pin):
+                    session_snapshots.save(driver, PLATFORM, snapshot_label)
+                continue
+    return term_results
+
+
+def extract_current_page(driver, item: str, location_text: str = "Bangalore"):
+    """Extract rows from a search page that is already open in the current tab."""
+    wait = WebDriverWait(driver, 25)
+    term_results = []
+    cards = wait.until(
+        EC.presence_of_all_elements_located(
+            (By.XPATH, CARD_XPATH)
+        )
+    )
+    print(f"   -> Found {len(cards)} result cards for {item}")
+    scrape_jobs.progress(cards=len(cards))
+
+    if batch_extract.html_mode_enabled():
+        try:
+            term_results = html_extract.parse_html(driver.page_source, PLATFORM, item, location_text)[:MAX_RESULTS]
+        except Exception as e:
+            print(f"   Page-source parsing failed, reading cards one by one: {e}")
+            term_results = []
+        for row in term_results:
+            print(f"      + Scraped: {row['product_name'] or 'Unknown'}")
+            scrape_jobs.emit_row(row)
+    elif batch_extract.batch_mode_enabled():
         try:
-            inserted = mongo_client.save_records(records, collection_name=collection_name, db_name=INSTAMART_DB, uri=INSTAMART_URI)
-            print(f" Saved {inserted} records to MongoDB collection '{collection_name}' in db '{INSTAMART_DB}'.")
+            term_results = rows_from_batch(driver, item, location_text)
         except Exception as e:
-            print(f" MongoDB save failed for {collection_name}: {e}")
+            print(f"   Batch extraction failed, reading cards one by one: {e}")
+            term_results = []
+    if not term_results:
+        term_results = rows_from_elements(cards, item, location_text)
+    return term_results
+
+
+def rows_from_batch(driver, item: str, location_text: str = "Bangalore"):
+    """Build rows from one injected extraction call instead of per-card round trips."""
+    cards = batch_extract.extract_cards(driver, CARD_XPATH, name_selector="h3, h4, p")
+    term_results = []
+    for card in cards[:MAX_RESULTS]:
+        raw_text = batch_extract.card_text(card, "text")
+        name, price, quantity = batch_extract.fill_from_raw_text(
+            raw_text,
+            batch_extract.card_text(card, "name"),
+            batch_extract.card_text(card, "price"),
+            batch_extract.card_text(card, "quantity"),
+        )
+        term_results.append({
+            "search_term": item,
+            "product_name": name,
+            "price": price,
+            "quantity": quantity,
+            "platform": "Instamart",
+            "location": location_text,
+            "url": None,
+            "raw_text": raw_text,
+        })
+        print(f"      + Scraped: {name or 'Unknown'}")
+        scrape_jobs.emit_row(term_results[-1])
+    return term_results
+
+
+def rows_from_elements(cards, item: str, location_text: str = "Bangalore"):
+    """Per-card WebDriver reads; used when EXTRACT_MODE=dom or the batch script fails."""
+    term_results = []
+    count = 0
+    for card in cards:
+        if count >= MAX_RESULTS:
+            break
+        try:
+            name = ""
+            price = ""
+            quantity = ""
+            raw_text = card.text.strip()
+            href = None
+
+            try:
+                name_el = card.find_element(By.XPATH, ".//*[self::h3 or self::h4 or self::p][1]")
+                name = name_el.text.strip()
+            except Exception:
+                pass
+            try:
+                price_el = card.find_element(By.XPATH, ".//*[contains(text(),'₹')]")
+                price = price_el.text.strip()
+            except Exception:
+                pass
+            try:
+                qty_el = card.find_element(By.XPATH, ".//*[contains(text(),'g') or contains(text(),'kg') or contains(text(),'ml') or contains(text(),'l') or contains(text(),'pcs') or contains(text(),'pack')]")
+                quantity = qty_el.text.strip()
+            except Exception:
+                pass
+
+            if raw_text:
+                lines = [line.strip() for line in raw_text.split("\n") if line.strip()]
+                if not price:
+                    for line in lines:
+                        if "₹" in line:
+                            price = line
+                            break
+                if not quantity:
+                    for line in lines:
+                        low = line.lower()
+                        if any(unit in low for unit in ["kg", "g", "ml", "l", "pcs", "pack"]):
+                            quantity = line
+                            break
+                if not name and lines:
+                    candidate_lines = [line for line in lines if line.upper() != "ADD" and "₹" not in line]
+                    if candidate_lines:
+                        name = max(candidate_lines, key=len)
+                    else:
+                        name = lines[0]
+
+            row = {
+                "search_term": item,
+                "product_name": name,
+                "price": price,
+                "quantity": quantity,
+                "platform": "Instamart",
+                "location": location_text,
+                "url": href,
+                "raw_text": raw_text,
+            }
+            term_results.append(row)
+            print(f"      + Scraped: {name or 'Unknown'}")
+            scrape_jobs.emit_row(row)
+            count += 1
+        except Exception:
+            continue
+    return term_results
+
+
+def save_to_mongo(records):
+    if not records:
+        return
+    try:
+        queued = mongo_client.ingest_products(records, PLATFORM)
+        print(f" Queued {queued} records for {mongo_client.product_store().label()}.")
+    except Exception as e:
+        print(f" Product save failed: {e}")
+
+
+def save_term_results(item: str, records):
+    if scrape_events.enabled():
+        scrape_events.emit("term", term=item, rows=list(records))
+        return
+    if records:
+        save_to_mongo(records)
+
+
+def append_output(scraped_results):
+    """Append a run's rows to the JSONL fallback store (see jsonl_store.py)."""
+    if scrape_events.enabled():
+        return  # the parent server already received them as `term` events
+    if not mongo_client.jsonl_fallback_enabled():
+        return  # STORAGE_BACKEND=sqlite: rows are already in the local store
+    store = jsonl_store.open_store(OUTPUT_FILE)
+    written = store.append(scraped_results)
+    print(f"\n Data appended; {written} records added to {os.path.basename(store.base)}.*.jsonl")
+
+
+def scrape_instamart():
+    if not PRODUCTS_TO_SEARCH:
+        print(" No search terms provided. Exiting without running browser.")
+        return
+
+    import parallel_scrape
+    if parallel_scrape.concurrency_requested(PLATFORM):
+        parallel_scrape.run(PLATFORM, PRODUCTS_TO_SEARCH)
+        return
+
+    driver = create_driver()
+    if driver is None:
+        scrape_events.emit("error", error="browser could not be started")
+        return
+    scraped_results = []
 
     try:
-        driver.get(f"https://www.swiggy.com/instamart?lat={DEFAULT_LAT}&lng={DEFAULT_LNG}")
-        print(" Instamart opened. Waiting for page to stabilize...")
-        time.sleep(8)
-        set_location("560001")
+        prepare_session(driver)
 
         print(f"🔍 Search terms this run: {PRODUCTS_TO_SEARCH}")
 
         for item in PRODUCTS_TO_SEARCH:
-            term_results = []
-            attempt = 0
-            while attempt < 2:
-                try:
-                    print(f"Searching for: {item} (attempt {attempt+1})")
-                    open_search(item)
-                    time.sleep(6)
-
-                    cards = wait.until(
-                        EC.presence_of_all_elements_located(
-                            (By.XPATH, "//div[contains(@data-testid,'item-card') or contains(@data-testid,'product-card') or contains(@class,'itemCard') or contains(@class,'product-card') or contains(@class,'_1ds9T')] | //a[contains(@href,'instamart')]")
-                        )
-                    )
-                    print(f"   -> Found {len(cards)} result cards for {item}")
-
-                    count = 0
-                    for card in cards:
-                        if count >= 5:
-                            break
-                        try:
-                            name = ""
-                            price = ""
-                            quantity = ""
-                            raw_text = card.text.strip()
-                            href = None
-
-                            try:
-                                name_el = card.find_element(By.XPATH, ".//*[self::h3 or self::h4 or self::p][1]")
-                                name = name_el.text.strip()
-                            except Exception:
-                                pass
-                            try:
-                                price_el = card.find_element(By.XPATH, ".//*[contains(text(),'₹')]")
-                                price = price_el.text.strip()
-                            except Exception:
-                                pass
-                            try:
-                                qty_el = card.find_element(By.XPATH, ".//*[contains(text(),'g') or contains(text(),'kg') or contains(text(),'ml') or contains(text(),'l') or contains(text(),'pcs') or contains(text(),'pack')]")
-                                quantity = qty_el.text.strip()
-                            except Exception:
-                                pass
-
-                            if raw_text:
-                                lines = [line.strip() for line in raw_text.split("\n") if line.strip()]
-                                if not price:
-                                    for line in lines:
-                                        if "₹" in line:
-                                            price = line
-                                            break
-                                if not quantity:
-                                    for line in lines:
-                                        low = line.lower()
-                                        if any(unit in low for unit in ["kg", "g", "ml", "l", "pcs", "pack"]):
-                                            quantity = line
-                                            break
-                                if not name and lines:
-                                    candidate_lines = [line for line in lines if line.upper() != "ADD" and "₹" not in line]
-                                    if candidate_lines:
-                                        name = max(candidate_lines, key=len)
-                                    else:
-                                        name = lines[0]
-
-                            row = {
-                                "search_term": item,
-                                "product_name": name,
-                                "price": price,
-                                "quantity": quantity,
-                                "platform": "Instamart",
-                                "location": "Bangalore",
-                                "url": href,
-                                "raw_text": raw_text,
-                            }
-                            scraped_results.append(row)
-                            term_results.append(row)
-                            print(f"      + Scraped: {name or 'Unknown'}")
-                            count += 1
-                        except Exception:
-                            continue
-
-                    if term_results:
-                        save_to_mongo(term_results, collection_name=f"instamart_{item}")
-                    break
-
-                except TimeoutException:
-                    print(f" Timed out waiting for results for {item} (attempt {attempt+1}). Taking a screenshot...")
-                    driver.save_screenshot(f"instamart_timeout_{item}_a{attempt+1}.png")
-                    attempt += 1
-                    if attempt < 2:
-                        driver.refresh()
-                        time.sleep(3)
-                        set_location("560001")
-                        continue
-                except Exception as e:
-                    print(f" Error while scraping {item} (attempt {attempt+1}): {e}")
-                    driver.save_screenshot(f"instamart_error_{item}_a{attempt+1}.png")
-                    attempt += 1
-                    if attempt < 2:
-                        driver.refresh()
-                        time.sleep(3)
-                        set_location("560001")
-                        continue
+            term_results = scrape_term(driver, item)
+            resource_blocking.collect(driver)
+            scraped_results.extend(term_results)
+            save_term_results(item, term_results)
 
             if not term_results:
                 print(f"   -> No Instamart results saved for {item}")
@@ -286,21 +439,12 @@ def scrape_instamart():
             pass
 
         if scraped_results:
-            existing = []
-            if os.path.exists(OUTPUT_FILE):
-                try:
-                    with open(OUTPUT_FILE, "r", encoding="utf-8") as f:
-                        existing = json.load(f) or []
-                except Exception:
-                    existing = []
-
-            combined = existing + scraped_results
-            with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-                json.dump(combined, f, indent=4, ensure_ascii=False)
-            print(f"\n Data appended; total records now {len(combined)} in {OUTPUT_FILE}")
+            append_output(scraped_results)
         else:
             print("\n No data captured. Check screenshots for UI changes.")
 
+        page_waits.print_report()
+        resource_blocking.print_report()
         print("\n Instamart session ended.")
 
 if __name__ == "__main__":
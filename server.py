@@ -1,13 +1,18 @@
 from flask import Flask, request, jsonify, Response
-import json
+import asyncio
 import os
-import subprocess
-import sys
 from datetime import datetime, timezone
 from werkzeug.security import generate_password_hash, check_password_hash
 from bson import ObjectId
+from pymongo import TEXT
+import browser_pool
+import jsonl_store
+import locations
 import mongo_client
-from typing import Any, Dict, Mapping, Optional, cast
+import query_stats
+import scrape_freshness
+import scrape_jobs
+from typing import Any, Dict, Mapping, Optional, Tuple, cast
 
 JsonDict = Dict[str, Any]
 SellerContact = Dict[str, Optional[str]]
@@ -18,9 +23,6 @@ def _now() -> datetime:
 
 app = Flask(__name__)
 
-ZEPTO_DB = os.getenv("ZEPTO_DB", "snapit_zepto")
-ZEPTO_URI = os.getenv("ZEPTO_MONGO_URI", os.getenv("MONGO_URI", "mongodb://localhost:27017"))
-INSTAMART_DB = os.getenv("INSTAMART_DB", "snapit_instamart")
 AUTH_DB = os.getenv("AUTH_DB", "snapit_auth")
 AUTH_COLLECTION = os.getenv("AUTH_COLLECTION", "users")
 SELLER_DB = os.getenv("SELLER_DB", "snapit_sellers")
@@ -31,6 +33,8 @@ SELLER_NOTICES_COLLECTION = os.getenv("SELLER_NOTICES_COLLECTION", "seller_notic
 SELLER_HISTORY_COLLECTION = os.getenv("SELLER_HISTORY_COLLECTION", "seller_history")
 
 LAST_TERM_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'last_search_term.txt')
+# Instamart's JSONL fallback store (written by scraped_instamart.py)
+INSTAMART_DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scraped_instamart.json')
 
 def _auth_collection(role: str = "customer"):
     target_db = SELLER_DB if "seller" in role else AUTH_DB
@@ -72,6 +76,31 @@ def _seller_collection(name: str):
     return col
 
 
+def _seller_name_keys(name: Any) -> JsonDict:
+    """Normalized name keys stored with seller products so /results/offline can use indexes."""
+    return {"name_norm": mongo_client.normalize_term(name), "name_tokens": mongo_client.name_tokens(name)}
+
+
+_seller_search_ready = False
+
+
+def _seller_products_collection():
+    global _seller_search_ready
+    col = _seller_collection(SELLER_PRODUCTS_COLLECTION)
+    if not _seller_search_ready:
+        try:
+            col.create_index("name_norm")
+            col.create_index("name_tokens")
+            col.create_index([("name", TEXT)], name="name_text")
+            # Products saved before the normalized keys existed
+            for doc in col.find({"name_norm": {"$exists": False}}, {"name": 1}):
+                col.update_one({"_id": doc["_id"]}, {"$set": _seller_name_keys(doc.get("name"))})
+            _seller_search_ready = True
+        except Exception:
+            pass
+    return col
+
+
 def _seller_history_collection():
     col = mongo_client.get_collection(SELLER_HISTORY_COLLECTION, db_name=SELLER_DB)
     try:
@@ -117,6 +146,59 @@ def _parse_object_id(value: Optional[str]):
     except Exception:
         return None
 
+def _remember_last_term(term: str) -> None:
+    # Persist last searched term so the UI can fetch latest without retyping.
+    try:
+        with open(LAST_TERM_FILE, 'w', encoding='utf-8') as fh:
+            fh.write(term)
+    except Exception:
+        pass
+
+
+def _submit_scrape(
+    platform: str,
+    term: str,
+    script: str,
+    data: JsonDict,
+    env_overrides: Optional[Dict[str, str]] = None,
+) -> Tuple[Optional[scrape_jobs.Job], JsonDict, int]:
+    """Answer from fresh stored data, or queue (or join) a scrape job.
+
+    Returns (job, body, status); job is None when the body is the final answer.
+    """
+    try:
+        where = locations.select(locations.split_names(data.get('locations')), platform)
+    except ValueError as e:
+        return None, {"error": str(e), "term": term}, 400
+    if not scrape_freshness.force_requested(data, request.args):
+        fresh = scrape_freshness.lookup(platform, term, where)
+        if fresh:
+            _remember_last_term(term)
+            return None, scrape_freshness.cached_body(platform, term, fresh), 200
+
+    runner = scrape_jobs.make_scrape_runner(
+        platform,
+        term,
+        where,
+        script,
+        os.path.dirname(os.path.abspath(__file__)),
+        env_overrides=env_overrides,
+        on_success=lambda: _remember_last_term(term),
+    )
+    try:
+        job, created = scrape_jobs.get_queue().submit_once(
+            scrape_jobs.scrape_key(platform, term, where), platform, term, runner
+        )
+    except scrape_jobs.JobQueueFull as e:
+        return None, {"error": str(e), "term": term}, 503
+    return job, scrape_jobs.accepted_body(job, created), 202
+
+
+def _submit_platform_scrape(platform: str, term: str, data: JsonDict) -> Tuple[Optional[scrape_jobs.Job], JsonDict, int]:
+    if platform == "instamart":
+        return _submit_scrape("instamart", term, 'scraped_instamart.py', data)
+    return _submit_scrape("zepto", term, 'scraped.py', data)
+
 # Simple CORS allow-all for local dev
 @app.after_request
 def add_cors_headers(resp: Response) -> Response:
@@ -131,43 +213,43 @@ def scrape():
     term = (data.get('product') or '').strip()
     if not term:
         return jsonify({"error": "product is required"}), 400
+    _, body, status = _submit_platform_scrape("zepto", term, data)
+    return jsonify(body), status
 
-    env = os.environ.copy()
-    env['SEARCH_TERMS'] = term
-    env['ZEPTO_DB'] = ZEPTO_DB
-    env['ZEPTO_MONGO_URI'] = ZEPTO_URI
 
-    try:
-        result = subprocess.run(
-            [sys.executable, 'scraped.py'],
-            cwd=os.path.dirname(os.path.abspath(__file__)),
-            env=env,
-            capture_output=True,
-            text=True,
-            timeout=120,
-            errors='ignore',
-        )
-        resp: JsonDict = {
-            "status": "ok" if result.returncode == 0 else "error",
-            "returncode": result.returncode,
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "stderr_tail": result.stderr.splitlines()[-10:] if result.stderr else [],
-            "output_file": env.get('OUTPUT_FILE', 'scraped_data.json'),
-            "term": term,
-        }
-
-        # Persist last searched term so the UI can fetch latest without retyping.
-        try:
-            with open(LAST_TERM_FILE, 'w', encoding='utf-8') as fh:
-                fh.write(term)
-        except Exception:
-            pass
-        return jsonify(resp), (200 if result.returncode == 0 else 500)
-    except subprocess.TimeoutExpired:
-        return jsonify({"error": "scrape timed out"}), 504
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+@app.route('/scrape/stream', methods=['GET'])
+def scrape_stream() -> Response:
+    """Server-Sent Events: one `row` event per scraped card, then `done` (or `cached` / `failed`).
+
+    Query: term=..., optional platform=zepto|instamart, locations=a,b and force=1.
+    """
+    term = (request.args.get('term') or '').strip()
+    platform = (request.args.get('platform') or 'zepto').strip().lower()
+    if not term:
+        job, body, status = None, {"error": "term is required"}, 400
+    elif platform not in ("zepto", "instamart"):
+        job, body, status = None, {"error": f"unknown platform {platform!r}"}, 400
+    else:
+        job, body, status = _submit_platform_scrape(platform, term, {"locations": request.args.get('locations')})
+    events = scrape_jobs.sse_final(body, status) if job is None else scrape_jobs.sse_events(job, not body["coalesced"])
+    return Response(events, mimetype='text/event-stream', headers=scrape_jobs.SSE_HEADERS)
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id: str):
+    job = scrape_jobs.get_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+
+@app.route('/stats/queries', methods=['GET'])
+def query_stats_report():
+    """Mongo cost per query shape in this process (QUERY_STATS=1); `reset=1` clears it after reading."""
+    report = query_stats.report()
+    if request.args.get('reset') == '1':
+        query_stats.reset()
+    return jsonify(report), 200
 
 
 @app.route('/auth/signup', methods=['POST'])
@@ -256,8 +338,9 @@ def seller_products_create():
         "status": status or "Live",
         "created_at": _now(),
         "updated_at": _now(),
+        **_seller_name_keys(name),
     }
-    col = _seller_collection(SELLER_PRODUCTS_COLLECTION)
+    col = _seller_products_collection()
     result = col.insert_one(doc)
     doc['_id'] = str(result.inserted_id)
     doc['seller_id'] = str(seller_oid)
@@ -474,8 +557,10 @@ def seller_products_update(product_id: str):
     if not updates:
         return jsonify({"error": "no fields to update"}), 400
     updates["updated_at"] = _now()
+    if "name" in updates:
+        updates.update(_seller_name_keys(updates["name"]))
 
-    col = _seller_collection(SELLER_PRODUCTS_COLLECTION)
+    col = _seller_products_collection()
     result = col.update_one({"_id": product_oid, "seller_id": seller_oid}, {"$set": updates})
     if result.matched_count == 0:
         return jsonify({"error": "not found"}), 404
@@ -489,210 +574,228 @@ def scrape_instamart():
     term = (data.get('product') or '').strip()
     if not term:
         return jsonify({"error": "product is required"}), 400
+    _, body, status = _submit_platform_scrape("instamart", term, data)
+    return jsonify(body), status
 
-    env = os.environ.copy()
-    env['SEARCH_TERMS'] = term
-
-    try:
-        result = subprocess.run(
-            [sys.executable, 'scraped_instamart.py'],
-            cwd=os.path.dirname(os.path.abspath(__file__)),
-            env=env,
-            capture_output=True,
-            text=True,
-            timeout=120,
-            errors='ignore',
-        )
-        resp: JsonDict = {
-            "status": "ok" if result.returncode == 0 else "error",
-            "returncode": result.returncode,
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "stderr_tail": result.stderr.splitlines()[-10:] if result.stderr else [],
-            "output_file": env.get('OUTPUT_FILE', 'scraped_data.json'),
-            "term": term,
-        }
 
+def _read_last_term() -> Optional[str]:
+    if os.path.exists(LAST_TERM_FILE):
         try:
-            with open(LAST_TERM_FILE, 'w', encoding='utf-8') as fh:
-                fh.write(term)
+            with open(LAST_TERM_FILE, 'r', encoding='utf-8') as fh:
+                return fh.read().strip() or None
         except Exception:
             pass
-        return jsonify(resp), (200 if result.returncode == 0 else 500)
-    except subprocess.TimeoutExpired:
-        return jsonify({"error": "scrape timed out"}), 504
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    return None
+
+
+# Most precise first; /results reports the best step any platform needed
+MATCH_ORDER = ("exact", "prefix", "tokens", "text", "jsonl", "none")
+
+
+async def _platform_results(
+    term: str, platform: str, location: Optional[str], projection: Optional[JsonDict] = None
+) -> Tuple[list, str]:
+    """One platform's rows; Instamart's JSONL fallback is read alongside Mongo, not after it."""
+    reads: list = [mongo_client.search_products_async(term, platforms=[platform], location=location, projection=projection)]
+    if platform == "instamart" and mongo_client.jsonl_fallback_enabled():
+        store = jsonl_store.open_store(INSTAMART_DATA_FILE)
+        reads.append(mongo_client.run_async(store.rows_for_term, term, platform_prefix='insta'))
+    found = await asyncio.gather(*reads, return_exceptions=True)
+    stored, fallback = found[0], found[1] if len(found) > 1 else []
+    if not isinstance(stored, BaseException) and stored[0]:
+        return stored
+    # Fallback to the JSONL store if Mongo is empty or unreachable.
+    if fallback and not isinstance(fallback, BaseException):
+        return [mongo_client.apply_projection(row, projection) for row in fallback], "jsonl"
+    if isinstance(stored, BaseException):
+        raise stored
+    return stored
+
+
+def _offline_item(doc: JsonDict, search_term: str, projection: Optional[JsonDict]) -> JsonDict:
+    """A seller product as a results row; the computed fields honour `fields=` too."""
+    if '_id' in doc:
+        doc['_id'] = str(doc['_id'])
+    if 'seller_id' in doc:
+        doc['seller_id'] = str(doc['seller_id'])
+    if mongo_client.wants_field(projection, 'platform'):
+        doc['platform'] = doc.get('platform') or 'Offline Store'
+    if mongo_client.wants_field(projection, 'search_term'):
+        doc['search_term'] = search_term
+    return doc
+
+
+def _search_offline(term: str, projection: Optional[JsonDict] = None) -> Tuple[list, str]:
+    col = _seller_products_collection()
+    docs, match = mongo_client.indexed_search(col, "name_norm", term, {}, "_id", projection=projection)
+    return [_offline_item(doc, term, projection) for doc in docs], match
 
 
 @app.route('/results', methods=['GET'])
-def results():
+async def results():
+    """Rows for a term; `platform=zepto,blinkit,instamart` (or `all`) and `offline=1` read every source concurrently.
+
+    `fields=product_name,price,...` returns just those fields, `fields=all` whole documents;
+    by default everything but mongo_client.HEAVY_FIELDS (raw_text and the search keys).
+    """
     term = (request.args.get('term') or '').strip()
     if not term:
         return jsonify({"error": "term is required"}), 400
-
+    raw_platforms = (request.args.get('platform') or 'zepto').strip().lower()
+    platforms = list(mongo_client.PLATFORMS) if raw_platforms == 'all' else [p.strip() for p in raw_platforms.split(',') if p.strip()]
+    unknown = [p for p in platforms if p not in mongo_client.PLATFORMS]
+    if unknown:
+        return jsonify({"error": f"unknown platform(s): {', '.join(unknown)}"}), 400
     try:
-        col = mongo_client.get_collection(term, db_name=ZEPTO_DB, uri=ZEPTO_URI)
-        mongo_client.ensure_indexes(col, term, db_name=ZEPTO_DB, uri=ZEPTO_URI)
-
-        # Use case-insensitive partial match within the term-specific collection.
-        regex = {"$regex": term, "$options": "i"}
-        cursor = col.find({"search_term": regex}).sort("_id", -1).limit(100)
-
-        items: list[JsonDict] = []
-        for doc in cursor:
-            doc['_id'] = str(doc.get('_id'))
-            items.append(doc)
+        projection = mongo_client.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    location = request.args.get('location') or None
+    sources = list(platforms)
+    reads = [_platform_results(term, platform, location, projection) for platform in platforms]
+    if request.args.get('offline') == '1':
+        sources.append('offline')
+        reads.append(mongo_client.run_async(_search_offline, term, projection))
 
-        return jsonify({"items": items}), 200
+    try:
+        found = await asyncio.gather(*reads)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    items = [item for rows, _ in found for item in rows]
+    matches = {source: match for source, (_, match) in zip(sources, found)}
+    match = min(matches.values(), key=lambda mode: MATCH_ORDER.index(mode) if mode in MATCH_ORDER else len(MATCH_ORDER))
+    return jsonify({"items": items, "match": match, "matches": matches}), 200
 
 
 @app.route('/results/instamart', methods=['GET'])
-def results_instamart():
+async def results_instamart():
     term = (request.args.get('term') or '').strip()
     if not term:
         return jsonify({"error": "term is required"}), 400
-
     try:
-        collection_name = term
-        col = mongo_client.get_collection(collection_name, db_name=INSTAMART_DB)
-        mongo_client.ensure_indexes(col, collection_name, db_name=INSTAMART_DB)
-
-        regex = {"$regex": term, "$options": "i"}
-        cursor = col.find({"search_term": regex}).sort("_id", -1).limit(100)
+        projection = mongo_client.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        items: list[JsonDict] = []
-        for doc in cursor:
-            doc['_id'] = str(doc.get('_id'))
-            items.append(doc)
-
-        # Fallback to JSON if Mongo is empty or unreachable.
-        if not items:
-            data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scraped_data.json')
-            try:
-                if os.path.exists(data_path):
-                    with open(data_path, 'r', encoding='utf-8') as fh:
-                        data = cast(list[JsonDict], json.load(fh) or [])
-                    for row in data:
-                        if term.lower() in (row.get('search_term', '').lower()) and (row.get('platform') or '').lower().startswith('insta'):
-                            if '_id' in row and not isinstance(row['_id'], str):
-                                row['_id'] = str(row['_id'])
-                            items.append(row)
-            except Exception:
-                pass
-
-        return jsonify({"items": items}), 200
+    try:
+        items, match = await _platform_results(term, "instamart", None, projection)
+        return jsonify({"items": items, "match": match}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/latest', methods=['GET'])
-def latest():
-    """Return the most recent scraped items without needing a search term."""
+async def latest():
+    """Return the most recent scraped items without needing a search term (`fields=` as for /results)."""
     try:
-        # Attempt to read last term for UX context
-        last_term = None
-        if os.path.exists(LAST_TERM_FILE):
-            try:
-                with open(LAST_TERM_FILE, 'r', encoding='utf-8') as fh:
-                    last_term = fh.read().strip() or None
-            except Exception:
-                pass
-
-        # Decide which collection to read: last term if available, else default
-        col = mongo_client.get_collection(last_term, db_name=ZEPTO_DB, uri=ZEPTO_URI)
-        mongo_client.ensure_indexes(col, last_term, db_name=ZEPTO_DB, uri=ZEPTO_URI)
-
-        cursor = col.find().sort("_id", -1).limit(100)
-        items: list[JsonDict] = []
-        for doc in cursor:
-            doc['_id'] = str(doc.get('_id'))
-            items.append(doc)
-
+        projection = mongo_client.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        # Last searched term (if any) for UX context; without one, newest rows overall
+        last_term = await mongo_client.run_async(_read_last_term)
+        items = await mongo_client.find_products_async(last_term, platforms=["zepto"], projection=projection)
         return jsonify({"items": items, "last_term": last_term}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/latest/instamart', methods=['GET'])
-def latest_instamart():
+async def latest_instamart():
     """Return latest Instamart scraped items."""
     try:
-        last_term = None
-        if os.path.exists(LAST_TERM_FILE):
-            try:
-                with open(LAST_TERM_FILE, 'r', encoding='utf-8') as fh:
-                    last_term = fh.read().strip() or None
-            except Exception:
-                pass
-
-        collection_name = last_term
-        col = mongo_client.get_collection(collection_name, db_name=INSTAMART_DB)
-        mongo_client.ensure_indexes(col, collection_name, db_name=INSTAMART_DB)
-
-        cursor = col.find().sort("_id", -1).limit(100)
-        items: list[JsonDict] = []
-        for doc in cursor:
-            doc['_id'] = str(doc.get('_id'))
-            items.append(doc)
-
-        if not items:
-            data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scraped_data.json')
-            try:
-                if os.path.exists(data_path):
-                    with open(data_path, 'r', encoding='utf-8') as fh:
-                        data = cast(list[JsonDict], json.load(fh) or [])
-                    items = [row for row in data if (row.get('platform') or '').lower().startswith('insta')]
-            except Exception:
-                items = []
+        projection = mongo_client.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        last_term = await mongo_client.run_async(_read_last_term)
+        reads: list = [mongo_client.find_products_async(last_term, platforms=["instamart"], projection=projection)]
+        if mongo_client.jsonl_fallback_enabled():
+            store = jsonl_store.open_store(INSTAMART_DATA_FILE)
+            reads.append(mongo_client.run_async(store.latest, platform_prefix='insta'))
+        found = await asyncio.gather(*reads, return_exceptions=True)
+        items, fallback = found[0], found[1] if len(found) > 1 else []
+        # JSONL rows when Mongo is empty or unreachable
+        if (isinstance(items, BaseException) or not items) and fallback and not isinstance(fallback, BaseException):
+            items = [mongo_client.apply_projection(row, projection) for row in fallback]
+        elif isinstance(items, BaseException):
+            raise items
 
         return jsonify({"items": items, "last_term": last_term}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/history/price', methods=['GET'])
+def price_history():
+    """Hourly/daily min-avg-max price points for a product (fingerprint or name words) from the rollups."""
+    product = (request.args.get('product') or '').strip()
+    if not product:
+        return jsonify({"error": "product is required"}), 400
+    raw_platforms = (request.args.get('platform') or 'all').strip().lower()
+    platforms = None if raw_platforms == 'all' else [p.strip() for p in raw_platforms.split(',') if p.strip()]
+    unknown = [p for p in platforms or [] if p not in mongo_client.PLATFORMS]
+    if unknown:
+        return jsonify({"error": f"unknown platform(s): {', '.join(unknown)}"}), 400
+    try:
+        days = max(1, min(int(request.args.get('days') or 90), 3650))
+    except ValueError:
+        return jsonify({"error": "days must be a number"}), 400
+    granularity = (request.args.get('granularity') or ('hour' if days <= 7 else 'day')).strip().lower()
+    if granularity not in mongo_client.ROLLUP_GRANULARITIES:
+        return jsonify({"error": "granularity must be hour or day"}), 400
+
+    try:
+        series = mongo_client.find_price_history(product, platforms=platforms, granularity=granularity, days=days)
+        return jsonify({"product": product, "granularity": granularity, "days": days, "series": series}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/results/offline', methods=['GET'])
 def results_offline():
     term = (request.args.get('term') or '').strip()
     if not term:
         return jsonify({"error": "term is required"}), 400
-
     try:
-        col = _seller_collection(SELLER_PRODUCTS_COLLECTION)
-        regex = {"$regex": term, "$options": "i"}
-        cursor = col.find({"name": regex}).sort("_id", -1).limit(100)
+        projection = mongo_client.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        items: list[JsonDict] = []
-        for doc in cursor:
-            doc['_id'] = str(doc.get('_id'))
-            doc['seller_id'] = str(doc.get('seller_id'))
-            doc['platform'] = doc.get('platform') or 'Offline Store'
-            doc['search_term'] = term
-            items.append(doc)
-
-        return jsonify({"items": items}), 200
+    try:
+        items, match = _search_offline(term, projection)
+        return jsonify({"items": items, "match": match}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/latest/offline', methods=['GET'])
 def latest_offline():
+    try:
+        projection = mongo_client.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     try:
         col = _seller_collection(SELLER_PRODUCTS_COLLECTION)
-        cursor = col.find().sort("_id", -1).limit(100)
+        # search_term is the product name: read it even when fields= leaves it out, drop it afterwards
+        extra_name = bool(projection) and next(iter(projection.values())) == 1 and not any(
+            key == 'name' or key.startswith('name.') for key in projection
+        )
+        cursor = col.find({}, {**(projection or {}), 'name': 1} if extra_name else projection).sort("_id", -1).limit(100)
         items: list[JsonDict] = []
         for doc in cursor:
-            doc['_id'] = str(doc.get('_id'))
-            doc['seller_id'] = str(doc.get('seller_id'))
-            doc['platform'] = doc.get('platform') or 'Offline Store'
-            doc['search_term'] = doc.get('name', '')
-            items.append(doc)
+            item = _offline_item(doc, doc.get('name', ''), projection)
+            if extra_name:
+                item.pop('name', None)
+            items.append(item)
 
         return jsonify({"items": items, "last_term": None}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
+    # Pre-launch pooled browsers in the reloader child only (debug mode forks a watcher).
+    if browser_pool.pool_mode_enabled() and os.getenv("SCRAPER_POOL_WARM") == "1" and os.getenv("WERKZEUG_RUN_MAIN") == "true":
+        browser_pool.warm_in_background("zepto")
+        browser_pool.warm_in_background("instamart")
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -1,30 +1,18 @@
 from flask import Flask, Response, request, jsonify
 import os
-import subprocess
-import sys
+import browser_pool
+import locations
 import mongo_client
-from typing import Any, Dict, List, Optional, Protocol, cast
-from pymongo.collection import Collection
-from pymongo.cursor import Cursor
+import query_stats
+import scrape_freshness
+import scrape_jobs
+from typing import Any, Dict, List, Optional, Tuple, cast
 
 app = Flask(__name__)
 
-BLINKIT_DB = os.getenv("BLINKIT_DB", "snapit_blinkit")
-BLINKIT_URI = os.getenv("BLINKIT_MONGO_URI", os.getenv("MONGO_URI", "mongodb://localhost:27017"))
 LAST_TERM_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'last_search_term_blinkit.txt')
 DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scraped_blinkit.json')
 
-class _EnsureIndexes(Protocol):
-    def __call__(
-        self,
-        col: Collection[Any],
-        collection_name: Optional[str] = None,
-        db_name: Optional[str] = None,
-        uri: Optional[str] = None,
-    ) -> None: ...
-
-ENSURE_INDEXES: _EnsureIndexes = cast(_EnsureIndexes, mongo_client.ensure_indexes)
-
 @app.after_request
 def add_cors_headers(resp: Response) -> Response:
     resp.headers['Access-Control-Allow-Origin'] = '*'
@@ -32,94 +20,124 @@ def add_cors_headers(resp: Response) -> Response:
     resp.headers['Access-Control-Allow-Methods'] = 'POST, GET, OPTIONS'
     return resp
 
-@app.route('/scrape', methods=['POST'])
-def scrape():
-    data: Dict[str, Any] = cast(Dict[str, Any], request.get_json(silent=True) or {})
+def _remember_last_term(term: str) -> None:
+    try:
+        with open(LAST_TERM_FILE, 'w', encoding='utf-8') as fh:
+            fh.write(term)
+    except Exception:
+        pass
+
+def _submit_scrape(data: Dict[str, Any]) -> Tuple[Optional[scrape_jobs.Job], Dict[str, Any], int]:
+    """Validate a scrape request, answer from fresh stored data or queue (or join) a job.
+
+    Returns (job, body, status); job is None when the body is the final answer.
+    """
     term: str = str(data.get('product') or '').strip()
     if not term:
-        return jsonify({"error": "product is required"}), 400
+        return None, {"error": "product is required"}, 400
+    try:
+        where = locations.select(locations.split_names(data.get('locations')), "blinkit")
+    except ValueError as e:
+        return None, {"error": str(e), "term": term}, 400
 
-    env = os.environ.copy()
-    env['SEARCH_TERMS'] = term
-    env['OUTPUT_FILE'] = os.path.basename(DATA_FILE)
+    if not scrape_freshness.force_requested(data, request.args):
+        fresh = scrape_freshness.lookup("blinkit", term, where)
+        if fresh:
+            _remember_last_term(term)
+            return None, scrape_freshness.cached_body("blinkit", term, fresh), 200
 
+    runner = scrape_jobs.make_scrape_runner(
+        "blinkit",
+        term,
+        where,
+        'scraped_blinkit.py',
+        os.path.dirname(os.path.abspath(__file__)),
+        env_overrides={'OUTPUT_FILE': os.path.basename(DATA_FILE)},
+        on_success=lambda: _remember_last_term(term),
+    )
     try:
-        result = subprocess.run(
-            [sys.executable, 'scraped_blinkit.py'],
-            cwd=os.path.dirname(os.path.abspath(__file__)),
-            env=env,
-            capture_output=True,
-            text=True,
-            timeout=120,
-            errors='ignore',
+        job, created = scrape_jobs.get_queue().submit_once(
+            scrape_jobs.scrape_key("blinkit", term, where), "blinkit", term, runner, {"output_file": os.path.basename(DATA_FILE)}
         )
-        resp: Dict[str, Any] = {
-            "status": "ok" if result.returncode == 0 else "error",
-            "returncode": result.returncode,
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "stderr_tail": result.stderr.splitlines()[-10:] if result.stderr else [],
-            "output_file": os.path.basename(DATA_FILE),
-            "term": term,
-        }
+    except scrape_jobs.JobQueueFull as e:
+        return None, {"error": str(e), "term": term}, 503
+    return job, scrape_jobs.accepted_body(job, created), 202
 
-        try:
-            with open(LAST_TERM_FILE, 'w', encoding='utf-8') as fh:
-                fh.write(term)
-        except Exception:
-            pass
-        return jsonify(resp), (200 if result.returncode == 0 else 500)
-    except subprocess.TimeoutExpired:
-        return jsonify({"error": "scrape timed out"}), 504
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+@app.route('/scrape', methods=['POST'])
+def scrape():
+    """Queue a Blinkit scrape; answers 202 with a job id to poll at GET /jobs/<id>."""
+    data: Dict[str, Any] = cast(Dict[str, Any], request.get_json(silent=True) or {})
+    _, body, status = _submit_scrape(data)
+    return jsonify(body), status
+
+@app.route('/scrape/stream', methods=['GET'])
+def scrape_stream() -> Response:
+    """Server-Sent Events: one `row` event per scraped card, then `done` (or `cached` / `failed`).
+
+    Query: term=..., optional locations=a,b and force=1.
+    """
+    if not (request.args.get('term') or '').strip():
+        job, body, status = None, {"error": "term is required"}, 400
+    else:
+        job, body, status = _submit_scrape({"product": request.args.get('term'), "locations": request.args.get('locations')})
+    events = scrape_jobs.sse_final(body, status) if job is None else scrape_jobs.sse_events(job, not body["coalesced"])
+    return Response(events, mimetype='text/event-stream', headers=scrape_jobs.SSE_HEADERS)
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id: str):
+    job = scrape_jobs.get_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route('/stats/queries', methods=['GET'])
+def query_stats_report():
+    """Mongo cost per query shape in this process (QUERY_STATS=1); `reset=1` clears it after reading."""
+    report = query_stats.report()
+    if request.args.get('reset') == '1':
+        query_stats.reset()
+    return jsonify(report), 200
 
 @app.route('/results', methods=['GET'])
-def results():
+async def results():
     term = (request.args.get('term') or '').strip()
     if not term:
         return jsonify({"error": "term is required"}), 400
     try:
-        primary_col: Collection[Dict[str, Any]] = mongo_client.get_collection(term, db_name=BLINKIT_DB, uri=BLINKIT_URI)
-        ENSURE_INDEXES(primary_col, term, BLINKIT_DB, BLINKIT_URI)
-        cursor: Cursor[Dict[str, Any]] = primary_col.find({"search_term": {"$regex": term, "$options": "i"}}).sort("_id", -1).limit(100)
-        items: List[Dict[str, Any]] = [{**doc, '_id': str(doc.get('_id'))} for doc in cursor]
-
-        if not items:
-            alt_name = f"blinkit_{term}"
-            alt_col: Collection[Dict[str, Any]] = mongo_client.get_collection(alt_name, db_name=BLINKIT_DB, uri=BLINKIT_URI)
-            ENSURE_INDEXES(alt_col, alt_name, BLINKIT_DB, BLINKIT_URI)
-            cursor = alt_col.find({"search_term": {"$regex": term, "$options": "i"}}).sort("_id", -1).limit(100)
-            items = [{**doc, '_id': str(doc.get('_id'))} for doc in cursor]
-        return jsonify({"items": items}), 200
+        projection = mongo_client.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        items, match = await mongo_client.search_products_async(
+            term, platforms=["blinkit"], location=request.args.get('location') or None, projection=projection
+        )
+        return jsonify({"items": items, "match": match}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _read_last_term() -> Optional[str]:
+    if os.path.exists(LAST_TERM_FILE):
+        try:
+            with open(LAST_TERM_FILE, 'r', encoding='utf-8') as fh:
+                return fh.read().strip() or None
+        except Exception:
+            pass
+    return None
+
 @app.route('/latest', methods=['GET'])
-def latest():
+async def latest():
+    try:
+        projection = mongo_client.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     try:
-        last_term: Optional[str] = None
-        if os.path.exists(LAST_TERM_FILE):
-            try:
-                with open(LAST_TERM_FILE, 'r', encoding='utf-8') as fh:
-                    last_term = fh.read().strip() or None
-            except Exception:
-                pass
-
-        col: Collection[Dict[str, Any]] = mongo_client.get_collection(last_term, db_name=BLINKIT_DB, uri=BLINKIT_URI)
-        ENSURE_INDEXES(col, last_term, BLINKIT_DB, BLINKIT_URI)
-        cursor = col.find().sort("_id", -1).limit(100)
-        items: List[Dict[str, Any]] = [{**doc, '_id': str(doc.get('_id'))} for doc in cursor]
-
-        if not items and last_term:
-            alt_name = f"blinkit_{last_term}"
-            alt_col: Collection[Dict[str, Any]] = mongo_client.get_collection(alt_name, db_name=BLINKIT_DB, uri=BLINKIT_URI)
-            ENSURE_INDEXES(alt_col, alt_name, BLINKIT_DB, BLINKIT_URI)
-            cursor = alt_col.find().sort("_id", -1).limit(100)
-            items = [{**doc, '_id': str(doc.get('_id'))} for doc in cursor]
+        last_term = await mongo_client.run_async(_read_last_term)
+        items: List[Dict[str, Any]] = await mongo_client.find_products_async(last_term, platforms=["blinkit"], projection=projection)
         return jsonify({"items": items, "last_term": last_term}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
+    if browser_pool.pool_mode_enabled() and os.getenv("SCRAPER_POOL_WARM") == "1" and os.getenv("WERKZEUG_RUN_MAIN") == "true":
+        browser_pool.warm_in_background("blinkit")
     app.run(host='0.0.0.0', port=5001, debug=True)
@@ -1,14 +1,16 @@
-from flask import Flask, request, jsonify
-import json
+from flask import Flask, Response, request, jsonify
+import asyncio
 import os
-import subprocess
-import sys
+import browser_pool
+import jsonl_store
+import locations
 import mongo_client
+import query_stats
+import scrape_freshness
+import scrape_jobs
 
 app = Flask(__name__)
 
-INSTAMART_DB = os.getenv("INSTAMART_DB", "snapit_instamart")
-INSTAMART_URI = os.getenv("INSTAMART_MONGO_URI", os.getenv("MONGO_URI", "mongodb://localhost:27017"))
 LAST_TERM_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'last_search_term_instamart.txt')
 DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scraped_instamart.json')
 
@@ -19,98 +21,152 @@ def add_cors_headers(resp):
     resp.headers['Access-Control-Allow-Methods'] = 'POST, GET, OPTIONS'
     return resp
 
-@app.route('/scrape', methods=['POST'])
-def scrape():
-    data = request.get_json(silent=True) or {}
+def _remember_last_term(term: str) -> None:
+    try:
+        with open(LAST_TERM_FILE, 'w', encoding='utf-8') as fh:
+            fh.write(term)
+    except Exception:
+        pass
+
+def _submit_scrape(data):
+    """Validate a scrape request, answer from fresh stored data or queue (or join) a job.
+
+    Returns (job, body, status); job is None when the body is the final answer.
+    """
     term = (data.get('product') or '').strip()
     if not term:
-        return jsonify({"error": "product is required"}), 400
+        return None, {"error": "product is required"}, 400
+    try:
+        where = locations.select(locations.split_names(data.get('locations')), "instamart")
+    except ValueError as e:
+        return None, {"error": str(e), "term": term}, 400
 
-    env = os.environ.copy()
-    env['SEARCH_TERMS'] = term
-    env['OUTPUT_FILE'] = os.path.basename(DATA_FILE)
+    if not scrape_freshness.force_requested(data, request.args):
+        fresh = scrape_freshness.lookup("instamart", term, where)
+        if fresh:
+            _remember_last_term(term)
+            return None, scrape_freshness.cached_body("instamart", term, fresh), 200
 
+    runner = scrape_jobs.make_scrape_runner(
+        "instamart",
+        term,
+        where,
+        'scraped_instamart.py',
+        os.path.dirname(os.path.abspath(__file__)),
+        env_overrides={'OUTPUT_FILE': os.path.basename(DATA_FILE)},
+        on_success=lambda: _remember_last_term(term),
+    )
     try:
-        result = subprocess.run(
-            [sys.executable, 'scraped_instamart.py'],
-            cwd=os.path.dirname(os.path.abspath(__file__)),
-            env=env,
-            capture_output=True,
-            text=True,
-            timeout=120,
-            errors='ignore',
+        job, created = scrape_jobs.get_queue().submit_once(
+            scrape_jobs.scrape_key("instamart", term, where), "instamart", term, runner, {"output_file": os.path.basename(DATA_FILE)}
         )
-        resp = {
-            "status": "ok" if result.returncode == 0 else "error",
-            "returncode": result.returncode,
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "stderr_tail": result.stderr.splitlines()[-10:] if result.stderr else [],
-            "output_file": os.path.basename(DATA_FILE),
-            "term": term,
-        }
+    except scrape_jobs.JobQueueFull as e:
+        return None, {"error": str(e), "term": term}, 503
+    return job, scrape_jobs.accepted_body(job, created), 202
 
-        try:
-            with open(LAST_TERM_FILE, 'w', encoding='utf-8') as fh:
-                fh.write(term)
-        except Exception:
-            pass
-        return jsonify(resp), (200 if result.returncode == 0 else 500)
-    except subprocess.TimeoutExpired:
-        return jsonify({"error": "scrape timed out"}), 504
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+@app.route('/scrape', methods=['POST'])
+def scrape():
+    """Queue a Instamart scrape; answers 202 with a job id to poll at GET /jobs/<id>."""
+    data = request.get_json(silent=True) or {}
+    _, body, status = _submit_scrape(data)
+    return jsonify(body), status
+
+@app.route('/scrape/stream', methods=['GET'])
+def scrape_stream():
+    """Server-Sent Events: one `row` event per scraped card, then `done` (or `cached` / `failed`).
+
+    Query: term=..., optional locations=a,b and force=1.
+    """
+    if not (request.args.get('term') or '').strip():
+        job, body, status = None, {"error": "term is required"}, 400
+    else:
+        job, body, status = _submit_scrape({"product": request.args.get('term'), "locations": request.args.get('locations')})
+    events = scrape_jobs.sse_final(body, status) if job is None else scrape_jobs.sse_events(job, not body["coalesced"])
+    return Response(events, mimetype='text/event-stream', headers=scrape_jobs.SSE_HEADERS)
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = scrape_jobs.get_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(job.to_dict()), 200
 
-def _results_core(term: str):
+@app.route('/stats/queries', methods=['GET'])
+def query_stats_report():
+    """Mongo cost per query shape in this process (QUERY_STATS=1); `reset=1` clears it after reading."""
+    report = query_stats.report()
+    if request.args.get('reset') == '1':
+        query_stats.reset()
+    return jsonify(report), 200
+
+async def _with_fallback(stored_read, fallback_read, projection=None):
+    """Await the Mongo read and the JSONL read together; JSONL rows win only when Mongo is empty or unreachable."""
+    if not mongo_client.jsonl_fallback_enabled():
+        fallback_read.close()
+        return await stored_read, False
+    stored, fallback = await asyncio.gather(stored_read, fallback_read, return_exceptions=True)
+    stored_rows = stored[0] if isinstance(stored, tuple) else stored
+    if (isinstance(stored, BaseException) or not stored_rows) and fallback and not isinstance(fallback, BaseException):
+        return [mongo_client.apply_projection(row, projection) for row in fallback], True
+    if isinstance(stored, BaseException):
+        raise stored
+    return stored, False
+
+async def _results_core(term: str):
     if not term:
         return jsonify({"error": "term is required"}), 400
-    collection_name = f"instamart_{term}"
     try:
-        col = mongo_client.get_collection(collection_name, db_name=INSTAMART_DB, uri=INSTAMART_URI)
-        mongo_client.ensure_indexes(col, collection_name, db_name=INSTAMART_DB, uri=INSTAMART_URI)
-        cursor = col.find({"search_term": {"$regex": term, "$options": "i"}}).sort("_id", -1).limit(100)
-        items = [{**doc, '_id': str(doc.get('_id'))} for doc in cursor]
-        if not items and os.path.exists(DATA_FILE):
-            with open(DATA_FILE, 'r', encoding='utf-8') as fh:
-                data = json.load(fh) or []
-            for row in data:
-                if term.lower() in (row.get('search_term', '').lower()) and (row.get('platform') or '').lower().startswith('insta'):
-                    if '_id' in row and not isinstance(row['_id'], str):
-                        row['_id'] = str(row['_id'])
-                    items.append(row)
-        return jsonify({"items": items}), 200
+        projection = mongo_client.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        store = jsonl_store.open_store(DATA_FILE)
+        found, from_jsonl = await _with_fallback(
+            mongo_client.search_products_async(
+                term, platforms=["instamart"], location=request.args.get('location') or None, projection=projection
+            ),
+            mongo_client.run_async(store.rows_for_term, term, platform_prefix='insta'),
+            projection,
+        )
+        items, match = (found, "jsonl") if from_jsonl else found
+        return jsonify({"items": items, "match": match}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/results', methods=['GET'])
 @app.route('/results/instamart', methods=['GET'])
-def results():
+async def results():
     term = (request.args.get('term') or '').strip()
-    return _results_core(term)
+    return await _results_core(term)
+
+def _read_last_term():
+    if os.path.exists(LAST_TERM_FILE):
+        try:
+            with open(LAST_TERM_FILE, 'r', encoding='utf-8') as fh:
+                return fh.read().strip() or None
+        except Exception:
+            pass
+    return None
 
 @app.route('/latest', methods=['GET'])
 @app.route('/latest/instamart', methods=['GET'])
-def latest():
+async def latest():
+    try:
+        projection = mongo_client.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     try:
-        last_term = None
-        if os.path.exists(LAST_TERM_FILE):
-            try:
-                with open(LAST_TERM_FILE, 'r', encoding='utf-8') as fh:
-                    last_term = fh.read().strip() or None
-            except Exception:
-                pass
-
-        collection_name = f"instamart_{last_term}" if last_term else last_term
-        col = mongo_client.get_collection(collection_name, db_name=INSTAMART_DB, uri=INSTAMART_URI)
-        mongo_client.ensure_indexes(col, collection_name, db_name=INSTAMART_DB, uri=INSTAMART_URI)
-        cursor = col.find().sort("_id", -1).limit(100)
-        items = [{**doc, '_id': str(doc.get('_id'))} for doc in cursor]
-        if not items and os.path.exists(DATA_FILE):
-            with open(DATA_FILE, 'r', encoding='utf-8') as fh:
-                items = json.load(fh) or []
+        last_term = await mongo_client.run_async(_read_last_term)
+        items, _ = await _with_fallback(
+            mongo_client.find_products_async(last_term, platforms=["instamart"], projection=projection),
+            mongo_client.run_async(jsonl_store.open_store(DATA_FILE).latest),
+            projection,
+        )
         return jsonify({"items": items, "last_term": last_term}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
+    if browser_pool.pool_mode_enabled() and os.getenv("SCRAPER_POOL_WARM") == "1" and os.getenv("WERKZEUG_RUN_MAIN") == "true":
+        browser_pool.warm_in_background("instamart")
     app.run(host='0.0.0.0', port=5002, debug=True)
@@ -0,0 +1,117 @@
+"""Saved browser sessions so delivery-location setup survives between runs.
+
+Setting a location (Blinkit's modal, Instamart's address search) takes several
+clicks and pauses. Once it has been done, save() stores the site's cookies and
+localStorage under SESSION_SNAPSHOT_DIR, one file per platform and location.
+The next session calls restore() after opening the homepage; when a fresh
+snapshot exists the location is already in place and setup is skipped.
+
+Snapshots older than SESSION_SNAPSHOT_MAX_AGE hours are treated as missing, and
+a snapshot is dropped when the site asks for a location again anyway.
+"""
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import locations
+
+SNAPSHOTS_ENABLED = os.getenv("SESSION_SNAPSHOTS", "1") != "0"
+SNAPSHOT_DIR = os.getenv(
+    "SESSION_SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "session_snapshots")
+)
+SNAPSHOT_MAX_AGE = float(os.getenv("SESSION_SNAPSHOT_MAX_AGE", "12")) * 3600
+
+LOCAL_STORAGE_DUMP = "return Object.assign({}, window.localStorage);"
+LOCAL_STORAGE_LOAD = """
+const items = arguments[0] || {};
+for (const key of Object.keys(items)) { window.localStorage.setItem(key, items[key]); }
+"""
+
+
+def label_for(location_text: str, platform: str) -> str:
+    """Snapshot key for a row's location text: a configured label, else the default session."""
+    loc = locations.find(location_text, platform)
+    return loc.label if loc is not None else ""
+
+
+def snapshot_path(platform: str, label: str = "") -> str:
+    slug = re.sub(r"[^a-z0-9]+", "_", label.lower()).strip("_") or "default"
+    return os.path.join(SNAPSHOT_DIR, f"{platform}_{slug}.json")
+
+
+def load(platform: str, label: str = "") -> Optional[Dict[str, Any]]:
+    """The saved snapshot, or None when it is missing, unreadable or stale."""
+    if not SNAPSHOTS_ENABLED:
+        return None
+    path = snapshot_path(platform, label)
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            snap = json.load(fh)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f" Ignoring unreadable session snapshot {path}: {e}")
+        return None
+    if time.time() - float(snap.get("saved_at") or 0) > SNAPSHOT_MAX_AGE:
+        print(f" Session snapshot {path} is stale; location will be set again.")
+        return None
+    return snap
+
+
+def restore(driver: Any, platform: str, label: str = "") -> bool:
+    """Load saved cookies/localStorage into the open site and reload. Call after driver.get(home)."""
+    snap = load(platform, label)
+    if not snap:
+        return False
+    for cookie in snap.get("cookies") or []:
+        cookie = {key: val for key, val in cookie.items() if key in ("name", "value", "domain", "path", "secure", "httpOnly", "expiry", "sameSite")}
+        if "expiry" in cookie:
+            cookie["expiry"] = int(cookie["expiry"])
+        try:
+            driver.add_cookie(cookie)
+        except Exception:
+            continue
+    try:
+        driver.execute_script(LOCAL_STORAGE_LOAD, snap.get("local_storage") or {})
+    except Exception:
+        pass
+    driver.refresh()
+    age_min = (time.time() - float(snap.get("saved_at") or 0)) / 60
+    print(f" Restored saved {platform} session ({age_min:.0f} min old)")
+    return True
+
+
+def save(driver: Any, platform: str, label: str = "") -> None:
+    """Snapshot the current site's cookies and localStorage (atomic replace)."""
+    if not SNAPSHOTS_ENABLED:
+        return
+    try:
+        local_storage = driver.execute_script(LOCAL_STORAGE_DUMP) or {}
+    except Exception:
+        local_storage = {}
+    try:
+        snap = {
+            "saved_at": time.time(),
+            "url": driver.current_url,
+            "cookies": driver.get_cookies(),
+            "local_storage": local_storage,
+        }
+        path = snapshot_path(platform, label)
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(snap, fh, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        print(f" Saved {platform} session snapshot to {path}")
+    except Exception as e:
+        print(f" Could not save session snapshot: {e}")
+
+
+def invalidate(platform: str, label: str = "") -> None:
+    try:
+        os.remove(snapshot_path(platform, label))
+    except OSError:
+        pass
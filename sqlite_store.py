@@ -0,0 +1,371 @@
+"""Embedded SQLite backend for the products store (STORAGE_BACKEND=sqlite).
+
+Same API as the Mongo store in mongo_client.py, for single-node setups that do
+not run Mongo. One file (SQLITE_PATH, default snapit.sqlite3) holds:
+
+* products: one row per fingerprint with the query keys as columns and the
+  whole document as JSON; (platform, location, time) indexes like the Mongo
+  collection's.
+* product_terms: every search term each product was found under (the Mongo
+  `terms` array), which term lookups go through.
+* products_fts: an FTS5 index over product_name for the token / text steps of
+  search(), kept in sync by triggers.
+* price_rollups: hourly and daily min / max / sum / count / last per fingerprint.
+
+The database runs in WAL mode so the servers can read while a scraper writes;
+each save() is one transaction covering every row of the batch and its rollups.
+SQLite has no TTL indexes, so save() also runs expire() at most once an hour
+per process, applying the same retention settings as the Mongo TTL indexes.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import mongo_client
+
+EXPIRE_INTERVAL = 3600.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL UNIQUE,
+    platform_key TEXT,
+    term_norm TEXT,
+    location TEXT,
+    product_name TEXT,
+    price TEXT,
+    first_seen TEXT,
+    scraped_at TEXT NOT NULL,
+    doc TEXT NOT NULL
+);
+DROP INDEX IF EXISTS platform_term_location_time;
+DROP INDEX IF EXISTS term_time;
+CREATE INDEX IF NOT EXISTS platform_location_time ON products (platform_key, location, scraped_at DESC);
+CREATE INDEX IF NOT EXISTS platform_time ON products (platform_key, scraped_at DESC);
+CREATE INDEX IF NOT EXISTS scraped_time ON products (scraped_at DESC);
+
+CREATE TABLE IF NOT EXISTS product_terms (
+    term_norm TEXT NOT NULL,
+    product_id INTEGER NOT NULL,
+    PRIMARY KEY (term_norm, product_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS product_terms_product ON product_terms (product_id);
+CREATE TRIGGER IF NOT EXISTS product_terms_delete AFTER DELETE ON products BEGIN
+    DELETE FROM product_terms WHERE product_id = old.id;
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(product_name, content='products', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+    INSERT INTO products_fts (rowid, product_name) VALUES (new.id, new.product_name);
+END;
+CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+    INSERT INTO products_fts (products_fts, rowid, product_name) VALUES ('delete', old.id, old.product_name);
+END;
+CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF product_name ON products BEGIN
+    INSERT INTO products_fts (products_fts, rowid, product_name) VALUES ('delete', old.id, old.product_name);
+    INSERT INTO products_fts (rowid, product_name) VALUES (new.id, new.product_name);
+END;
+
+CREATE TABLE IF NOT EXISTS price_rollups (
+    fingerprint TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    min REAL,
+    max REAL,
+    sum REAL,
+    count INTEGER,
+    last REAL,
+    platform_key TEXT,
+    term_norm TEXT,
+    product_name TEXT,
+    location TEXT,
+    PRIMARY KEY (fingerprint, granularity, bucket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS granularity_bucket ON price_rollups (granularity, bucket);
+"""
+
+UPSERT_PRODUCT = """
+INSERT INTO products (fingerprint, platform_key, term_norm, location, product_name, price, first_seen, scraped_at, doc)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (fingerprint) DO UPDATE SET
+    price = excluded.price,
+    scraped_at = excluded.scraped_at,
+    doc = json_set(products.doc, '$.price', json_extract(excluded.doc, '$.price'), '$.scraped_at', excluded.scraped_at)
+"""
+
+ADD_TERM = "INSERT OR IGNORE INTO product_terms (term_norm, product_id) SELECT ?, id FROM products WHERE fingerprint = ?"
+
+# Fold one fingerprint's buckets into another's; the target keeps its own `last`
+MOVE_ROLLUPS = """
+INSERT INTO price_rollups (fingerprint, granularity, bucket, min, max, sum, count, last, platform_key, term_norm, product_name, location)
+SELECT ?, granularity, bucket, min, max, sum, count, last, platform_key, term_norm, product_name, location
+FROM price_rollups WHERE fingerprint = ?
+ON CONFLICT (fingerprint, granularity, bucket) DO UPDATE SET
+    min = MIN(price_rollups.min, excluded.min),
+    max = MAX(price_rollups.max, excluded.max),
+    sum = price_rollups.sum + excluded.sum,
+    count = price_rollups.count + excluded.count
+"""
+
+# PRAGMA user_version once fingerprints no longer include the term (see _rekey)
+SCHEMA_VERSION = 1
+
+UPSERT_ROLLUP = """
+INSERT INTO price_rollups (fingerprint, granularity, bucket, min, max, sum, count, last, platform_key, term_norm, product_name, location)
+VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?, ?, ?, ?)
+ON CONFLICT (fingerprint, granularity, bucket) DO UPDATE SET
+    min = MIN(price_rollups.min, excluded.min),
+    max = MAX(price_rollups.max, excluded.max),
+    sum = price_rollups.sum + excluded.sum,
+    count = price_rollups.count + 1,
+    last = excluded.last
+"""
+
+
+def _ts(value: Any) -> Any:
+    """Datetimes as fixed-width UTC ISO strings, so text order is time order."""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc).isoformat(timespec="microseconds")
+    return value
+
+
+def _fts_query(tokens: Sequence[str], joiner: str) -> str:
+    return f" {joiner} ".join(f'"{token}"' for token in tokens)
+
+
+class SqliteProductStore:
+    """mongo_client.ProductStore on a local SQLite file."""
+
+    def __init__(self, path: str) -> None:
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._next_expire = 0.0
+
+    def label(self) -> str:
+        return f"SQLite store '{os.path.basename(self.path)}'"
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; the schema is created by the first one."""
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                        self._rekey(conn)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _rekey(conn: sqlite3.Connection) -> None:
+        """Move rows written when the fingerprint included the term to the current one.
+
+        Newest first, so the newest copy of a product survives; older copies
+        hand over their term and price buckets and are deleted.
+        """
+        kept: Dict[str, int] = {}
+        with conn:
+            rows = conn.execute("SELECT id, fingerprint, doc FROM products ORDER BY scraped_at DESC").fetchall()
+            for row in rows:
+                doc = json.loads(row["doc"])
+                fp = mongo_client.fingerprint(doc)
+                if fp != row["fingerprint"]:
+                    conn.execute(MOVE_ROLLUPS, (fp, row["fingerprint"]))
+                    conn.execute("DELETE FROM price_rollups WHERE fingerprint = ?", (row["fingerprint"],))
+                target = kept.setdefault(fp, row["id"])
+                if target != row["id"]:
+                    conn.execute("DELETE FROM products WHERE id = ?", (row["id"],))
+                elif fp != row["fingerprint"]:
+                    doc["fingerprint"] = fp
+                    conn.execute(
+                        "UPDATE products SET fingerprint = ?, doc = ? WHERE id = ?",
+                        (fp, json.dumps(doc, ensure_ascii=False), row["id"]),
+                    )
+                if doc.get("term_norm"):
+                    conn.execute(
+                        "INSERT OR IGNORE INTO product_terms (term_norm, product_id) VALUES (?, ?)",
+                        (doc["term_norm"], target),
+                    )
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        if rows:
+            print(f" Re-keyed {len(rows)} product rows into {len(kept)} products")
+
+    # -- writing -------------------------------------------------------------
+
+    def save(self, docs: List[Dict[str, Any]]) -> int:
+        product_rows: List[Tuple[Any, ...]] = []
+        term_rows: List[Tuple[str, str]] = []
+        rollup_rows: List[Tuple[Any, ...]] = []
+        for doc in docs:
+            fp = doc.get("fingerprint") or mongo_client.fingerprint(doc)
+            # product_terms holds the terms; _select() adds them back
+            stored = {key: _ts(val) for key, val in doc.items() if key not in ("_id", "terms")}
+            stored["fingerprint"] = fp
+            stored.setdefault("first_seen", stored.get("scraped_at"))
+            product_rows.append((
+                fp, doc.get("platform_key"), doc.get("term_norm"), doc.get("location"), doc.get("product_name"),
+                stored.get("price"), stored["first_seen"], stored["scraped_at"],
+                json.dumps(stored, ensure_ascii=False, default=str),
+            ))
+            terms = doc.get("terms") or ([doc["term_norm"]] if doc.get("term_norm") else [])
+            term_rows.extend((term, fp) for term in terms)
+            price = mongo_client.parse_price(doc.get("price"))
+            seen_at = doc.get("scraped_at")
+            if price is None or not isinstance(seen_at, datetime):
+                continue
+            for granularity in mongo_client.ROLLUP_GRANULARITIES:
+                rollup_rows.append((
+                    fp, granularity, _ts(mongo_client.bucket_start(seen_at, granularity)), price, price, price, price,
+                    doc.get("platform_key"), doc.get("term_norm"), doc.get("product_name"), doc.get("location"),
+                ))
+        conn = self._conn()
+        with conn:
+            conn.executemany(UPSERT_PRODUCT, product_rows)
+            conn.executemany(ADD_TERM, term_rows)
+            conn.executemany(UPSERT_ROLLUP, rollup_rows)
+        if time.monotonic() >= self._next_expire:
+            self._next_expire = time.monotonic() + EXPIRE_INTERVAL
+            self.expire()
+        return len(product_rows)
+
+    def expire(self) -> Dict[str, int]:
+        """Delete products and rollup buckets past their retention (see mongo_client)."""
+        now = datetime.now(timezone.utc)
+        counts = {"products": 0, "rollups": 0, "rollups_redated": 0}
+        conn = self._conn()
+        with conn:
+            if mongo_client.PRODUCT_RETENTION_DAYS > 0:
+                cutoff = _ts(now - timedelta(days=mongo_client.PRODUCT_RETENTION_DAYS))
+                counts["products"] = conn.execute("DELETE FROM products WHERE scraped_at < ?", (cutoff,)).rowcount
+            for granularity, days in mongo_client.ROLLUP_RETENTION_DAYS.items():
+                if days > 0:
+                    cutoff = _ts(now - timedelta(days=days))
+                    counts["rollups"] += conn.execute(
+                        "DELETE FROM price_rollups WHERE granularity = ? AND bucket < ?", (granularity, cutoff)
+                    ).rowcount
+        return counts
+
+    # -- reading -------------------------------------------------------------
+
+    @staticmethod
+    def _filter(platforms: Optional[Sequence[str]], location: Optional[str]) -> Tuple[List[str], List[Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        if platforms:
+            keys = [mongo_client.platform_key(name) or name for name in platforms]
+            clauses.append(f"p.platform_key IN ({', '.join('?' for _ in keys)})")
+            params.extend(keys)
+        if location:
+            clauses.append("p.location = ?")
+            params.append(location)
+        return clauses, params
+
+    def _select(
+        self, clauses: List[str], params: List[Any], limit: int, join_fts: bool = False, order: str = "p.scraped_at DESC",
+        projection: Optional[Dict[str, int]] = None,
+    ) -> List[Dict[str, Any]]:
+        sql = (
+            "SELECT p.id, p.doc,"
+            " (SELECT json_group_array(t.term_norm) FROM product_terms t WHERE t.product_id = p.id) AS terms"
+            " FROM products p"
+        )
+        if join_fts:
+            sql += " JOIN products_fts ON products_fts.rowid = p.id"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {order} LIMIT ?"
+        rows = self._conn().execute(sql, [*params, limit]).fetchall()
+        return [
+            mongo_client.apply_projection(
+                {**json.loads(row["doc"]), "terms": json.loads(row["terms"]), "_id": str(row["id"])}, projection
+            )
+            for row in rows
+        ]
+
+    def latest(
+        self, term: Optional[str], platforms: Optional[Sequence[str]], location: Optional[str], limit: int,
+        projection: Optional[Dict[str, int]] = None,
+    ) -> List[Dict[str, Any]]:
+        clauses, params = self._filter(platforms, location)
+        if term:
+            clauses.append("p.id IN (SELECT product_id FROM product_terms WHERE term_norm = ?)")
+            params.append(mongo_client.normalize_term(term))
+        return self._select(clauses, params, limit, projection=projection)
+
+    def search(
+        self, term: str, platforms: Optional[Sequence[str]], location: Optional[str], limit: int,
+        projection: Optional[Dict[str, int]] = None,
+    ) -> Tuple[List[Dict[str, Any]], str]:
+        """Same steps as mongo_client.indexed_search(): exact, prefix range, all tokens, any token by rank."""
+        norm = mongo_client.normalize_term(term)
+        if not norm:
+            return [], "none"
+        base, params = self._filter(platforms, location)
+        docs = self._select(
+            base + ["p.id IN (SELECT product_id FROM product_terms WHERE term_norm = ?)"], params + [norm], limit,
+            projection=projection,
+        )
+        if docs:
+            return docs, "exact"
+        docs = self._select(
+            base + ["p.id IN (SELECT product_id FROM product_terms WHERE term_norm >= ? AND term_norm < ?)"],
+            params + [norm, norm + "\U0010ffff"], limit,
+            projection=projection,
+        )
+        if docs:
+            return docs, "prefix"
+        tokens = mongo_client.name_tokens(norm)
+        if not tokens:
+            return [], "none"
+        docs = self._select(
+            base + ["products_fts MATCH ?"], params + [_fts_query(tokens, "AND")], limit,
+            join_fts=True, projection=projection,
+        )
+        if docs:
+            return docs, "tokens"
+        docs = self._select(
+            base + ["products_fts MATCH ?"], params + [_fts_query(tokens, "OR")], limit,
+            join_fts=True, order="products_fts.rank, p.scraped_at DESC", projection=projection,
+        )
+        return docs, "text" if docs else "none"
+
+    def price_history(
+        self, product: str, platforms: Optional[Sequence[str]], granularity: str, days: int, limit: int
+    ) -> List[Dict[str, Any]]:
+        if mongo_client.is_fingerprint(product):
+            products = self._select(["p.fingerprint = ?"], [product.strip().lower()], 1)
+        else:
+            tokens = mongo_client.name_tokens(product)
+            if not tokens:
+                return []
+            clauses, params = self._filter(platforms, None)
+            products = self._select(clauses + ["products_fts MATCH ?"], params + [_fts_query(tokens, "AND")], limit, join_fts=True)
+        if not products:
+            return []
+        fingerprints = [doc["fingerprint"] for doc in products]
+        rows = self._conn().execute(
+            f"SELECT fingerprint, bucket, min, max, sum, count, last FROM price_rollups"
+            f" WHERE fingerprint IN ({', '.join('?' for _ in fingerprints)}) AND granularity = ? AND bucket >= ?"
+            f" ORDER BY fingerprint, bucket",
+            [*fingerprints, granularity, _ts(mongo_client.history_since(granularity, days))],
+        ).fetchall()
+        points: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            points.setdefault(row["fingerprint"], []).append(mongo_client.rollup_point(dict(row)))
+        return mongo_client.history_series(products, points)
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import html_extract  # noqa: E402
+import mongo_client  # noqa: E402
+
+PAGES = {"milk": "blinkit_milk_page.html", "bread": "blinkit_bread_page.html", "eggs": "blinkit_eggs_page.html"}
+
+
+@pytest.mark.parametrize("term", sorted(PAGES))
+def test_sample_pages_keep_distinct_products_apart(term):
+    with open(os.path.join(ROOT, PAGES[term]), encoding="utf-8") as fh:
+        rows = html_extract.parse_html(fh.read(), "blinkit", term)
+    assert rows
+    docs = [mongo_client.product_doc(row, "blinkit") for row in rows]
+    products = {(" ".join(doc["name_tokens"]), mongo_client.normalize_term(doc.get("quantity"))) for doc in docs}
+    assert len({mongo_client.fingerprint(doc) for doc in docs}) == len(products)
+
+
+def test_search_fallback_url_is_not_an_identity():
+    a = {"platform_key": "blinkit", "url": "https://www.blinkit.com/s/?q=milk", "product_name": "Amul Taaza Milk", "quantity": "500 ml"}
+    b = dict(a, product_name="Mother Dairy Toned Milk")
+    assert mongo_client.fingerprint(a) != mongo_client.fingerprint(b)
+    assert mongo_client.fingerprint(a) == mongo_client.fingerprint(dict(a, url=""))
+
+
+def test_product_url_is_the_identity():
+    a = {"platform_key": "blinkit", "url": "https://blinkit.com/prn/amul-milk/prid/1?x=1", "product_name": "Amul Milk"}
+    assert mongo_client.fingerprint(a) == mongo_client.fingerprint(dict(a, product_name="Amul Taaza Milk"))